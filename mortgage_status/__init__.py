@@ -0,0 +1,6 @@
+"""
+===============================================================================
+Mortgage Applications Status
+===============================================================================
+Reusable building blocks of the mortgage applications status project.
+"""
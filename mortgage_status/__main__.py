@@ -0,0 +1,4 @@
+from mortgage_status.cli import main
+
+
+raise SystemExit(main())
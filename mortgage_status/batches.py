@@ -0,0 +1,100 @@
+"""
+===============================================================================
+Batch Iterator of the Large Query Results
+===============================================================================
+Queries 9 and 10 project every application with parts of its
+Date_de_demande, and query 12 full joins the applications with their down
+payment: their results have as many rows as the applications. Instead of
+collecting them whole, query_batches returns a generator of DataFrames of at
+most batch_size rows, which consumers write to files or sockets one after
+the other, with a memory bounded by the size of a batch:
+- queries 9 and 10 are projections of a single table, so each batch is a
+  slice of the query plan, computed from the rows of its slice only,
+- query 12 joins and sorts every row, so its result is first sunk by the
+  streaming engine to a temporary Arrow IPC file, whose record batches are
+  then read one by one memory-mapped (the join and the sort still need the
+  memory of the engine, but the result is never held on the heap while it
+  is consumed).
+"""
+# Standard libraries
+import os
+import tempfile
+
+# Other libraries
+import polars as pl
+import pyarrow as pa
+
+
+from polars import SQLContext
+from mortgage_status.queries import QUERIES
+
+
+
+# Queries whose results are returned in batches
+BATCHED_QUERIES = (9, 10, 12)
+
+# Batched queries which project a single table, computed slice by slice
+SLICED_QUERIES = (9, 10)
+
+
+def iter_slices(plan, batch_size):
+    """
+    Yield the result of a LazyFrame projecting a table as DataFrames of at
+    most batch_size rows, each computed from a slice of the plan.
+    """
+    offset = 0
+    while True:
+        batch = plan.slice(offset, batch_size).collect()
+        if batch.height:
+            yield batch
+        if batch.height < batch_size:
+            return
+        offset += batch_size
+
+
+def iter_spilled(plan, batch_size, spill_dir=None):
+    """
+    Yield the result of a LazyFrame as DataFrames of at most batch_size rows,
+    read record batch by record batch from a temporary Arrow IPC file the
+    result is first sunk to (in spill_dir, the temporary directory of the
+    system by default). The batches are views of the pages of the mapped
+    file, so only the batch being consumed is read.
+    """
+    fd, path = tempfile.mkstemp(suffix='.arrow', dir=spill_dir)
+    os.close(fd)
+    try:
+        plan.sink_ipc(path, engine='streaming')
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                # The size of the record batches written by the sink depends
+                # on the version of Polars
+                batch = pl.from_arrow(reader.get_batch(i), rechunk=False)
+                yield from batch.iter_slices(batch_size)
+    finally:
+        os.remove(path)
+
+
+def query_batches(tables, number, batch_size=100_000, spill_dir=None):
+    """
+    Return a generator of the result of one of the BATCHED_QUERIES as
+    DataFrames of at most batch_size rows, in the order of the rows of the
+    result.
+    - tables: dict mapping the table names used in the SQL to DataFrames or
+      LazyFrames.
+    - number: number of the query.
+    - batch_size: maximum number of rows of each batch.
+    - spill_dir: directory of the temporary file of query 12.
+    """
+    if number not in BATCHED_QUERIES:
+        raise ValueError(
+            f'Unknown batched query {number!r}, expected one of '
+            f'{BATCHED_QUERIES}'
+        )
+    if batch_size < 1:
+        raise ValueError(f'Invalid batch size {batch_size!r}')
+    with SQLContext(frames=tables, eager=False) as ctx:
+        plan = ctx.execute(QUERIES[number])
+    if number in SLICED_QUERIES:
+        return iter_slices(plan, batch_size)
+    return iter_spilled(plan, batch_size, spill_dir)
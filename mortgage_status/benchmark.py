@@ -0,0 +1,237 @@
+"""
+===============================================================================
+Scaling Benchmark of the Pipeline
+===============================================================================
+For each number of applications, synthetic tables are generated and saved as
+Parquet files by a first process, then a second, fresh process times:
+- the loading of the five tables,
+- each of the 18 queries on its own,
+- all the queries together (lazy mode, as in the pipeline),
+- the scoring of the applications with the rule engine,
+- the whole run: loading, all the queries (query 18 with the rule engine)
+  and the writing of the status table,
+and records its peak resident memory (RSS), which therefore covers neither
+the generation of the tables nor the previous sizes.
+
+The results are saved as JSON and can be compared with those of a previous
+version to spot regressions:
+
+    python -m mortgage_status.benchmark --sizes 10000 1000000 \\
+        --output benchmarks/results.json --baseline benchmarks/previous.json
+"""
+# Standard libraries
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+# Other libraries
+import polars as pl
+
+
+from mortgage_status.instrumentation import peak_rss_mb
+from mortgage_status.loading import load_tables
+from mortgage_status.queries import QUERIES, execute_queries
+from mortgage_status.rules import RuleEngine
+from mortgage_status.schemas import SCHEMAS
+from mortgage_status.synthetic import generate, write_tables
+
+
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def best_time(function, repeat):
+    """
+    Return the best elapsed time of `repeat` calls of a function.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def generate_size(n_applications, directory, seed=0):
+    """
+    Generate the tables for a number of applications, save them as Parquet
+    files in a directory and return their paths, their row counts and the
+    generation time in seconds.
+    """
+    start = time.perf_counter()
+    tables = generate(n_applications, seed=seed)
+    generate_time = time.perf_counter() - start
+    rows = {name: df.height for name, df in tables.items()}
+    return write_tables(tables, directory), rows, generate_time
+
+
+def run_size(paths, repeat=1):
+    """
+    Benchmark the pipeline on the tables saved as Parquet files (a dict of
+    paths keyed by table name) and return the timings in seconds as a dict.
+    """
+    def load():
+        return load_tables(
+            sources=paths, reader=pl.read_parquet, schemas=SCHEMAS)[0]
+
+    rules = RuleEngine()
+
+    def run_all():
+        results = execute_queries(load(), rules=rules)
+        with tempfile.TemporaryDirectory() as directory:
+            results[18].write_parquet(
+                os.path.join(directory, 'status.parquet'))
+
+    load_time = best_time(load, repeat)
+    tables = load()
+    query_times = {
+        number: best_time(
+            lambda: execute_queries(tables, queries={number: query}),
+            repeat
+        )
+        for number, query in QUERIES.items()
+    }
+    all_queries_time = best_time(lambda: execute_queries(tables), repeat)
+    scoring_time = best_time(
+        lambda: execute_queries(
+            tables, queries={18: QUERIES[18]}, rules=rules),
+        repeat
+    )
+    del tables
+    return {
+        'load_s': load_time,
+        'queries_s': query_times,
+        'all_queries_s': all_queries_time,
+        'rule_engine_scoring_s': scoring_time,
+        'pipeline_s': best_time(run_all, repeat),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def run(sizes=None, seed=0, repeat=1):
+    """
+    Benchmark the pipeline for several numbers of applications, each in a
+    fresh process, and return the results with the versions of the
+    platform.
+    """
+    sizes = DEFAULT_SIZES if sizes is None else sizes
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            with ProcessPoolExecutor(
+                    max_workers=1, mp_context=context) as pool:
+                paths, rows, generate_time = pool.submit(
+                    generate_size, size, directory, seed).result()
+            with ProcessPoolExecutor(
+                    max_workers=1, mp_context=context) as pool:
+                timings = pool.submit(run_size, paths, repeat).result()
+        result = {
+            'n_applications': size,
+            'seed': seed,
+            'rows': rows,
+            'generate_s': generate_time,
+            **timings
+        }
+        print(
+            f'{size} applications: pipeline {result["pipeline_s"]:.3f} s, '
+            f'peak RSS {result["peak_rss_mb"]} MB'
+        )
+        results.append(result)
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'polars': pl.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat,
+        'results': results
+    }
+
+
+def compare(baseline, current, tolerance=0.2):
+    """
+    Compare two benchmark results and return the regressions, as tuples
+    (number of applications, measure, baseline time, current time), of the
+    measures more than `tolerance` slower than in the baseline.
+    """
+    def measures(result):
+        values = {
+            key: result[key]
+            for key in ('load_s', 'all_queries_s', 'rule_engine_scoring_s',
+                        'pipeline_s')
+            if key in result
+        }
+        values.update({
+            f'query_{number}_s': seconds
+            for number, seconds in result['queries_s'].items()
+        })
+        return values
+
+    baseline_results = {
+        result['n_applications']: measures(result)
+        for result in baseline['results']
+    }
+    regressions = []
+    for result in current['results']:
+        size = result['n_applications']
+        if size not in baseline_results:
+            continue
+        for key, seconds in measures(result).items():
+            reference = baseline_results[size].get(key)
+            if reference is not None and seconds > reference * (1 + tolerance):
+                regressions.append((size, key, reference, seconds))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the pipeline on synthetic datasets.')
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+        help='numbers of applications (from 10000 to 50000000)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--repeat', type=int, default=1,
+        help='number of runs of each measure (the best one is kept)')
+    parser.add_argument('--output', default='benchmarks/results.json')
+    parser.add_argument(
+        '--baseline', help='previous results to compare the new ones with')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2,
+        help='relative slowdown reported as a regression')
+    args = parser.parse_args(args)
+
+    results = run(sizes=args.sizes, seed=args.seed, repeat=args.repeat)
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(f'Results saved to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        # JSON keys are strings, as the query numbers of the saved results
+        results = json.loads(json.dumps(results))
+        regressions = compare(baseline, results, tolerance=args.tolerance)
+        for size, key, reference, seconds in regressions:
+            print(
+                f'Regression for {size} applications: {key} '
+                f'{reference:.3f} s -> {seconds:.3f} s'
+            )
+        if not regressions:
+            print('No regression')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,168 @@
+"""
+===============================================================================
+Columnar Cache of the Excel Inputs
+===============================================================================
+Parsing the XLSX workbooks is by far the slowest part of the loading. The
+first time a workbook is read, it is converted to a columnar file (Parquet or
+Arrow IPC) stored in the cache directory, next to a small JSON manifest
+holding the fingerprint of the workbook (size, modification time and SHA-256
+of its content). The following runs read the columnar copy as long as the
+fingerprint is unchanged, so only the workbooks that changed are parsed again.
+"""
+# Standard libraries
+import hashlib
+import json
+import os
+import threading
+
+# Other libraries
+import polars as pl
+
+
+from polars import read_excel
+
+
+
+# Columnar formats supported by the cache: file extension, reader and writer
+FORMATS = {
+    'parquet': ('.parquet', pl.read_parquet, pl.DataFrame.write_parquet),
+    'ipc': ('.arrow', pl.read_ipc, pl.DataFrame.write_ipc)
+}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Compute the SHA-256 hash of the content of a file.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def fingerprint(path):
+    """
+    Return the fingerprint (size, modification time and content hash) of a
+    file as a dict.
+    """
+    stat = os.stat(path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_hash(path)
+    }
+
+
+def write_atomic(df, path, writer):
+    """
+    Write a DataFrame with the given writer to a temporary file (unique to
+    the process and thread), then move it to its final path so a reader
+    never sees a partially written file.
+    """
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    writer(df, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class ExcelCache:
+    """
+    Cache of Excel workbooks converted to a columnar format.
+    - cache_dir: directory of the columnar copies and their manifests.
+    - fmt: columnar format of the copies ('parquet' or 'ipc').
+    """
+
+    def __init__(self, cache_dir='datasets/cache', fmt='parquet'):
+        if fmt not in FORMATS:
+            raise ValueError(
+                f'Unknown cache format {fmt!r}, expected one of '
+                f'{sorted(FORMATS)}'
+            )
+        self.cache_dir = cache_dir
+        self.fmt = fmt
+        self.hits = []
+        self.misses = []
+
+    def paths(self, source):
+        """
+        Return the paths of the columnar copy and of the manifest of a
+        workbook.
+        """
+        name = os.path.splitext(os.path.basename(source))[0]
+        extension = FORMATS[self.fmt][0]
+        data_path = os.path.join(self.cache_dir, name + extension)
+        manifest_path = os.path.join(self.cache_dir, name + '.json')
+        return data_path, manifest_path
+
+    def is_fresh(self, source):
+        """
+        Check whether the columnar copy of a workbook is up to date. The size
+        and modification time are compared first; the content hash is only
+        computed when they differ (a touched but unchanged workbook remains a
+        hit and its manifest is refreshed).
+        """
+        data_path, manifest_path = self.paths(source)
+        if not (os.path.exists(data_path) and os.path.exists(manifest_path)):
+            return False
+        with open(manifest_path, encoding='utf-8') as file:
+            manifest = json.load(file)
+        stat = os.stat(source)
+        if (manifest.get('size') == stat.st_size
+                and manifest.get('mtime_ns') == stat.st_mtime_ns):
+            return True
+        current = fingerprint(source)
+        if current['sha256'] != manifest.get('sha256'):
+            return False
+        self.write_manifest(manifest_path, current)
+        return True
+
+    def source_fingerprint(self, source):
+        """
+        Return the fingerprint of a workbook saved in its manifest when it
+        was last converted or checked (None if there is none).
+        """
+        try:
+            with open(self.paths(source)[1], encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def write_manifest(self, manifest_path, source_fingerprint):
+        """
+        Save the fingerprint of a workbook in its manifest.
+        """
+        tmp_path = f'{manifest_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(source_fingerprint, file, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def read(self, source):
+        """
+        Read a workbook, from its columnar copy when it is up to date or
+        from the XLSX file otherwise (the copy is then rebuilt).
+        """
+        data_path, manifest_path = self.paths(source)
+        _, reader, writer = FORMATS[self.fmt]
+        if self.is_fresh(source):
+            self.hits.append(source)
+            return reader(data_path)
+
+        self.misses.append(source)
+        source_fingerprint = fingerprint(source)
+        df = read_excel(source=source)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_atomic(df, data_path, writer)
+        self.write_manifest(manifest_path, source_fingerprint)
+        return df
+
+    def report(self):
+        """
+        Return a short report of the cache hits and misses.
+        """
+        lines = [
+            f'Input cache ({self.fmt}): {len(self.hits)} hit(s), '
+            f'{len(self.misses)} miss(es)'
+        ]
+        lines += [f'- hit: {source}' for source in self.hits]
+        lines += [f'- miss: {source}' for source in self.misses]
+        return '\n'.join(lines)
@@ -0,0 +1,258 @@
+"""
+===============================================================================
+Command Line Interface
+===============================================================================
+Run the pipeline, or one of its stages, with the default settings of
+mortgage_status.settings overridden by those of
+mortgage_applications_status.py (or of another settings file) and by the
+--set options (the --settings and --set options are accepted before or after
+the command):
+
+    python -m mortgage_status run
+    python -m mortgage_status load
+    python -m mortgage_status profile
+    python -m mortgage_status query 1 13 18
+    python -m mortgage_status score --set INCREMENTAL_SCORING=True
+    python -m mortgage_status export --set OUTPUT_FORMAT="'csv'"
+    python -m mortgage_status stream 12 --batch-size 10000 > query_12.csv
+    python -m mortgage_status daemon
+    python -m mortgage_status rollup Ville Année --where Accord="'O'"
+
+Polars and the modules of the pipeline are only imported once the command is
+known, and pandas and YData-profiling only by the workers of the full
+profiling, so the interface starts quickly. The check-import-time command
+checks it: it fails when importing this module takes more than a time budget
+or imports one of the HEAVY_MODULES.
+"""
+# Standard libraries
+import argparse
+import ast
+import contextlib
+import functools
+import os
+import runpy
+import subprocess
+import sys
+import warnings
+
+
+
+SETTINGS_FILE = 'mortgage_applications_status.py'
+
+# Modules which must not be imported with the interface
+HEAVY_MODULES = ('polars', 'pandas', 'ydata_profiling')
+
+
+def read_settings(path):
+    """
+    Return the settings (upper case names) defined by a settings file, which
+    is run without its __main__ block.
+    """
+    namespace = runpy.run_path(path, run_name='mortgage_status_settings')
+    return {
+        name: value for name, value in namespace.items() if name.isupper()
+    }
+
+
+def parse_setting(assignment):
+    """
+    Parse a NAME=VALUE override, whose value is a Python literal.
+    """
+    name, separator, value = assignment.partition('=')
+    if not separator:
+        raise argparse.ArgumentTypeError(
+            f'Expected NAME=VALUE, got {assignment!r}')
+    try:
+        return name.strip(), ast.literal_eval(value)
+    except (ValueError, SyntaxError) as error:
+        raise argparse.ArgumentTypeError(
+            f'Invalid value of {name.strip()}: {value!r}') from error
+
+
+def import_time(module='mortgage_status.cli'):
+    """
+    Import a module in a fresh interpreter and return the time it took in
+    seconds with the HEAVY_MODULES it imported.
+    """
+    code = (
+        'import sys, time\n'
+        'start = time.perf_counter()\n'
+        f'import {module}\n'
+        'print(time.perf_counter() - start)\n'
+        f'print(" ".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout.splitlines()
+    heavy = output[1].split() if len(output) > 1 else []
+    return float(output[0]), heavy
+
+
+def check_import_time(budget):
+    """
+    Check that importing the interface takes at most `budget` seconds
+    without importing any of the HEAVY_MODULES, and return the exit code.
+    """
+    seconds, heavy = import_time()
+    print(f'Import of mortgage_status.cli: {seconds * 1000:.1f} ms '
+          f'(budget: {budget * 1000:.0f} ms)')
+    if heavy:
+        print(f'Heavy modules imported: {", ".join(heavy)}')
+    return 0 if seconds <= budget and not heavy else 1
+
+
+def stream_query(pipeline, number, batch_size=None):
+    """
+    Write the result of a batched query as CSV to the standard output, one
+    batch after the other (the messages of the pipeline go to the standard
+    error), and return the exit code.
+    """
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            pipeline.load()
+            batches = pipeline.query_batches(number, batch_size=batch_size)
+        for index, batch in enumerate(batches):
+            batch.write_csv(sys.stdout, include_header=index == 0)
+            sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader stopped reading (python -m mortgage_status stream 12 |
+        # head): silence the error of the final flush as well
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    finally:
+        pipeline.close()
+    return 0
+
+
+def settings_options(overrides_dest):
+    """
+    Return a parent parser of the --settings and --set options, accepted
+    before and after the command (the overrides given after the command are
+    kept in overrides_dest, so that they add to those given before).
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        '--settings', default=argparse.SUPPRESS,
+        help='settings file (ignored when it does not exist)')
+    parser.add_argument(
+        '--set', dest=overrides_dest, type=parse_setting, action='append',
+        default=argparse.SUPPRESS, metavar='NAME=VALUE',
+        help='override a setting with a Python literal (repeatable)')
+    return parser
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m mortgage_status',
+        description='Determine the status of the mortgage applications.',
+        parents=[settings_options('overrides')])
+    parser.set_defaults(settings=SETTINGS_FILE, overrides=[])
+    commands = parser.add_subparsers(dest='command', required=True)
+    options = settings_options('command_overrides')
+    add_parser = functools.partial(commands.add_parser, parents=[options])
+    add_parser('run', help='run the whole pipeline')
+    add_parser('load', help='load the datasets')
+    add_parser('profile', help='profile the datasets')
+    query = add_parser('query', help='run some SQL queries')
+    query.add_argument(
+        'numbers', type=int, nargs='*',
+        help='numbers of the queries (all of them by default)')
+    add_parser(
+        'score', help='compute the status of the applications (query 18)')
+    add_parser(
+        'export', help='score the applications and save the status table')
+    stream = add_parser(
+        'stream',
+        help='write the result of query 9, 10 or 12 as CSV to the standard '
+             'output, batch by batch')
+    stream.add_argument('number', type=int, help='number of the query')
+    stream.add_argument(
+        '--batch-size', type=int, default=None,
+        help='rows of each batch (OUTPUT_BATCH_SIZE by default)')
+    add_parser(
+        'daemon',
+        help='keep the tables in memory, reload those whose workbook '
+             'changes and answer queries on http://127.0.0.1:DAEMON_PORT')
+    rollup = add_parser(
+        'rollup',
+        help='display the numbers and total amounts of the applications '
+             'from the rollup cube, grouped by some of its dimensions')
+    rollup.add_argument(
+        'dimensions', nargs='*',
+        help='dimensions to group by (the grand total if none)')
+    rollup.add_argument(
+        '--where', dest='filters', type=parse_setting, action='append',
+        default=[], metavar='NAME=VALUE',
+        help='keep the cells where a dimension has a Python literal value '
+             '(repeatable)')
+    check = commands.add_parser(
+        'check-import-time', help='check the import time of the interface')
+    check.add_argument(
+        '--budget', type=float, default=0.1, help='budget in seconds')
+    return parser
+
+
+def command_settings(args):
+    """
+    Return the settings of parsed arguments: those of the settings file,
+    overridden by the --set options given before, then after the command.
+    """
+    settings = {}
+    if os.path.exists(args.settings):
+        settings = read_settings(args.settings)
+    settings.update(args.overrides)
+    settings.update(getattr(args, 'command_overrides', []))
+    return settings
+
+
+def main(args=None):
+    args = build_parser().parse_args(args)
+    if args.command == 'check-import-time':
+        return check_import_time(args.budget)
+
+    settings = command_settings(args)
+
+    # Suppress warnings
+    warnings.filterwarnings('ignore')
+
+    from mortgage_status.pipeline import Pipeline
+
+    pipeline = Pipeline(settings=settings)
+    if args.command == 'run':
+        pipeline.run()
+        return 0
+    if args.command == 'stream':
+        return stream_query(pipeline, args.number, args.batch_size)
+    if args.command == 'daemon':
+        from mortgage_status.daemon import QueryDaemon, serve_queries
+
+        try:
+            serve_queries(
+                QueryDaemon(
+                    pipeline,
+                    poll_interval=pipeline.settings['DAEMON_POLL_INTERVAL']
+                ),
+                port=pipeline.settings['DAEMON_PORT']
+            )
+        finally:
+            pipeline.close()
+        return 0
+    try:
+        if args.command == 'load':
+            pipeline.load()
+        elif args.command == 'profile':
+            pipeline.profile()
+        elif args.command == 'query':
+            pipeline.query(args.numbers or None)
+        elif args.command == 'score':
+            pipeline.score()
+        elif args.command == 'export':
+            pipeline.export()
+        elif args.command == 'rollup':
+            print(pipeline.rollup(args.dimensions, **dict(args.filters)))
+    finally:
+        pipeline.close()
+    return 0
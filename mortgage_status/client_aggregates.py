@@ -0,0 +1,276 @@
+"""
+===============================================================================
+Materialized Aggregates of the Applications by Client
+===============================================================================
+Queries 6, 11 and 16 all group the mortgage_applications table by
+Numéro_client to count the applications and sum their amounts. The
+ClientAggregates table holds, for each client, the number of applications,
+the total, minimum and maximum amounts and the date of the last application.
+It is built once, saved in a state directory and then maintained
+incrementally:
+- the aggregates are mergeable, so new applications are simply aggregated on
+  their own and merged with the saved table,
+- the clients of the changed or deleted applications (the fingerprints of the
+  applications are saved with the table) are aggregated again from their own
+  applications only,
+- the state is written again only when some applications changed.
+The queries (and their variants with other HAVING thresholds) then read the
+small client table instead of aggregating the applications again.
+"""
+# Standard libraries
+import json
+import os
+
+# Other libraries
+import polars as pl
+
+
+from mortgage_status.cache import write_atomic
+from mortgage_status.incremental import FINGERPRINT_COLUMN
+from mortgage_status.queries import APPLICATION_KEY, CLIENT_KEY
+
+
+
+AMOUNT_COLUMN = 'Montant_opération'
+DATE_COLUMN = 'Date_de_demande'
+COUNT_COLUMN = 'Nombre_demandes_de_prêts'
+TOTAL_COLUMN = 'Montant_total_opérations'
+MIN_COLUMN = 'Montant_minimum_opération'
+MAX_COLUMN = 'Montant_maximum_opération'
+LAST_DATE_COLUMN = 'Date_dernière_demande'
+
+IRREGULAR_INCOME = '3 : Très irréguliers'
+
+# Queries answered by the aggregates
+AGGREGATED_QUERIES = (6, 11, 16)
+
+
+def aggregate(applications):
+    """
+    Aggregate applications by client.
+    """
+    return applications.group_by(CLIENT_KEY).agg(
+        pl.col(APPLICATION_KEY).count().alias(COUNT_COLUMN),
+        pl.col(AMOUNT_COLUMN).sum().alias(TOTAL_COLUMN),
+        pl.col(AMOUNT_COLUMN).min().alias(MIN_COLUMN),
+        pl.col(AMOUNT_COLUMN).max().alias(MAX_COLUMN),
+        pl.col(DATE_COLUMN).max().alias(LAST_DATE_COLUMN)
+    )
+
+
+def merge(aggregates):
+    """
+    Merge aggregate tables (of disjoint sets of applications) into one.
+    """
+    return pl.concat(aggregates).group_by(CLIENT_KEY).agg(
+        pl.col(COUNT_COLUMN).sum(),
+        pl.col(TOTAL_COLUMN).sum(),
+        pl.col(MIN_COLUMN).min(),
+        pl.col(MAX_COLUMN).max(),
+        pl.col(LAST_DATE_COLUMN).max()
+    )
+
+
+def application_fingerprints(applications):
+    """
+    Return the client and the fingerprint (hash of the row) of each
+    application.
+    """
+    # hash_rows borrows the DataFrame mutably, which fails while another
+    # thread reads it (stage graph): hash a shallow copy
+    return applications.select(
+        APPLICATION_KEY,
+        CLIENT_KEY,
+        applications.clone().hash_rows(seed=0).alias(FINGERPRINT_COLUMN)
+    )
+
+
+class ClientAggregates:
+    """
+    Aggregates of the applications by client, saved in a state directory.
+    - state_dir: directory of the aggregates and of the fingerprints of the
+      applications they were computed from.
+    After each update, the statistics attribute holds the numbers of new,
+    changed and deleted applications and of aggregated clients.
+    """
+
+    def __init__(self, state_dir='datasets/client_aggregates'):
+        self.state_dir = state_dir
+        self.table = None
+        self.schema = {}
+        self.statistics = {}
+
+    def path(self, name):
+        """
+        Return the path of a file of the state directory.
+        """
+        return os.path.join(self.state_dir, name)
+
+    def signature(self):
+        """
+        Return what the saved state depends on besides the data: the version
+        of Polars (whose row hashes are not stable across versions) and the
+        types of the applications (set by update).
+        """
+        return {'polars': pl.__version__, 'schema': self.schema}
+
+    def load_state(self):
+        """
+        Load the saved aggregates and fingerprints, or return None when there
+        is no compatible state.
+        """
+        try:
+            with open(self.path('state.json'), encoding='utf-8') as file:
+                signature = json.load(file)
+        except FileNotFoundError:
+            return None
+        if signature != self.signature():
+            return None
+        return (
+            pl.read_parquet(self.path('aggregates.parquet')),
+            pl.read_parquet(self.path('applications.parquet'))
+        )
+
+    def save_state(self, current):
+        """
+        Save the aggregates and the fingerprints of the applications (the
+        signature is written last, so an interrupted save is never taken as a
+        valid state).
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        state_path = self.path('state.json')
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        write_atomic(
+            self.table,
+            self.path('aggregates.parquet'),
+            pl.DataFrame.write_parquet
+        )
+        write_atomic(
+            current,
+            self.path('applications.parquet'),
+            pl.DataFrame.write_parquet
+        )
+        with open(state_path, 'w', encoding='utf-8') as file:
+            json.dump(self.signature(), file, indent=2)
+
+    def update(self, applications):
+        """
+        Bring the aggregates up to date with the mortgage_applications table
+        and return them.
+        """
+        current = application_fingerprints(applications)
+        self.schema = {
+            column: str(dtype) for column, dtype in applications.schema.items()
+        }
+        state = self.load_state()
+        changed = True
+        if state is None:
+            self.table = aggregate(applications)
+            self.statistics = {
+                'full': True,
+                'new': applications.height,
+                'changed': 0,
+                'deleted': 0,
+                'aggregated_clients': self.table.height
+            }
+        else:
+            table, previous = state
+            joined = previous.join(
+                current, on=APPLICATION_KEY, how='full', coalesce=True,
+                suffix='_current'
+            )
+            fingerprint = pl.col(FINGERPRINT_COLUMN)
+            current_fingerprint = pl.col(f'{FINGERPRINT_COLUMN}_current')
+            new = joined.filter(fingerprint.is_null())[APPLICATION_KEY]
+            modified = joined.filter(
+                fingerprint.is_not_null()
+                & fingerprint.ne_missing(current_fingerprint)
+            )
+            changed = not (new.is_empty() and modified.is_empty())
+
+            # Clients of the changed or deleted applications, before and
+            # after the change, are aggregated again from scratch (a null
+            # Numéro_client is a client of its own, as in the GROUP BY)
+            clients = pl.concat([
+                modified[CLIENT_KEY],
+                modified.filter(current_fingerprint.is_not_null())[
+                    f'{CLIENT_KEY}_current']
+            ]).unique().implode()
+            affected = pl.col(CLIENT_KEY).is_in(clients, nulls_equal=True)
+            # The new applications of the other clients are merged
+            added = applications.filter(
+                pl.col(APPLICATION_KEY).is_in(new.implode()) & ~affected)
+            self.table = merge([
+                table.filter(~affected),
+                aggregate(added),
+                aggregate(applications.filter(affected))
+            ])
+            deleted = modified[f'{FINGERPRINT_COLUMN}_current'].null_count()
+            self.statistics = {
+                'full': False,
+                'new': new.len(),
+                'changed': modified.height - deleted,
+                'deleted': deleted,
+                'aggregated_clients': clients.list.len()[0]
+                + added[CLIENT_KEY].n_unique()
+            }
+        if changed:
+            self.save_state(current)
+        return self.table
+
+    def totals(self, threshold, strict=False):
+        """
+        Return the Numéro_client, Nombre_demandes_de_prêts and
+        Montant_total_opérations of the clients whose total amount is at
+        least (or, if strict, greater than) a threshold.
+        """
+        amount = pl.col(TOTAL_COLUMN)
+        condition = amount > threshold if strict else amount >= threshold
+        return self.table.filter(condition).select(
+            CLIENT_KEY, COUNT_COLUMN, TOTAL_COLUMN)
+
+    def with_pro_status(self, pro_status, regularity=IRREGULAR_INCOME):
+        """
+        Return the aggregates of the clients of pro_status whose income has
+        the given regularity, with their professional situation (the clients
+        without application have no application and a total amount of 0, as
+        the SUM of Polars SQL).
+        """
+        return (
+            pro_status
+            .filter(pl.col('Régularité_des_revenus') == regularity)
+            .join(
+                self.table.select(CLIENT_KEY, COUNT_COLUMN, TOTAL_COLUMN),
+                on=CLIENT_KEY,
+                how='left'
+            )
+            .with_columns(pl.col(COUNT_COLUMN, TOTAL_COLUMN).fill_null(0))
+            .select(
+                CLIENT_KEY,
+                COUNT_COLUMN,
+                TOTAL_COLUMN,
+                pl.all().exclude(CLIENT_KEY, COUNT_COLUMN, TOTAL_COLUMN)
+            )
+        )
+
+    def answer(self, number, pro_status=None):
+        """
+        Return the result of one of the AGGREGATED_QUERIES (query 16 needs
+        the pro_status table).
+        """
+        if number == 6:
+            return self.totals(300000).sort(COUNT_COLUMN, descending=True)
+        if number == 11:
+            return (
+                self.totals(300000, strict=True)
+                .select(CLIENT_KEY, TOTAL_COLUMN)
+                .sort(TOTAL_COLUMN, descending=True)
+            )
+        if number == 16:
+            return self.with_pro_status(pro_status).sort(
+                TOTAL_COLUMN, descending=True)
+        raise ValueError(
+            f'Query {number} cannot be answered by the aggregates, expected '
+            f'one of {AGGREGATED_QUERIES}'
+        )
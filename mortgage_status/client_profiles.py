@@ -0,0 +1,216 @@
+"""
+===============================================================================
+Client-Profile Dimension
+===============================================================================
+Queries 15 to 18 join the mortgage applications to pro_status and/or
+family_status on Numéro_client, and query 18 chains three joins. The
+client_profiles table merges pro_status and family_status once (full join,
+so that every client of either table keeps its row) and is sorted by
+Numéro_client; the queries below then join the applications to it once.
+
+Both tables must have a single row per client: a duplicated client would
+silently multiply the rows of the queries, so building the dimension fails
+instead. The columns of the dimension keep the names of the source tables,
+and the results of the queries are those of the original ones.
+"""
+# Other libraries
+import polars as pl
+
+
+from mortgage_status.queries import CLIENT_KEY
+
+
+
+PROFILE_TABLE = 'client_profiles'
+
+# Tables merged into the dimension
+PROFILE_SOURCES = ('pro_status', 'family_status')
+
+# Queries 15 to 18 joining the client profiles (query 16 keeps the clients
+# of pro_status through the filter on Régularité_des_revenus)
+QUERY_15_PROFILES = """
+SELECT
+    COALESCE(
+        mortgage_applications.Numéro_client,
+        client_profiles.Numéro_client
+    ) AS Numéro_client,
+    Montant_opération,
+    Catégorie_socioprofessionnelle,
+    Statut_emploi,
+    Régularité_des_revenus
+FROM mortgage_applications
+LEFT JOIN client_profiles USING (Numéro_client)
+WHERE Régularité_des_revenus = '3 : Très irréguliers'
+ORDER BY Montant_opération DESC;
+"""
+
+QUERY_16_PROFILES = """
+WITH pro_situations AS (
+    SELECT
+        COALESCE(
+            mortgage_applications.Numéro_client,
+            client_profiles.Numéro_client
+        ) AS Numéro_client,
+        mortgage_applications.Numéro_demande_de_prêt,
+        mortgage_applications.Montant_opération,
+        client_profiles.Catégorie_socioprofessionnelle,
+        client_profiles.Statut_emploi,
+        client_profiles.Régularité_des_revenus,
+        client_profiles.Revenu_mensuel_moyen
+    FROM mortgage_applications
+    RIGHT JOIN client_profiles USING (Numéro_client)
+),
+SELECT
+    Numéro_client,
+    COUNT(Numéro_demande_de_prêt) AS Nombre_demandes_de_prêts,
+    SUM(Montant_opération) AS Montant_total_opérations,
+    Catégorie_socioprofessionnelle,
+    Statut_emploi,
+    Régularité_des_revenus,
+    Revenu_mensuel_moyen
+FROM pro_situations
+WHERE Régularité_des_revenus = '3 : Très irréguliers'
+GROUP BY
+    Numéro_client,
+    Catégorie_socioprofessionnelle,
+    Statut_emploi,
+    Régularité_des_revenus,
+    Revenu_mensuel_moyen
+ORDER BY
+    Montant_total_opérations DESC;
+"""
+
+QUERY_17_PROFILES = """
+SELECT
+    COALESCE(
+        mortgage_applications.Numéro_client,
+        client_profiles.Numéro_client
+    ) AS Numéro_client,
+    Date_de_demande,
+    Durée,
+    Montant_opération,
+    DIV(Durée, 12) AS Durée_annuelle,
+    Date_de_naissance,
+    DATE_PART('year', Date_de_demande) - DATE_PART('year',
+        Date_de_naissance) AS Age
+FROM mortgage_applications
+LEFT JOIN client_profiles USING (Numéro_client)
+WHERE
+    DATE_PART('year', Date_de_demande) - DATE_PART('year',
+        Date_de_naissance) + DIV(Durée, 12) >= 82
+ORDER BY
+    Durée_annuelle DESC;
+"""
+
+FINANCIAL_SITUATIONS = """
+WITH financial_situations AS (
+    SELECT
+        COALESCE(
+            mortgage_applications.Numéro_demande_de_prêt,
+            down_payment.Numéro_demande_de_prêt
+        ) AS Numéro_demande_de_prêt,
+        mortgage_applications.Numéro_client,
+        mortgage_applications.Date_de_demande,
+        mortgage_applications.Montant_opération,
+        mortgage_applications.Durée,
+        mortgage_applications.Accord,
+        down_payment.Apport,
+        Montant_opération - Apport AS Montant_du_prêt,
+        DIV(Durée, 12) AS Durée_annuelle,
+        DIV(Montant_opération - Apport, Durée) AS Remboursement_mensuel
+    FROM mortgage_applications
+    FULL JOIN down_payment USING (Numéro_demande_de_prêt)
+),
+"""
+
+QUERY_18_PROFILES = FINANCIAL_SITUATIONS + """
+SELECT
+    COALESCE(
+        financial_situations.Numéro_client,
+        client_profiles.Numéro_client
+    ) AS Numéro_client,
+    financial_situations.Date_de_demande,
+    financial_situations.Montant_opération,
+    financial_situations.Apport,
+    financial_situations.Durée,
+    financial_situations.Montant_du_prêt,
+    financial_situations.Remboursement_mensuel,
+    financial_situations.Accord,
+    client_profiles.Revenu_mensuel_moyen,
+    client_profiles.Régularité_des_revenus,
+    client_profiles.Date_de_naissance,
+    client_profiles.Nombre_enfants_à_charge,
+    CASE
+        WHEN DATE_PART('year', Date_de_demande) - DATE_PART( 'year',
+            Date_de_naissance) + Durée_annuelle >= 82 THEN 'Refusé'
+        WHEN Régularité_des_revenus = '3 : Très irréguliers' THEN 'Refusé'
+        WHEN Remboursement_mensuel > 0.33 * Revenu_mensuel_moyen +
+            Nombre_enfants_à_charge THEN 'Refusé'
+        ELSE 'Accepté'
+    END AS Statut_demande_de_prêt
+FROM financial_situations
+LEFT JOIN client_profiles USING (Numéro_client)
+ORDER BY Statut_demande_de_prêt DESC;
+"""
+
+QUERY_18_SITUATIONS_PROFILES = FINANCIAL_SITUATIONS + """
+SELECT
+    financial_situations.Numéro_demande_de_prêt,
+    COALESCE(
+        financial_situations.Numéro_client,
+        client_profiles.Numéro_client
+    ) AS Numéro_client,
+    financial_situations.Date_de_demande,
+    financial_situations.Montant_opération,
+    financial_situations.Apport,
+    financial_situations.Durée,
+    financial_situations.Montant_du_prêt,
+    financial_situations.Remboursement_mensuel,
+    financial_situations.Accord,
+    client_profiles.Revenu_mensuel_moyen,
+    client_profiles.Régularité_des_revenus,
+    client_profiles.Date_de_naissance,
+    client_profiles.Nombre_enfants_à_charge
+FROM financial_situations
+LEFT JOIN client_profiles USING (Numéro_client);
+"""
+
+# Queries answered from the dimension
+PROFILE_QUERIES = {
+    15: QUERY_15_PROFILES,
+    16: QUERY_16_PROFILES,
+    17: QUERY_17_PROFILES,
+    18: QUERY_18_PROFILES
+}
+
+
+def check_unique_clients(df, name):
+    """
+    Raise a ValueError if a client has several rows in a table.
+    """
+    duplicated = (
+        df.select(CLIENT_KEY).drop_nulls()
+        .filter(pl.col(CLIENT_KEY).is_duplicated())
+        .unique()[CLIENT_KEY]
+    )
+    if duplicated.len():
+        raise ValueError(
+            f'Duplicated {CLIENT_KEY} in {name}: '
+            f'{duplicated.sort().head(10).to_list()} '
+            f'({duplicated.len()} client(s))'
+        )
+
+
+def build_client_profiles(pro_status, family_status):
+    """
+    Merge pro_status and family_status into the client-profile dimension,
+    sorted by Numéro_client, after checking that each of them has a single
+    row per client.
+    """
+    check_unique_clients(pro_status, 'pro_status')
+    check_unique_clients(family_status, 'family_status')
+    return (
+        pro_status.join(
+            family_status, on=CLIENT_KEY, how='full', coalesce=True)
+        .sort(CLIENT_KEY, nulls_last=True)
+    )
@@ -0,0 +1,254 @@
+"""
+===============================================================================
+Resident Query Daemon
+===============================================================================
+The daemon loads the five tables once and keeps them in memory. A watcher
+thread polls the workbooks of the datasets (size and modification time) and
+reloads only the table whose workbook changed, through the loading of the
+pipeline (input cache, schema registry and shared store included); the
+queries being answered keep the tables they started with.
+
+A thin HTTP endpoint, bound to the local host, answers over the warm tables:
+- GET /query/<number>?limit=<rows>: result of a named query (1 to 18, query
+  18 with the rule engine of the pipeline if enabled).
+- POST /sql with a JSON body {"sql": "...", "limit": <rows>}: result of an
+  ad hoc SQL query over the tables (mortgage_applications, branches,
+  pro_status, down_payment and family_status).
+- GET /status: row count and last reload of each table.
+- GET /metrics: number of requests and p50/p99 latencies in milliseconds.
+A result is returned as {"height": ..., "columns": [...], "rows": [...]},
+with at most limit rows (DEFAULT_LIMIT by default).
+"""
+# Standard libraries
+import json
+import os
+import threading
+import time
+
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+from polars import SQLContext
+from mortgage_status.queries import QUERIES, execute_queries
+from mortgage_status.service import (
+    REQUEST_ERRORS, LatencyRecorder, ScoringHandler
+)
+
+
+
+# Maximum number of rows of a result when the request gives no limit
+DEFAULT_LIMIT = 1000
+
+
+def file_state(path):
+    """
+    Return the size and modification time of a file (None when it does not
+    exist).
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def to_payload(df, limit=DEFAULT_LIMIT):
+    """
+    Return a result as a JSON-serializable dict with at most limit rows.
+    """
+    return {
+        'height': df.height,
+        'columns': df.columns,
+        'rows': df.head(limit).to_dicts()
+    }
+
+
+class QueryDaemon:
+    """
+    Keep the tables of a pipeline in memory and answer queries over them.
+    - pipeline: Pipeline whose settings and inputs the tables are loaded
+      with.
+    - poll_interval: seconds between two checks of the workbooks.
+    """
+
+    def __init__(self, pipeline, poll_interval=1.0):
+        self.pipeline = pipeline
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.states = {}
+        self.reloads = {}
+        self.latencies = LatencyRecorder()
+        self.stopped = threading.Event()
+        self.watcher = None
+
+    def load(self):
+        """
+        Load all the tables and remember the state of their workbooks.
+        """
+        states = {
+            name: file_state(source)
+            for name, source in self.pipeline.inputs.items()
+        }
+        tables = self.pipeline.load()
+        with self.lock:
+            self.tables = dict(tables)
+            self.states = states
+            self.reloads = {name: time.time() for name in tables}
+
+    def refresh(self):
+        """
+        Reload the tables whose workbook changed since they were loaded and
+        return their names. A table which fails to load (a workbook being
+        written, for instance) keeps its previous version and is tried
+        again at the next refresh.
+        """
+        reloaded = []
+        for name, source in self.pipeline.inputs.items():
+            state = file_state(source)
+            if state is None or state == self.states.get(name):
+                continue
+            try:
+                df = self.pipeline.load_table(name)
+            except Exception as error:
+                print(f'Reload of {name} failed: {error}')
+                continue
+            with self.lock:
+                self.tables = {**self.tables, name: df}
+                self.states[name] = state
+                self.reloads[name] = time.time()
+            reloaded.append(name)
+            print(f'Reloaded {name} ({df.height} rows)')
+        return reloaded
+
+    def watch(self):
+        """
+        Refresh the tables every poll_interval seconds until stopped.
+        """
+        while not self.stopped.wait(self.poll_interval):
+            self.refresh()
+
+    def start(self):
+        """
+        Load the tables and start the watcher thread.
+        """
+        self.load()
+        self.stopped.clear()
+        self.watcher = threading.Thread(target=self.watch, daemon=True)
+        self.watcher.start()
+
+    def stop(self):
+        """
+        Stop the watcher thread.
+        """
+        self.stopped.set()
+        if self.watcher is not None:
+            self.watcher.join()
+            self.watcher = None
+
+    def snapshot(self):
+        """
+        Return the current tables (a reload replaces the dict, so the
+        snapshot never changes).
+        """
+        with self.lock:
+            return self.tables
+
+    def query(self, number):
+        """
+        Return the result of a named query.
+        """
+        if number not in QUERIES:
+            raise ValueError(
+                f'Unknown query {number!r}, expected one of {sorted(QUERIES)}'
+            )
+        start = time.perf_counter()
+        try:
+            return execute_queries(
+                tables=self.snapshot(),
+                queries={number: QUERIES[number]},
+                rules=self.pipeline.rule_engine
+            )[number]
+        finally:
+            self.latencies.record(time.perf_counter() - start)
+
+    def sql(self, query):
+        """
+        Return the result of an ad hoc SQL query over the tables.
+        """
+        start = time.perf_counter()
+        try:
+            with SQLContext(frames=self.snapshot(), eager=True) as ctx:
+                return ctx.execute(query)
+        finally:
+            self.latencies.record(time.perf_counter() - start)
+
+    def status(self):
+        """
+        Return the row count and the last reload (Unix time) of each table.
+        """
+        with self.lock:
+            return {
+                name: {'rows': df.height, 'reloaded_at': self.reloads[name]}
+                for name, df in self.tables.items()
+            }
+
+
+class QueryHandler(ScoringHandler):
+    """
+    HTTP handler of the query endpoint (the daemon is the query_daemon
+    attribute of the server).
+    """
+
+    def do_GET(self):
+        daemon = self.server.query_daemon
+        url = urlsplit(self.path)
+        if url.path == '/metrics':
+            self.send_json(daemon.latencies.summary())
+        elif url.path == '/status':
+            self.send_json(daemon.status())
+        elif url.path.startswith('/query/'):
+            try:
+                number = int(url.path[len('/query/'):])
+                limit = int(
+                    parse_qs(url.query).get('limit', [DEFAULT_LIMIT])[0])
+                result = daemon.query(number)
+            except REQUEST_ERRORS as error:
+                self.send_json({'error': str(error)}, 400)
+                return
+            self.send_json(to_payload(result, limit))
+        else:
+            self.send_json({'error': 'Not found'}, 404)
+
+    def do_POST(self):
+        daemon = self.server.query_daemon
+        if self.path != '/sql':
+            self.send_json({'error': 'Not found'}, 404)
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+            limit = int(payload.get('limit', DEFAULT_LIMIT))
+            result = daemon.sql(payload['sql'])
+        except REQUEST_ERRORS as error:
+            self.send_json({'error': str(error)}, 400)
+            return
+        self.send_json(to_payload(result, limit))
+
+
+def serve_queries(daemon, host='127.0.0.1', port=8019):
+    """
+    Start the daemon and serve its queries over HTTP until interrupted.
+    """
+    daemon.start()
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.query_daemon = daemon
+    print(f'Query daemon listening on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.stop()
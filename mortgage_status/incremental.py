@@ -0,0 +1,248 @@
+"""
+===============================================================================
+Incremental Scoring of the Mortgage Applications
+===============================================================================
+Instead of scoring every application at each run, the status table of the
+previous run is kept in a state directory together with the fingerprints
+(hashes of the rows) of the tables used by query 18:
+- mortgage_applications and down_payment, by Numéro_demande_de_prêt,
+- pro_status and family_status, by Numéro_client.
+
+At the next run, only the applications which are new or changed, whose down
+payment changed, or whose applicant's professional or family situation
+changed, are scored again and merged with the previous status table (the
+deleted applications are removed), and the state is written again only when
+some fingerprints changed. The cost of a run is then proportional to the
+changes. The whole table is scored again when the rules or the version of
+Polars (whose row hashes are not stable across versions) change.
+"""
+# Standard libraries
+import json
+import os
+
+# Other libraries
+import polars as pl
+
+
+from polars import SQLContext
+from mortgage_status.cache import write_atomic
+from mortgage_status.queries import (
+    APPLICATION_KEY, CLIENT_KEY, QUERY_18_SITUATIONS
+)
+from mortgage_status.rules import STATUS_COLUMN, RuleEngine
+
+
+
+# Tables used by query 18 and the key of their fingerprints
+FINGERPRINTED_TABLES = {
+    'mortgage_applications': APPLICATION_KEY,
+    'down_payment': APPLICATION_KEY,
+    'pro_status': CLIENT_KEY,
+    'family_status': CLIENT_KEY
+}
+
+FINGERPRINT_COLUMN = 'Empreinte'
+
+
+def fingerprints(df, key):
+    """
+    Return the fingerprint of the rows of each key value of a table (keys
+    with several rows get a single fingerprint of all their rows).
+    """
+    # hash_rows borrows the DataFrame mutably, which fails while another
+    # thread reads it (stage graph): hash a shallow copy
+    hashes = df.select(
+        pl.col(key),
+        df.clone().hash_rows(seed=0).alias(FINGERPRINT_COLUMN)
+    )
+    return (
+        hashes.group_by(key)
+        .agg(pl.col(FINGERPRINT_COLUMN).sort())
+        .with_columns(pl.col(FINGERPRINT_COLUMN).hash(seed=0))
+    )
+
+
+def changed_keys(previous, current, key):
+    """
+    Return the key values which were added, changed or deleted between two
+    fingerprint tables.
+    """
+    joined = previous.join(
+        current, on=key, how='full', coalesce=True, suffix='_current')
+    return joined.filter(
+        pl.col(FINGERPRINT_COLUMN).ne_missing(
+            pl.col(f'{FINGERPRINT_COLUMN}_current'))
+    )[key]
+
+
+class IncrementalScorer:
+    """
+    Score the mortgage applications incrementally.
+    - state_dir: directory of the previous status table and fingerprints.
+    - rules: RuleEngine computing the status (the rules of query 18 by
+      default).
+    After each update, the statistics attribute holds the numbers of new,
+    changed, deleted and rescored applications.
+    """
+
+    def __init__(self, state_dir='datasets/incremental', rules=None):
+        self.state_dir = state_dir
+        self.rules = RuleEngine() if rules is None else rules
+        self.schema = {}
+        self.statistics = {}
+
+    def path(self, name):
+        """
+        Return the path of a file of the state directory.
+        """
+        return os.path.join(self.state_dir, name)
+
+    def signature(self):
+        """
+        Return what the saved state depends on besides the data (including
+        the types of the tables, set by update).
+        """
+        return {
+            'polars': pl.__version__,
+            'rules': [repr(rule) for rule in self.rules.rules],
+            'schema': self.schema
+        }
+
+    def load_state(self):
+        """
+        Load the previous status table and fingerprints, or return None when
+        there is no compatible state.
+        """
+        try:
+            with open(self.path('state.json'), encoding='utf-8') as file:
+                signature = json.load(file)
+        except FileNotFoundError:
+            return None
+        if signature != self.signature():
+            return None
+        status = pl.read_parquet(self.path('status.parquet'))
+        previous = {
+            name: pl.read_parquet(self.path(f'fingerprints_{name}.parquet'))
+            for name in FINGERPRINTED_TABLES
+        }
+        return status, previous
+
+    def save_state(self, status, current):
+        """
+        Save the status table and the fingerprints (the signature is written
+        last, so an interrupted save is never taken as a valid state).
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        state_path = self.path('state.json')
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        write_atomic(
+            status, self.path('status.parquet'), pl.DataFrame.write_parquet)
+        for name, df in current.items():
+            write_atomic(
+                df,
+                self.path(f'fingerprints_{name}.parquet'),
+                pl.DataFrame.write_parquet
+            )
+        with open(state_path, 'w', encoding='utf-8') as file:
+            json.dump(self.signature(), file, indent=2)
+
+    def score(self, tables):
+        """
+        Score the applications of the given tables (with their key).
+        """
+        frames = {name: tables[name] for name in FINGERPRINTED_TABLES}
+        with SQLContext(frames=frames, eager=True) as ctx:
+            situations = ctx.execute(QUERY_18_SITUATIONS)
+        return self.rules.score(situations, sort=False)
+
+    def update(self, tables):
+        """
+        Bring the status table up to date with the tables (a dict of
+        DataFrames keyed by table name) and return it, with the
+        Numéro_demande_de_prêt column and sorted by status as in query 18.
+        """
+        current = {
+            name: fingerprints(tables[name], key)
+            for name, key in FINGERPRINTED_TABLES.items()
+        }
+        self.schema = {
+            name: {
+                column: str(dtype)
+                for column, dtype in tables[name].schema.items()
+            }
+            for name in FINGERPRINTED_TABLES
+        }
+        state = self.load_state()
+        changed = True
+        if state is None:
+            status = self.score(tables)
+            self.statistics = {
+                'full': True,
+                'new': status.height,
+                'changed': 0,
+                'deleted': 0,
+                'rescored': status.height
+            }
+        else:
+            status, previous = state
+            applications = tables['mortgage_applications']
+            down_payment = tables['down_payment']
+
+            # Applications whose row, down payment or applicant changed
+            changed_applications = pl.concat([
+                changed_keys(previous[name], current[name], APPLICATION_KEY)
+                for name in ('mortgage_applications', 'down_payment')
+            ])
+            changed_clients = pl.concat([
+                changed_keys(previous[name], current[name], CLIENT_KEY)
+                for name in ('pro_status', 'family_status')
+            ])
+            changed = not (changed_applications.is_empty()
+                           and changed_clients.is_empty())
+            affected = pl.concat([
+                changed_applications,
+                applications.filter(
+                    pl.col(CLIENT_KEY).is_in(changed_clients.implode())
+                )[APPLICATION_KEY]
+            ]).unique()
+
+            # Score the affected applications again
+            affected_applications = applications.filter(
+                pl.col(APPLICATION_KEY).is_in(affected.implode()))
+            clients = affected_applications[CLIENT_KEY].unique().implode()
+            rescored = self.score({
+                'mortgage_applications': affected_applications,
+                'down_payment': down_payment.filter(
+                    pl.col(APPLICATION_KEY).is_in(affected.implode())),
+                'pro_status': tables['pro_status'].filter(
+                    pl.col(CLIENT_KEY).is_in(clients)),
+                'family_status': tables['family_status'].filter(
+                    pl.col(CLIENT_KEY).is_in(clients))
+            })
+
+            # Merge them with the unchanged applications which still exist
+            existing = pl.concat([
+                applications[APPLICATION_KEY], down_payment[APPLICATION_KEY]
+            ]).unique()
+            previous_keys = status[APPLICATION_KEY]
+            kept = status.filter(
+                ~pl.col(APPLICATION_KEY).is_in(affected.implode())
+                & pl.col(APPLICATION_KEY).is_in(existing.implode())
+            )
+            new = rescored.filter(
+                ~pl.col(APPLICATION_KEY).is_in(previous_keys.implode())).height
+            self.statistics = {
+                'full': False,
+                'new': new,
+                'changed': rescored.height - new,
+                'deleted': status.height - kept.height
+                - (rescored.height - new),
+                'rescored': rescored.height
+            }
+            status = pl.concat([kept, rescored])
+
+        status = status.sort(STATUS_COLUMN, descending=True)
+        if changed:
+            self.save_state(status, current)
+        return status
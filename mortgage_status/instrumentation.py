@@ -0,0 +1,194 @@
+"""
+===============================================================================
+Instrumentation of the Pipeline
+===============================================================================
+Each stage of the pipeline (load, profile, query, write...) can be recorded
+as a span, in the spirit of OpenTelemetry, with:
+- its wall clock and CPU times (of all the threads of the process),
+- the resident memory of the process at the end of the stage and its change
+  during the stage (sampled at both ends, so a peak reached and released
+  within the stage is not seen), and the high-water mark of the resident
+  memory of the process so far, which never decreases,
+- its input and output row counts,
+- the optimized plans of its queries.
+
+The spans are written as JSON lines to a local file. A disabled tracer hands
+out a shared no-op span, so the instrumentation costs nothing when it is
+switched off (the query plans, in particular, are only computed when
+tracing).
+"""
+# Standard libraries
+import json
+import os
+import platform
+import threading
+import time
+import uuid
+
+
+
+def rss_mb():
+    """
+    Return the current resident memory of the process in MB (None when it
+    is not available on the platform).
+    """
+    try:
+        with open('/proc/self/statm', encoding='ascii') as file:
+            pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+
+def peak_rss_mb():
+    """
+    Return the high-water mark of the resident memory of the process in MB
+    (None when it is not available on the platform).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    divisor = 1024 ** 2 if platform.system() == 'Darwin' else 1024
+    return peak / divisor
+
+
+class Span:
+    """
+    Stage being recorded, used as a context manager.
+    """
+
+    def __init__(self, tracer, name, kind, parent=None, **attributes):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = None if parent is None else parent.span_id
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """
+        Add attributes to the span (input_rows, output_rows...).
+        """
+        self.attributes.update(attributes)
+
+    def set_plan(self, lazy_frame, key=None):
+        """
+        Add the optimized plan of a LazyFrame to the span (under
+        plans[key] when a key is given).
+        """
+        plan = lazy_frame.explain()
+        if key is None:
+            self.attributes['plan'] = plan
+        else:
+            self.attributes.setdefault('plans', {})[str(key)] = plan
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.start_rss = rss_mb()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        rss = rss_mb()
+        rss_change = None
+        if rss is not None and self.start_rss is not None:
+            rss_change = rss - self.start_rss
+        self.tracer.emit({
+            'trace_id': self.tracer.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start_time_unix_nano': self.start_ns,
+            'end_time_unix_nano': time.time_ns(),
+            'status': 'ERROR' if exc_type is not None else 'OK',
+            'attributes': {
+                'wall_s': time.perf_counter() - self.start,
+                'cpu_s': time.process_time() - self.start_cpu,
+                'rss_mb': rss,
+                'rss_change_mb': rss_change,
+                'process_peak_rss_mb': peak_rss_mb(),
+                **self.attributes
+            }
+        })
+        return False
+
+
+class NullSpan:
+    """
+    Span of a disabled tracer, which records nothing.
+    """
+
+    def set(self, **attributes):
+        pass
+
+    def set_plan(self, lazy_frame, key=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    """
+    Record spans to a JSON lines file.
+    - path: file the spans are appended to (tracing is disabled when it is
+      None).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.enabled = path is not None
+        self.trace_id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        if self.enabled and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def span(self, name, kind, parent=None, **attributes):
+        """
+        Return a span recording a stage (kind: 'load', 'profile', 'query',
+        'write'...), as a child of another span if a parent is given.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, kind, parent=parent, **attributes)
+
+    def record(self, name, kind, wall_s, parent=None, **attributes):
+        """
+        Record a stage which has already run and whose wall clock time was
+        measured elsewhere (by the workers of a pool for instance).
+        """
+        if not self.enabled:
+            return
+        end_ns = time.time_ns()
+        self.emit({
+            'trace_id': self.trace_id,
+            'span_id': uuid.uuid4().hex[:16],
+            'parent_span_id': None if parent is None else parent.span_id,
+            'name': name,
+            'kind': kind,
+            'start_time_unix_nano': end_ns - int(wall_s * 1e9),
+            'end_time_unix_nano': end_ns,
+            'status': 'OK',
+            'attributes': {'wall_s': wall_s, **attributes}
+        })
+
+    def emit(self, span):
+        line = json.dumps(span, default=str, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(line + '\n')
+
+
+# Tracer used when none is given
+DISABLED_TRACER = Tracer()
@@ -0,0 +1,87 @@
+"""
+===============================================================================
+Concurrent Loading of the Datasets
+===============================================================================
+The five source workbooks are independent, so they are read concurrently in
+a thread pool (the Excel and Parquet readers release the GIL) or a process
+pool. The loading time is then close to the time of the largest file.
+"""
+# Standard libraries
+import time
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Other libraries
+from polars import read_excel
+
+
+from mortgage_status.schemas import apply_schema
+
+
+
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor
+}
+
+
+def timed_read(reader, source):
+    """
+    Read a source with the given reader and return the DataFrame with the
+    elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    df = reader(source=source)
+    return df, time.perf_counter() - start
+
+
+def load_tables(sources, reader=read_excel, max_workers=None,
+                executor='thread', schemas=None):
+    """
+    Read several sources concurrently.
+    - sources: dict mapping the table names to the paths of their files.
+    - reader: function called as reader(source=path) to read one file (it
+      must be picklable with the process executor, and its side effects,
+      such as the statistics of an ExcelCache, then remain in the workers).
+    - max_workers: number of workers (one per source by default).
+    - executor: 'thread' or 'process'.
+    - schemas: dict mapping the table names to the types of their columns
+      (such as mortgage_status.schemas.SCHEMAS), applied and validated once
+      the tables are read (None keeps the inferred types).
+    Return the dict of DataFrames and the dict of loading times in seconds,
+    both keyed by table name.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(
+            f'Unknown executor {executor!r}, expected one of '
+            f'{sorted(EXECUTORS)}'
+        )
+    if max_workers is None:
+        max_workers = len(sources)
+    with EXECUTORS[executor](max_workers=max(1, max_workers)) as pool:
+        futures = {
+            name: pool.submit(timed_read, reader, source)
+            for name, source in sources.items()
+        }
+        results = {name: future.result() for name, future in futures.items()}
+    tables = {name: df for name, (df, _) in results.items()}
+    if schemas is not None:
+        tables = {
+            name: apply_schema(df, name, schemas)
+            for name, df in tables.items()
+        }
+    timings = {name: seconds for name, (_, seconds) in results.items()}
+    return tables, timings
+
+
+def timings_report(timings, total=None):
+    """
+    Return a short report of the loading time of each table.
+    """
+    lines = ['Loading times:']
+    lines += [
+        f'- {name}: {seconds:.3f} s' for name, seconds in timings.items()
+    ]
+    if total is not None:
+        lines.append(f'- total (wall clock): {total:.3f} s')
+    return '\n'.join(lines)
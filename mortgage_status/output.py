@@ -0,0 +1,193 @@
+"""
+===============================================================================
+Output Writers
+===============================================================================
+The result tables are written in a columnar or text format:
+- 'parquet': Parquet file written row group by row group,
+- 'ipc': Arrow IPC file written record batch by record batch,
+- 'csv': CSV file written in batches of rows.
+A DataFrame is written with the DataFrame writer of its format, and a
+LazyFrame is sunk with the streaming engine, so its rows are written as they
+are computed without collecting the whole result. The files are written to a
+temporary path, then moved to their final path.
+
+The XLSX export is optional and runs on a background thread, so it never
+delays the rest of the pipeline. As a worksheet holds at most 1048576 rows,
+larger tables are split over several worksheets.
+"""
+# Standard libraries
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Other libraries
+import polars as pl
+
+
+
+# Maximum number of data rows of a worksheet (one row holds the header)
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def write_parquet(df, path, batch_size):
+    df.write_parquet(path, row_group_size=batch_size)
+
+
+def sink_parquet(lf, path, batch_size):
+    lf.sink_parquet(path, row_group_size=batch_size, engine='streaming')
+
+
+def write_ipc(df, path, batch_size):
+    try:
+        df.write_ipc(path, record_batch_size=batch_size)
+    except TypeError:
+        # Polars 1 has no record_batch_size and writes a record batch per
+        # chunk: write the slices of the table as its chunks
+        df = df.rechunk()
+        pl.concat(
+            [
+                df.slice(offset, batch_size)
+                for offset in range(0, max(df.height, 1), batch_size)
+            ],
+            rechunk=False
+        ).write_ipc(path)
+
+
+def sink_ipc(lf, path, batch_size):
+    try:
+        lf.sink_ipc(path, record_batch_size=batch_size, engine='streaming')
+    except TypeError:
+        # Polars 1 has no record_batch_size: the streaming engine sizes the
+        # record batches itself
+        with pl.Config(streaming_chunk_size=batch_size):
+            lf.sink_ipc(path, engine='streaming')
+
+
+def write_csv(df, path, batch_size):
+    df.write_csv(path, batch_size=batch_size)
+
+
+def sink_csv(lf, path, batch_size):
+    lf.sink_csv(path, batch_size=batch_size, engine='streaming')
+
+
+# Output formats: file extension, DataFrame writer and LazyFrame writer
+FORMATS = {
+    'parquet': ('.parquet', write_parquet, sink_parquet),
+    'ipc': ('.arrow', write_ipc, sink_ipc),
+    'csv': ('.csv', write_csv, sink_csv)
+}
+
+
+def write_excel(df, path, max_rows=EXCEL_MAX_ROWS):
+    """
+    Write a DataFrame to an XLSX workbook, over several worksheets (Sheet1,
+    Sheet2...) when it has more than max_rows rows.
+    """
+    if df.height <= max_rows:
+        df.write_excel(path)
+        return path
+    from xlsxwriter import Workbook
+
+    with Workbook(path) as workbook:
+        for index, offset in enumerate(range(0, df.height, max_rows)):
+            df.slice(offset, max_rows).write_excel(
+                workbook, worksheet=f'Sheet{index + 1}')
+    return path
+
+
+class OutputWriter:
+    """
+    Write the result tables to an output directory.
+    - output_dir: directory of the output files.
+    - fmt: output format ('parquet', 'ipc' or 'csv').
+    - batch_size: number of rows of each row group, record batch or CSV
+      batch.
+    - excel: also export the tables written with write() to XLSX, on a
+      background thread.
+    """
+
+    def __init__(self, output_dir='datasets', fmt='parquet',
+                 batch_size=100_000, excel=False):
+        if fmt not in FORMATS:
+            raise ValueError(
+                f'Unknown output format {fmt!r}, expected one of '
+                f'{sorted(FORMATS)}'
+            )
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.excel = excel
+        self.pool = None
+        self.futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def path(self, name, extension=None):
+        """
+        Return the path of the output file of a table.
+        """
+        if extension is None:
+            extension = FORMATS[self.fmt][0]
+        return os.path.join(self.output_dir, name + extension)
+
+    def write(self, frame, name):
+        """
+        Write a DataFrame or LazyFrame to <output_dir>/<name>.<extension> and
+        return the path (a DataFrame is also exported to XLSX in the
+        background when excel is True).
+        """
+        _, writer, sink = FORMATS[self.fmt]
+        path = self.path(name)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        if isinstance(frame, pl.LazyFrame):
+            sink(frame, tmp_path, self.batch_size)
+        else:
+            writer(frame, tmp_path, self.batch_size)
+            if self.excel:
+                self.submit_excel(frame, self.path(name, '.xlsx'))
+        os.replace(tmp_path, path)
+        return path
+
+    def write_results(self, results, prefix='results/query_'):
+        """
+        Write the result of each query (a dict keyed by query number) to
+        <output_dir>/<prefix><number>.<extension> and return the paths.
+        """
+        return {
+            number: self.write(result, f'{prefix}{number}')
+            for number, result in results.items()
+        }
+
+    def submit_excel(self, df, path):
+        """
+        Export a DataFrame to XLSX on the background thread.
+        """
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=1)
+        self.futures.append(self.pool.submit(write_excel, df, path))
+
+    def wait(self):
+        """
+        Wait for the pending XLSX exports and return their paths.
+        """
+        paths = [future.result() for future in self.futures]
+        self.futures = []
+        return paths
+
+    def close(self):
+        """
+        Wait for the pending XLSX exports and shut the thread down.
+        """
+        try:
+            self.wait()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
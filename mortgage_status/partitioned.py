@@ -0,0 +1,226 @@
+"""
+===============================================================================
+Year-Partitioned Store of the Applications
+===============================================================================
+Queries 7 to 10 and 17 extract the day, month, quarter, year or decade of
+Date_de_demande from every row, and queries 7 and 8 scan every application
+to keep two years only. The ApplicationStore saves the mortgage_applications
+table once, when the workbook changes, as Parquet files partitioned by year
+(hive layout: <store_dir>/Année=2018/0.parquet, ...), with the date parts
+computed at ingest:
+- the queries on some years read the files of their partitions only,
+- the queries selecting date parts read the precomputed columns.
+The applications without Date_de_demande are in the default partition
+(Année=__HIVE_DEFAULT_PARTITION__), read by the queries on every year. The
+position of each application in the table is saved with it, so that the
+rows are returned in the order of the SQL queries (that of the table, for
+the rows with the same sort key).
+"""
+# Standard libraries
+import json
+import os
+import shutil
+
+# Other libraries
+import polars as pl
+
+
+from polars import SQLContext
+from mortgage_status.cache import fingerprint
+
+
+
+DATE_COLUMN = 'Date_de_demande'
+YEAR_COLUMN = 'Année'
+ROW_COLUMN = 'Numéro_ligne'
+
+# Partition of the null years, as written by Polars
+DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+# Date parts computed at ingest, with the expressions of the queries
+DATE_PARTS = {
+    'Jour': "DATE_PART('day', Date_de_demande)",
+    'Mois': "DATE_PART('month', Date_de_demande)",
+    'Trimestre': 'EXTRACT(quarter FROM Date_de_demande)',
+    YEAR_COLUMN: "DATE_PART('year', Date_de_demande)",
+    'Décennie': 'EXTRACT(decade FROM Date_de_demande)'
+}
+
+# Query 17 with the precomputed year of Date_de_demande
+QUERY_17_PARTITIONED = """
+SELECT
+    COALESCE(
+        mortgage_applications.Numéro_client,
+        family_status.Numéro_client
+    ) AS Numéro_client,
+    Date_de_demande,
+    Durée,
+    Montant_opération,
+    DIV(Durée, 12) AS Durée_annuelle,
+    Date_de_naissance,
+    Année - DATE_PART('year', Date_de_naissance) AS Age
+FROM mortgage_applications
+LEFT JOIN family_status USING (Numéro_client)
+WHERE
+    Année - DATE_PART('year', Date_de_naissance) + DIV(Durée, 12) >= 82
+ORDER BY
+    Durée_annuelle DESC;
+"""
+
+# Queries answered by the store
+PARTITIONED_QUERIES = (7, 8, 9, 10, 17)
+
+
+def with_date_parts(applications):
+    """
+    Add the DATE_PARTS columns to the applications.
+    """
+    return applications.with_columns(
+        pl.sql_expr(expression).alias(name)
+        for name, expression in DATE_PARTS.items()
+    )
+
+
+class ApplicationStore:
+    """
+    Applications saved as Parquet files partitioned by year.
+    - store_dir: directory of the partitions and of the manifest holding the
+      fingerprint of the workbook and the types of the table they were built
+      from.
+    """
+
+    def __init__(self, store_dir='datasets/applications_store'):
+        self.store_dir = store_dir
+        self.manifest_path = os.path.join(store_dir, 'manifest.json')
+
+    def is_fresh(self, source, schema):
+        """
+        Check whether the store was built from the current version of a
+        workbook (compared by size and modification time, then by content
+        hash) loaded with the same types (schema: dict of the names of the
+        types keyed by column).
+        """
+        try:
+            with open(self.manifest_path, encoding='utf-8') as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            return False
+        if manifest.get('schema') != schema:
+            return False
+        saved = manifest.get('source', {})
+        stat = os.stat(source)
+        if (saved.get('size') == stat.st_size
+                and saved.get('mtime_ns') == stat.st_mtime_ns):
+            return True
+        return saved.get('sha256') == fingerprint(source)['sha256']
+
+    def ingest(self, applications, source=None):
+        """
+        Save the applications with their position and date parts,
+        partitioned by year, unless the store is already up to date with the
+        source workbook and the types of the applications. The partitions
+        are written to a temporary directory which then replaces the store.
+        Return whether the store was rebuilt.
+        """
+        schema = {
+            column: str(dtype) for column, dtype in applications.schema.items()
+        }
+        if source is not None and self.is_fresh(source, schema):
+            return False
+        tmp_dir = f'{self.store_dir}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        with_date_parts(applications.with_row_index(ROW_COLUMN)).write_parquet(
+            tmp_dir, partition_by=YEAR_COLUMN)
+        if source is not None:
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w',
+                      encoding='utf-8') as file:
+                json.dump(
+                    {'source': fingerprint(source), 'schema': schema},
+                    file,
+                    indent=2
+                )
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        os.replace(tmp_dir, self.store_dir)
+        return True
+
+    def years(self):
+        """
+        Return the years of the partitions (None for the applications
+        without Date_de_demande) and their directories.
+        """
+        prefix = f'{YEAR_COLUMN}='
+        partitions = {}
+        for name in sorted(os.listdir(self.store_dir)):
+            if not name.startswith(prefix):
+                continue
+            year = name[len(prefix):]
+            year = None if year == DEFAULT_PARTITION else int(year)
+            partitions[year] = os.path.join(self.store_dir, name)
+        return partitions
+
+    def scan(self, years=None):
+        """
+        Scan the applications of the given years (all years, null included,
+        by default), reading the files of their partitions only, in the order
+        of the table.
+        """
+        partitions = self.years()
+        if years is not None:
+            partitions = {
+                year: path for year, path in partitions.items()
+                if year in years
+            }
+        files = [
+            os.path.join(path, name)
+            for path in partitions.values()
+            for name in sorted(os.listdir(path))
+        ]
+        if not files:
+            # No partition for these years: empty frame with the schema of
+            # the store
+            path = next(iter(self.years().values()))
+            return pl.scan_parquet(
+                os.path.join(path, sorted(os.listdir(path))[0])).head(0)
+        return pl.scan_parquet(files).sort(ROW_COLUMN)
+
+    def answer(self, number, family_status=None):
+        """
+        Return the result of one of the PARTITIONED_QUERIES (query 17 needs
+        the family_status table).
+        """
+        if number in (7, 8):
+            years = (2018, 2019) if number == 7 else (2020, 2021)
+            return (
+                self.scan(years)
+                .select(
+                    'Numéro_client',
+                    'Numéro_demande_de_prêt',
+                    'Montant_opération',
+                    DATE_COLUMN,
+                    YEAR_COLUMN
+                )
+                .sort(
+                    YEAR_COLUMN, descending=number == 8, maintain_order=True)
+                .collect()
+            )
+        if number == 9:
+            return self.scan().select(
+                'Numéro_client', DATE_COLUMN, 'Montant_opération',
+                'Jour', 'Mois', YEAR_COLUMN
+            ).collect()
+        if number == 10:
+            return self.scan().select(
+                'Numéro_client', DATE_COLUMN, 'Montant_opération',
+                'Trimestre', YEAR_COLUMN, 'Décennie'
+            ).collect()
+        if number == 17:
+            frames = {
+                'mortgage_applications': self.scan(),
+                'family_status': family_status
+            }
+            with SQLContext(frames=frames, eager=True) as ctx:
+                return ctx.execute(QUERY_17_PARTITIONED)
+        raise ValueError(
+            f'Query {number} cannot be answered by the store, expected one '
+            f'of {PARTITIONED_QUERIES}'
+        )
@@ -0,0 +1,783 @@
+"""
+===============================================================================
+Pipeline Determining the Status of the Mortgage Applications
+===============================================================================
+The stages of the pipeline, run in order by Pipeline.run (each stage runs
+the previous ones it needs when they have not run yet):
+- load: read the five datasets,
+- profile: profile and display the datasets,
+- query: run the SQL queries (all of them or some of them),
+- score: compute the status of the applications (query 18),
+- export: save the status table (and the results of the queries).
+The settings are described in mortgage_status.settings, and SETTINGS holds
+their default values.
+"""
+# Standard libraries
+import functools
+import json
+import platform
+import time
+
+from importlib.metadata import version
+
+# Other libraries
+import polars as pl
+
+
+from polars import read_excel
+from mortgage_status import settings as default_settings
+from mortgage_status.batches import query_batches
+from mortgage_status.cache import ExcelCache, fingerprint
+from mortgage_status.client_aggregates import (
+    AGGREGATED_QUERIES, ClientAggregates
+)
+from mortgage_status.client_profiles import (
+    PROFILE_QUERIES, PROFILE_SOURCES, PROFILE_TABLE,
+    QUERY_18_SITUATIONS_PROFILES, build_client_profiles
+)
+from mortgage_status.incremental import IncrementalScorer
+from mortgage_status.instrumentation import Tracer
+from mortgage_status.loading import load_tables, timings_report
+from mortgage_status.output import OutputWriter
+from mortgage_status.partitioned import PARTITIONED_QUERIES, ApplicationStore
+from mortgage_status.profiling import Profiler
+from mortgage_status.queries import (
+    APPLICATION_KEY, QUERIES, QUERY_18_SITUATIONS, execute_queries,
+    referenced_tables, table_rows
+)
+from mortgage_status.result_cache import QueryResultCache
+from mortgage_status.rollup import ROLLUP_QUERIES, ROLLUP_SOURCES, RollupCube
+from mortgage_status.rules import RuleEngine, load_rules
+from mortgage_status.scenarios import ScenarioSweep
+from mortgage_status.scheduler import StageGraph
+from mortgage_status.schemas import SCHEMAS
+from mortgage_status.service import ApplicationScorer, serve
+from mortgage_status.shared_store import SharedTableStore
+from mortgage_status.sharding import score_sharded
+from mortgage_status.sorted_views import INDEXED_QUERIES, AmountIndex
+from mortgage_status.streaming import score_streaming
+
+
+
+# Datasets
+INPUTS = {
+    'mortgage_applications': 'datasets/crédit breton_demandes de prêt.xlsx',
+    'branches': 'datasets/crédit breton_agences.xlsx',
+    'pro_status': 'datasets/crédit breton_situation pro.xlsx',
+    'down_payment': 'datasets/crédit breton_apport.xlsx',
+    'family_status': 'datasets/crédit breton_situation familiale.xlsx'
+}
+
+# Displayed names and report titles of the datasets
+DATASETS = {
+    'mortgage_applications': (
+        'Mortgage applications', 'Mortgage Applications Dataset Report'),
+    'branches': ('Branches', 'Branches Dataset Report'),
+    'pro_status': (
+        'Professionnal status', 'Professional Status Dataset Report'),
+    'down_payment': ('Down payment', 'Down Payment Dataset Report'),
+    'family_status': ('Family status', 'Family Status Dataset Report')
+}
+
+# Default settings
+SETTINGS = {
+    name: value for name, value in vars(default_settings).items()
+    if name.isupper()
+}
+
+
+class Pipeline:
+    """
+    Run the stages of the pipeline with the given settings (a dict whose
+    keys are among those of SETTINGS; the missing settings take their
+    default values).
+    """
+
+    def __init__(self, settings=None, inputs=None):
+        settings = {} if settings is None else settings
+        unknown = sorted(set(settings) - set(SETTINGS))
+        if unknown:
+            raise ValueError(
+                f'Unknown settings {unknown}, expected some of '
+                f'{sorted(SETTINGS)}'
+            )
+        self.settings = {**SETTINGS, **settings}
+        self.inputs = INPUTS if inputs is None else inputs
+        self.tracer = Tracer(path=self.settings['TRACE_FILE'])
+        self.excel_cache = ExcelCache(
+            cache_dir=self.settings['INPUT_CACHE_DIR'],
+            fmt=self.settings['INPUT_CACHE_FORMAT']
+        )
+        self.profiler = Profiler(
+            level=self.settings['PROFILING_LEVEL'],
+            sample_rows=self.settings['PROFILING_SAMPLE_ROWS'],
+            max_workers=self.settings['PROFILING_WORKERS'],
+            tracer=self.tracer
+        )
+        self.rule_engine = None
+        if self.settings['USE_RULE_ENGINE']:
+            rules_file = self.settings['RULES_FILE']
+            self.rule_engine = RuleEngine(
+                rules=load_rules(rules_file) if rules_file else None)
+        self.shared_store = None
+        if self.settings['USE_SHARED_STORE']:
+            self.shared_store = SharedTableStore(
+                store_dir=self.settings['SHARED_STORE_DIR'])
+        self.result_cache = None
+        if self.settings['USE_RESULT_CACHE']:
+            self.result_cache = QueryResultCache(
+                cache_dir=self.settings['RESULT_CACHE_DIR'],
+                max_bytes=self.settings['RESULT_CACHE_MAX_BYTES']
+            )
+        self.tables = None
+        self.fingerprints = {}
+        self.client_profiles = None
+        self.results = None
+        self.status = None
+
+    def versions(self):
+        """
+        Display versions of platforms and packages.
+        """
+        print('\nPython: {}'.format(platform.python_version()))
+        print('Polars: {}'.format(pl.__version__))
+        if self.settings['PROFILING_LEVEL'] == 'full':
+            print('YData-profiling: {}'.format(version('ydata-profiling')))
+
+    def load(self):
+        """
+        Read the five independent datasets concurrently and return them as
+        a dict of DataFrames keyed by table name.
+        """
+        settings = self.settings
+        use_cache = settings['USE_INPUT_CACHE']
+        reader = self.excel_cache.read if use_cache else read_excel
+        start = time.perf_counter()
+        load = load_tables
+        if self.shared_store is not None:
+            load = self.shared_store.load
+        with self.tracer.span(
+                'load', 'load', executor=settings['LOAD_EXECUTOR']) as span:
+            self.tables, load_times = load(
+                sources=self.inputs,
+                reader=reader,
+                max_workers=settings['LOAD_WORKERS'],
+                executor=settings['LOAD_EXECUTOR'],
+                schemas=SCHEMAS if settings['USE_SCHEMA_REGISTRY'] else None
+            )
+            span.set(output_rows={
+                name: df.height for name, df in self.tables.items()})
+        self.fingerprints = {}
+        if self.result_cache is not None:
+            self.fingerprints = {
+                name: self.table_fingerprint(name, df)
+                for name, df in self.tables.items()
+            }
+        self.client_profiles = None
+        load_time = time.perf_counter() - start
+        for name, seconds in load_times.items():
+            self.tracer.record(
+                f'load {name}',
+                'load',
+                seconds,
+                parent=span,
+                source=self.inputs[name],
+                output_rows=self.tables[name].height
+            )
+        print(f'\n\n{timings_report(load_times, total=load_time)}')
+        if self.shared_store is not None:
+            print(f'\n\nShared store: {self.shared_store.statistics}')
+        if use_cache and settings['LOAD_EXECUTOR'] == 'thread':
+            print(f'\n\n{self.excel_cache.report()}')
+        return self.tables
+
+    def load_table(self, name):
+        """
+        Read one of the datasets (in the stage graph, where each dataset is
+        loaded by its own stage, and in the query daemon, which reloads the
+        changed ones) through the shared store of the pipeline if it is
+        used, and return it.
+        """
+        settings = self.settings
+        reader = read_excel
+        if settings['USE_INPUT_CACHE']:
+            reader = self.excel_cache.read
+        load = load_tables
+        if self.shared_store is not None:
+            load = self.shared_store.load
+        with self.tracer.span(
+                f'load {name}', 'load', source=self.inputs[name]) as span:
+            tables, _ = load(
+                sources={name: self.inputs[name]},
+                reader=reader,
+                executor=settings['LOAD_EXECUTOR'],
+                schemas=SCHEMAS if settings['USE_SCHEMA_REGISTRY'] else None
+            )
+            span.set(output_rows=tables[name].height)
+        if self.result_cache is not None:
+            self.fingerprints[name] = self.table_fingerprint(
+                name, tables[name])
+        self.tables[name] = tables[name]
+        return tables[name]
+
+    def table_fingerprint(self, name, df):
+        """
+        Return the fingerprint of a loaded table (for the result cache and
+        the rollup cube): the content hash of its workbook (saved by the
+        shared store or the input cache when they loaded it, computed
+        otherwise) and its types.
+        """
+        source = self.inputs[name]
+        saved = None
+        if self.shared_store is not None:
+            saved = self.shared_store.source_fingerprint(name)
+        elif self.settings['USE_INPUT_CACHE']:
+            saved = self.excel_cache.source_fingerprint(source)
+        if saved is None:
+            saved = fingerprint(source)
+        schema = [[column, str(dtype)] for column, dtype in df.schema.items()]
+        return json.dumps([saved['sha256'], schema], ensure_ascii=False)
+
+    def columnar_sources(self):
+        """
+        Bring the columnar copies of the datasets up to date (those of the
+        shared store if USE_SHARED_STORE is True, of the input cache
+        otherwise) and return their paths as a dict keyed by table name.
+        Only the datasets whose workbook changed are read, and none of them
+        is kept in memory.
+        """
+        settings = self.settings
+        schemas = SCHEMAS if settings['USE_SCHEMA_REGISTRY'] else None
+        if self.shared_store is None:
+            for source in self.inputs.values():
+                if not self.excel_cache.is_fresh(source):
+                    self.excel_cache.read(source)
+            return {
+                name: self.excel_cache.paths(source)[0]
+                for name, source in self.inputs.items()
+            }
+        stale = {
+            name: source for name, source in self.inputs.items()
+            if not self.shared_store.is_fresh(name, source, schemas)
+        }
+        if stale:
+            self.shared_store.load(
+                sources=stale,
+                reader=(
+                    self.excel_cache.read if settings['USE_INPUT_CACHE']
+                    else read_excel
+                ),
+                max_workers=settings['LOAD_WORKERS'],
+                executor=settings['LOAD_EXECUTOR'],
+                schemas=schemas
+            )
+        return {
+            name: self.shared_store.paths(name)[0] for name in self.inputs
+        }
+
+    def profile(self):
+        """
+        Profile and display the datasets.
+        """
+        if self.tables is None:
+            self.load()
+        for index, name in enumerate(DATASETS):
+            newlines = '\n\n\n' if index == 0 else '\n\n'
+            self.profile_table(name, newlines=newlines)
+
+    def profile_table(self, name, newlines='\n\n'):
+        """
+        Profile and display one of the datasets.
+        """
+        label, title = DATASETS[name]
+        df = self.tables[name]
+        self.profiler.profile(df=df, name=name, title=title)
+        print(f'{newlines}{label}:\n{df}')
+
+    def execute(self, queries, tables=None):
+        """
+        Run SQL queries over the tables (joining the client-profile
+        dimension instead of pro_status and family_status, and reading the
+        results of those which did not change from the result cache, if
+        enabled) and return their results as a dict keyed by query number.
+        - tables: dict of the DataFrames keyed by table name (the loaded
+          tables by default).
+        """
+        if tables is None:
+            tables = self.tables
+        fingerprints = {
+            name: self.fingerprints[name]
+            for name in tables if name in self.fingerprints
+        }
+        situations = QUERY_18_SITUATIONS
+        if self.settings['USE_CLIENT_PROFILES']:
+            if self.client_profiles is None:
+                with self.tracer.span(
+                        'client profiles', 'query',
+                        input_rows=table_rows(tables, PROFILE_SOURCES)):
+                    self.client_profiles = build_client_profiles(
+                        tables['pro_status'], tables['family_status'])
+            tables = {**tables, PROFILE_TABLE: self.client_profiles}
+            if all(name in fingerprints for name in PROFILE_SOURCES):
+                # The dimension is built from its sources only
+                fingerprints = {
+                    **fingerprints,
+                    PROFILE_TABLE: json.dumps(
+                        [fingerprints[name] for name in PROFILE_SOURCES])
+                }
+            queries = {
+                number: PROFILE_QUERIES.get(number, query)
+                for number, query in queries.items()
+            }
+            situations = QUERY_18_SITUATIONS_PROFILES
+        execute = execute_queries
+        if self.result_cache is not None:
+            execute = functools.partial(
+                self.result_cache.execute, fingerprints=fingerprints)
+        results = execute(
+            tables=tables,
+            queries=queries,
+            lazy=self.settings['LAZY_EXECUTION'],
+            rules=self.rule_engine,
+            tracer=self.tracer,
+            situations=situations
+        )
+        if self.result_cache is not None and queries:
+            print(f'\n\nResult cache: {self.result_cache.statistics}')
+        return results
+
+    def route(self, numbers=None):
+        """
+        Check the numbers of the queries (all of them by default) and split
+        them by the part of the pipeline answering them: a dict mapping
+        'sql' to the dict of the SQL queries to run (in lazy mode, as one
+        jointly optimized plan), and 'sorted view', 'client aggregates',
+        'partitioned store' and 'rollup cube' to the lists of the numbers
+        they answer. Query
+        18 is left to the score stage in streaming, incremental and sharded
+        modes.
+        """
+        settings = self.settings
+        numbers = sorted(QUERIES if numbers is None else numbers)
+        unknown = [number for number in numbers if number not in QUERIES]
+        if unknown:
+            raise ValueError(
+                f'Unknown queries {unknown}, expected some of '
+                f'{sorted(QUERIES)}'
+            )
+        queries = {number: QUERIES[number] for number in numbers}
+        if (18 in queries and (settings['STREAMING_SCORING']
+                               or settings['INCREMENTAL_SCORING']
+                               or settings['SHARDED_SCORING'])):
+            del queries[18]
+        routes = {}
+        for name, setting, answered in (
+                ('sorted view', 'USE_SORTED_VIEWS', INDEXED_QUERIES),
+                ('client aggregates', 'USE_CLIENT_AGGREGATES',
+                 AGGREGATED_QUERIES),
+                ('partitioned store', 'USE_PARTITIONED_STORE',
+                 PARTITIONED_QUERIES),
+                ('rollup cube', 'USE_ROLLUP_CUBE', ROLLUP_QUERIES)):
+            routes[name] = []
+            if settings[setting]:
+                routes[name] = [n for n in answered if queries.pop(n, None)]
+        return {'sql': queries, **routes}
+
+    def sorted_view(self, numbers, tables=None):
+        """
+        Answer the queries sorting the applications by amount from the
+        sorted view, as a dict keyed by query number.
+        - tables: dict of the DataFrames keyed by table name (the loaded
+          tables by default).
+        """
+        if not numbers:
+            return {}
+        if tables is None:
+            tables = self.tables
+        applications = tables['mortgage_applications']
+        with self.tracer.span(
+                'sorted view', 'query', input_rows=applications.height):
+            amount_index = AmountIndex(
+                mortgage_applications=applications,
+                branches=tables['branches']
+            )
+            return {number: amount_index.answer(number) for number in numbers}
+
+    def client_aggregates(self, numbers, tables=None):
+        """
+        Answer the queries aggregating the applications by client from the
+        client aggregates, as a dict keyed by query number.
+        - tables: dict of the DataFrames keyed by table name (the loaded
+          tables by default).
+        """
+        if not numbers:
+            return {}
+        if tables is None:
+            tables = self.tables
+        applications = tables['mortgage_applications']
+        client_aggregates = ClientAggregates(
+            state_dir=self.settings['CLIENT_AGGREGATES_DIR'])
+        with self.tracer.span(
+                'client aggregates', 'query',
+                input_rows=applications.height) as span:
+            client_aggregates.update(applications)
+            results = {
+                number: client_aggregates.answer(
+                    number, pro_status=tables['pro_status'])
+                for number in numbers
+            }
+            span.set(
+                output_rows=client_aggregates.table.height,
+                **client_aggregates.statistics
+            )
+        print(f'\n\nClient aggregates: {client_aggregates.statistics}')
+        return results
+
+    def partitioned_store(self, numbers, tables=None):
+        """
+        Answer the queries on the parts of Date_de_demande from the
+        partitioned store, as a dict keyed by query number.
+        - tables: dict of the DataFrames keyed by table name (the loaded
+          tables by default).
+        """
+        if not numbers:
+            return {}
+        if tables is None:
+            tables = self.tables
+        applications = tables['mortgage_applications']
+        application_store = ApplicationStore(
+            store_dir=self.settings['PARTITIONED_STORE_DIR'])
+        with self.tracer.span(
+                'partitioned store', 'query',
+                input_rows=applications.height) as span:
+            rebuilt = application_store.ingest(
+                applications, source=self.inputs['mortgage_applications'])
+            results = {
+                number: application_store.answer(
+                    number, family_status=tables['family_status'])
+                for number in numbers
+            }
+            span.set(rebuilt=rebuilt)
+        print(f'\n\nPartitioned store rebuilt: {rebuilt}')
+        return results
+
+    def rollup_cube(self, numbers, tables=None):
+        """
+        Answer the queries on the amounts by branch from the rollup cube, as
+        a dict keyed by query number.
+        - tables: dict of the DataFrames keyed by table name (the loaded
+          tables by default).
+        """
+        if not numbers:
+            return {}
+        cube = self.update_rollup_cube(tables)
+        return {number: cube.answer(number) for number in numbers}
+
+    def update_rollup_cube(self, tables=None):
+        """
+        Bring the rollup cube up to date with the tables (the loaded tables
+        by default) and return it: it is reused as it is while the workbooks
+        and types of its sources do not change.
+        """
+        if tables is None:
+            tables = self.tables
+        sources = {
+            name: self.fingerprints.get(name)
+            or self.table_fingerprint(name, tables[name])
+            for name in ROLLUP_SOURCES
+        }
+        applications = tables['mortgage_applications']
+        cube = RollupCube(
+            state_dir=self.settings['ROLLUP_CUBE_DIR'],
+            rules=self.rule_engine
+        )
+        with self.tracer.span(
+                'rollup cube', 'query',
+                input_rows=applications.height) as span:
+            cube.update(tables, sources=sources)
+            span.set(**cube.statistics)
+        print(f'\n\nRollup cube: {cube.statistics}')
+        return cube
+
+    def rollup(self, by=(), **filters):
+        """
+        Return the numbers and total amounts of the applications grouped by
+        some dimensions of the rollup cube (see RollupCube.rollup).
+        """
+        if self.tables is None:
+            self.load()
+        return self.update_rollup_cube().rollup(by, **filters)
+
+    def show_results(self, results):
+        """
+        Keep the results of the queries, sorted by query number, and
+        display them.
+        """
+        self.results = dict(sorted(results.items()))
+        for index, (number, result) in enumerate(self.results.items()):
+            newlines = '\n\n\n' if index == 0 else '\n\n'
+            print(f'{newlines}Result of the query {number}:\n{result}')
+        return self.results
+
+    def query(self, numbers=None):
+        """
+        Run the SQL queries with the given numbers (all of them by default)
+        and return their results as a dict keyed by query number (see
+        route).
+        """
+        if self.tables is None:
+            self.load()
+        routes = self.route(numbers)
+        results = self.execute(routes['sql'])
+        results.update(self.sorted_view(routes['sorted view']))
+        results.update(self.client_aggregates(routes['client aggregates']))
+        results.update(self.partitioned_store(routes['partitioned store']))
+        results.update(self.rollup_cube(routes['rollup cube']))
+        return self.show_results(results)
+
+    def query_batches(self, number, batch_size=None):
+        """
+        Return a generator of the result of one of the batched queries (9,
+        10 and 12) as DataFrames of at most batch_size rows
+        (OUTPUT_BATCH_SIZE by default).
+        """
+        if self.tables is None:
+            self.load()
+        if batch_size is None:
+            batch_size = self.settings['OUTPUT_BATCH_SIZE']
+        return query_batches(self.tables, number, batch_size=batch_size)
+
+    def score(self):
+        """
+        Compute the status of the applications (query 18), display the
+        statistics of the rules and of the threshold scenarios, and return
+        the status table (None in streaming mode, where it is written to
+        STREAMING_OUTPUT). In streaming mode, the datasets are scanned from
+        their columnar copies and are not loaded in memory (unless another
+        stage, or the scenario sweep, needs them).
+        """
+        settings = self.settings
+        if self.tables is None and not settings['STREAMING_SCORING']:
+            self.load()
+        tables = self.tables
+        tracer = self.tracer
+        rule_engine = self.rule_engine
+
+        # Score the applications out of core from the columnar copies of
+        # the inputs
+        if settings['STREAMING_SCORING']:
+            sources = self.columnar_sources()
+            with tracer.span('query 18 (streaming)', 'query'):
+                score_streaming(
+                    sources=sources,
+                    output_path=settings['STREAMING_OUTPUT'],
+                    chunk_size=settings['STREAMING_CHUNK_SIZE'],
+                    rules=rule_engine
+                )
+            print(
+                f'\n\nResult of the query 18 written to '
+                f'{settings["STREAMING_OUTPUT"]}'
+            )
+        # Score only the applications which changed since the previous run
+        elif settings['INCREMENTAL_SCORING']:
+            incremental_scorer = IncrementalScorer(
+                state_dir=settings['INCREMENTAL_STATE_DIR'],
+                rules=rule_engine
+            )
+            with tracer.span('query 18 (incremental)', 'query') as span:
+                self.status = incremental_scorer.update(
+                    tables).drop(APPLICATION_KEY)
+                span.set(
+                    output_rows=self.status.height,
+                    **incremental_scorer.statistics
+                )
+            print(f'\n\nResult of the query 18:\n{self.status}')
+            print(f'Incremental scoring: {incremental_scorer.statistics}')
+        # Score the shards of the applications in parallel worker processes
+        elif settings['SHARDED_SCORING']:
+            with tracer.span(
+                    'query 18 (sharded)', 'query',
+                    workers=settings['SCORING_WORKERS'],
+                    shards=settings['SCORING_SHARDS']) as span:
+                self.status = score_sharded(
+                    tables,
+                    n_shards=settings['SCORING_SHARDS'],
+                    workers=settings['SCORING_WORKERS'],
+                    rules=rule_engine,
+                    shard_dir=settings['SHARD_DIR'],
+                    poll_interval=settings['SHARD_POLL_INTERVAL'],
+                    timeout=settings['SHARD_TIMEOUT']
+                )
+                span.set(output_rows=self.status.height)
+            print(f'\n\nResult of the query 18:\n{self.status}')
+        elif self.results is not None and 18 in self.results:
+            self.status = self.results[18]
+        else:
+            self.status = self.execute({18: QUERIES[18]})[18]
+            print(f'\n\nResult of the query 18:\n{self.status}')
+
+        if not settings['STREAMING_SCORING'] and rule_engine is not None:
+            rules_statistics = rule_engine.statistics(self.status)
+            print(f'\n\nRules statistics:\n{rules_statistics}')
+
+        # Approval rates of the threshold scenarios
+        if settings['SCENARIO_GRID'] is not None:
+            if self.tables is None:
+                self.load()
+            tables = self.tables
+            with tracer.span('scenario sweep', 'query') as span:
+                scenarios = ScenarioSweep(tables).run(
+                    **settings['SCENARIO_GRID'])
+                span.set(output_rows=scenarios.height)
+            print(f'\n\nScenarios:\n{scenarios}')
+        return self.status
+
+    def export(self):
+        """
+        Save the status table (already saved in streaming mode) and, if
+        WRITE_ALL_RESULTS is True, the results of the queries.
+        """
+        settings = self.settings
+        if self.status is None and not settings['STREAMING_SCORING']:
+            self.score()
+        tracer = self.tracer
+        with OutputWriter(
+                output_dir=settings['OUTPUT_DIR'],
+                fmt=settings['OUTPUT_FORMAT'],
+                batch_size=settings['OUTPUT_BATCH_SIZE'],
+                excel=settings['EXCEL_OUTPUT']) as output_writer:
+            if not settings['STREAMING_SCORING']:
+                with tracer.span(
+                        'write mortgage_applications_status',
+                        'write',
+                        input_rows=self.status.height):
+                    output_path = output_writer.write(
+                        self.status, 'mortgage_applications_status')
+                print(f'\n\nStatus table written to {output_path}')
+                self.profiler.profile(
+                    df=self.status,
+                    name='mortgage_applications_status',
+                    title='Mortgage Applications Status Dataset Report'
+                )
+            if settings['WRITE_ALL_RESULTS']:
+                if self.results is None:
+                    self.query()
+                with tracer.span(
+                        'write results', 'write',
+                        output_files=len(self.results)):
+                    output_writer.write_results(self.results)
+            # Wait for the XLSX exports still being written in the
+            # background when leaving the block
+
+    def close(self):
+        """
+        Wait for the reports still being built in the background.
+        """
+        self.profiler.close()
+
+    def stage_graph(self):
+        """
+        Return the graph of the stages of the whole pipeline: the loading and
+        the profiling of each dataset, the parts of the pipeline answering
+        the queries (see route), each depending on the datasets its queries
+        reference, the display of the results, the scoring and the export.
+        Each part of the pipeline answering queries is given its own dict of
+        the tables it depends on, built from the results of their load
+        stages, rather than the dict the other load stages are still filling.
+        """
+        graph = StageGraph(max_workers=self.settings['STAGE_WORKERS'])
+        loads = {}
+        for name in self.inputs:
+            loads[name] = graph.add(
+                f'load {name}', functools.partial(self.load_table, name))
+            graph.add(
+                f'profile {name}',
+                functools.partial(self.profile_table, name),
+                depends_on=[loads[name]]
+            )
+        parts = {
+            'sql': self.execute,
+            'sorted view': self.sorted_view,
+            'client aggregates': self.client_aggregates,
+            'partitioned store': self.partitioned_store,
+            'rollup cube': self.rollup_cube
+        }
+
+        def query(part, numbers, names):
+            tables = {name: graph.results[loads[name]] for name in names}
+            return parts[part](numbers, tables=tables)
+
+        query_stages = []
+        for part, numbers in self.route().items():
+            if not numbers:
+                continue
+            referenced = {
+                name for number in numbers
+                for name in referenced_tables(QUERIES[number], self.inputs)
+            }
+            if part == 'sql' and self.settings['USE_CLIENT_PROFILES']:
+                # The client-profile dimension is built from its sources
+                referenced.update(PROFILE_SOURCES)
+            if part == 'rollup cube':
+                # The cube also scores the applications
+                referenced.update(ROLLUP_SOURCES)
+            referenced = sorted(referenced)
+            query_stages.append(graph.add(
+                f'query {part}',
+                functools.partial(query, part, numbers, referenced),
+                depends_on=[loads[name] for name in referenced]
+            ))
+
+        def show_results():
+            results = {}
+            for stage in query_stages:
+                results.update(graph.results[stage])
+            return self.show_results(results)
+
+        graph.add('show results', show_results, depends_on=query_stages)
+        graph.add(
+            'score', self.score,
+            depends_on=[*loads.values(), 'show results'])
+        graph.add('export', self.export, depends_on=['score'])
+        return graph
+
+    def run_stages(self):
+        """
+        Run the stages of the whole pipeline concurrently in dependency
+        order and display their timings with the critical path.
+        """
+        self.tables = {}
+        self.fingerprints = {}
+        self.client_profiles = None
+        graph = self.stage_graph()
+        graph.run()
+        print(f'\n\n{graph.report()}')
+        if (self.settings['USE_INPUT_CACHE']
+                and self.settings['LOAD_EXECUTOR'] == 'thread'):
+            print(f'\n\n{self.excel_cache.report()}')
+        return graph
+
+    def run(self):
+        """
+        Run the whole pipeline (as a stage graph if STAGE_SCHEDULER is True),
+        then serve the scoring of single applications from the loaded tables
+        if SERVE_SCORING_API is True.
+        """
+        self.versions()
+        try:
+            if self.settings['STAGE_SCHEDULER']:
+                self.run_stages()
+            else:
+                self.load()
+                self.profile()
+                self.query()
+                self.score()
+                self.export()
+        finally:
+            self.close()
+        if self.settings['SERVE_SCORING_API']:
+            serve(
+                scorer=ApplicationScorer(
+                    tables=self.tables, rules=self.rule_engine),
+                port=self.settings['SCORING_API_PORT']
+            )
@@ -0,0 +1,195 @@
+"""
+===============================================================================
+Data Profiling
+===============================================================================
+Three profiling levels are available:
+- 'off': no profiling at all.
+- 'summary': a Polars-native summary of each column (null count, number of
+  unique values, minimum, maximum and quartiles) computed in a single pass
+  over the DataFrame, without any conversion to pandas.
+- 'full': a YData-profiling report of a sample of the rows. The reports are
+  built in a background process pool so the queries are never blocked by
+  them, and YData-profiling and pandas are only imported by the workers.
+"""
+# Standard libraries
+import os
+import tempfile
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+
+# Other libraries
+import polars as pl
+
+
+from mortgage_status.instrumentation import DISABLED_TRACER
+
+
+
+LEVELS = ('off', 'summary', 'full')
+
+QUANTILES = {'q25': 0.25, 'median': 0.5, 'q75': 0.75}
+
+
+def summarize(df):
+    """
+    Summarize each column of a DataFrame in one pass and return the summary
+    as a DataFrame with one row per column (the statistics are formatted as
+    strings since the columns have different types).
+    """
+    exprs = []
+    for name, dtype in df.schema.items():
+        column = pl.col(name)
+        exprs += [
+            column.null_count().alias(f'{name}|null_count'),
+            column.n_unique().alias(f'{name}|n_unique')
+        ]
+        if dtype.is_numeric() or dtype.is_temporal() or dtype == pl.String:
+            exprs += [
+                column.min().alias(f'{name}|min'),
+                column.max().alias(f'{name}|max')
+            ]
+        if dtype.is_numeric():
+            exprs += [
+                column.quantile(quantile).alias(f'{name}|{statistic}')
+                for statistic, quantile in QUANTILES.items()
+            ]
+    values = df.select(exprs).row(0, named=True) if exprs else {}
+
+    statistics = ['null_count', 'n_unique', 'min', 'max', *QUANTILES]
+    rows = []
+    for name, dtype in df.schema.items():
+        row = {'column': name, 'dtype': str(dtype)}
+        for statistic in statistics:
+            value = values.get(f'{name}|{statistic}')
+            row[statistic] = None if value is None else str(value)
+        rows.append(row)
+    return pl.DataFrame(
+        rows,
+        schema={
+            'column': pl.String,
+            'dtype': pl.String,
+            **{statistic: pl.String for statistic in statistics}
+        },
+        orient='row'
+    )
+
+
+def full_report(sample_path, title, output_path):
+    """
+    Build the YData-profiling report of the sample saved in a Parquet file
+    and save it as HTML (the sample file is removed afterwards). Run in the
+    worker processes, which are the only ones importing YData-profiling and
+    pandas.
+    """
+    import pandas as pd
+
+    from ydata_profiling import ProfileReport
+
+    try:
+        df = pd.read_parquet(sample_path)
+    finally:
+        os.remove(sample_path)
+    ProfileReport(df=df, title=title).to_file(output_path)
+    return output_path
+
+
+class Profiler:
+    """
+    Profile DataFrames at the chosen level.
+    - level: 'off', 'summary' or 'full'.
+    - output_dir: directory of the summaries (CSV) and reports (HTML).
+    - sample_rows: maximum number of rows profiled by the full reports
+      (None to profile every row).
+    - max_workers: number of processes building the full reports.
+    - seed: seed of the row sampling.
+    - tracer: Tracer recording a span for each profiled DataFrame (for the
+      full reports, the span only covers the sampling and the submission).
+    """
+
+    def __init__(self, level='summary', output_dir='reports',
+                 sample_rows=100_000, max_workers=2, seed=0,
+                 tracer=DISABLED_TRACER):
+        if level not in LEVELS:
+            raise ValueError(
+                f'Unknown profiling level {level!r}, expected one of {LEVELS}'
+            )
+        self.level = level
+        self.output_dir = output_dir
+        self.sample_rows = sample_rows
+        self.max_workers = max_workers
+        self.seed = seed
+        self.tracer = tracer
+        self.pool = None
+        self.futures = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def profile(self, df, name, title):
+        """
+        Profile a DataFrame: return its summary at the 'summary' level (also
+        saved as reports/<name>_summary.csv), or submit its full report
+        (reports/<name>_report.html) to the process pool at the 'full' level
+        and return None.
+        """
+        if self.level == 'off':
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        with self.tracer.span(
+                f'profile {name}', 'profile', level=self.level,
+                input_rows=df.height):
+            if self.level == 'summary':
+                summary = summarize(df)
+                summary.write_csv(
+                    os.path.join(self.output_dir, f'{name}_summary.csv'))
+                return summary
+            self.submit_report(df, name, title)
+            return None
+
+    def submit_report(self, df, name, title):
+        """
+        Save a sample of the rows of a DataFrame and submit its full report
+        to the process pool.
+        """
+        if self.sample_rows is not None and df.height > self.sample_rows:
+            df = df.sample(n=self.sample_rows, seed=self.seed)
+        fd, sample_path = tempfile.mkstemp(suffix='.parquet')
+        os.close(fd)
+        df.write_parquet(sample_path)
+        # DataFrames may be profiled from several threads (stage graph)
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers)
+            self.futures.append(
+                self.pool.submit(
+                    full_report,
+                    sample_path,
+                    title,
+                    os.path.join(self.output_dir, f'{name}_report.html')
+                )
+            )
+
+    def wait(self):
+        """
+        Wait for the pending full reports and return their paths.
+        """
+        paths = [future.result() for future in self.futures]
+        self.futures = []
+        return paths
+
+    def close(self):
+        """
+        Wait for the pending full reports and shut the process pool down.
+        """
+        try:
+            self.wait()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
@@ -0,0 +1,692 @@
+"""
+===============================================================================
+SQL Queries
+===============================================================================
+The eighteen queries of the project, written against the mortgage_applications,
+branches, pro_status, down_payment and family_status tables.
+
+In lazy mode every query is registered as a LazyFrame and all of them are
+collected together, so the scans and joins they have in common (the
+mortgage_applications/down_payment full join, the pro_status and family_status
+left joins...) are computed only once and the plans run in parallel.
+"""
+# Standard libraries
+import re
+
+# Other libraries
+import polars as pl
+
+
+from polars import SQLContext
+from mortgage_status.instrumentation import DISABLED_TRACER
+
+
+
+"""
+Query 1:
+Selection of all granted applications (the 'O' values in the Accord column) 
+from the mortgage_applications table and sort the resulting table in 
+descending order using the Montant_opération column.
+"""
+QUERY_1 = """
+SELECT * FROM mortgage_applications
+WHERE Accord = 'O'
+ORDER BY Montant_opération DESC;
+"""
+
+
+"""
+Query 2:
+Selection of all refused applications (the 'N' values in the Accord column) 
+from the mortgage_applications table and sort the resulting table in 
+descending order using the Montant_opération column.
+"""
+QUERY_2 = """
+SELECT * FROM mortgage_applications
+WHERE Accord = 'N'
+ORDER BY Montant_opération DESC;
+"""
+
+
+"""
+Query 3:
+Selection of all processed applications granted or refused (respectively 
+the 'O' or 'N' values in the Accord column) from the mortgage_applications 
+table and sort the resulting table in descending order using the 
+Montant_opération column.
+"""
+QUERY_3 = """
+SELECT * FROM mortgage_applications
+WHERE Accord IS NOT NULL
+ORDER BY Montant_opération DESC;
+"""
+
+
+"""
+Query 4:
+Selection of all unprocessed applications (the null values in the Accord 
+column) from the mortgage_applications table and sort the resulting table 
+in descending order using the Montant_opération column.
+"""
+QUERY_4 = """
+SELECT * FROM mortgage_applications
+WHERE Accord IS NULL
+ORDER BY Montant_opération DESC;
+"""
+
+
+"""
+Query 5:
+- Firstly, select all applications from the mortgage_applications table.
+- Then, select the values in the Montant_opération column that exceed 
+  100000 €.
+- Finally, sort the resulting table in descending order using the 
+  Montant_opération column.
+"""
+QUERY_5 = """
+SELECT * FROM mortgage_applications
+WHERE Montant_opération > 100000
+ORDER BY Montant_opération DESC;
+"""
+
+
+"""
+Query 6:
+- Firstly, select the Numéro_client, Nombre_demandes_de_prêts (the count 
+  of the values in the Numéro_demande_de_prêt column in order to get the 
+  total number of all applications from a single applicant), and 
+  Montant_total_opérations (the sum of the values in the Montant_opération
+  column in order to get the total amount of all applications from a 
+  single applicant) columns from the mortgage_applications table, 
+- Then, the resulting table is grouped by the Numéro_client column and 
+  select the values in the Montant_total_opérations column greater than or 
+  equal to 300000 €. 
+- Finally, sort the resulting table in descending order using the
+  Nombre_demandes_de_prêts column.
+"""
+QUERY_6 = """
+SELECT
+    Numéro_client,
+    COUNT(Numéro_demande_de_prêt) AS Nombre_demandes_de_prêts,
+    SUM(Montant_opération) AS Montant_total_opérations,
+FROM mortgage_applications
+GROUP BY Numéro_client
+HAVING Montant_total_opérations >= 300000
+ORDER BY Nombre_demandes_de_prêts DESC;
+"""
+
+
+"""    
+Query 7:
+- Firstly, select the Numéro_client, Numéro_demande_de_prêt, 
+  Montant_opération, Date_de_demande, and Année (resulting from the 
+  transformation of the year part of the Date_de_demande column) columns 
+  from the mortgage_applications table.
+- Then, select the values in the Année column between 2018 and 2019. 
+- Finally, sort the resulting table in ascending order using the Année 
+  column.
+"""
+QUERY_7 = """
+SELECT
+    Numéro_client,
+    Numéro_demande_de_prêt,
+    Montant_opération,
+    Date_de_demande,
+    DATE_PART('year', Date_de_demande) AS Année
+FROM mortgage_applications
+WHERE DATE_PART('year', Date_de_demande) IN (2018, 2019)
+ORDER BY Année ASC;
+"""
+
+
+"""
+Query 8:
+- Firstly, select the Numéro_client, Numéro_demande_de_prêt, 
+  Montant_opération, Date_de_demande, and Année (resulting from the 
+  transformation of the year part of the Date_de_demande column) columns 
+  from the mortgage_applications table.
+- Then, select the values in the Année column between 2020 and 2021.
+- Finally, sort the resulting table in descending order using the Année 
+  column.
+"""
+QUERY_8 = """
+SELECT
+    Numéro_client,
+    Numéro_demande_de_prêt,
+    Montant_opération,
+    Date_de_demande,
+    DATE_PART('year', Date_de_demande) AS Année
+FROM mortgage_applications
+WHERE DATE_PART('year', Date_de_demande) IN (2020, 2021)
+ORDER BY Année DESC;
+"""
+
+
+"""
+Query 9:
+Selection of Numéro_client, Date_de_demande, Montant_opération, Jour 
+(resulting from the transformation of the day part of the Date_de_demande 
+column), Mois (resulting from the transformation of the month part of the 
+Date_de_demande column), and Année (resulting from the transformation of 
+the year part of the Date_de_demande column) columns from the 
+mortgage_applications table.
+"""
+QUERY_9 = """
+SELECT
+    Numéro_client,
+    Date_de_demande,
+    Montant_opération,
+    DATE_PART('day', Date_de_demande) AS Jour,
+    DATE_PART('month', Date_de_demande) AS Mois,
+    DATE_PART('year', Date_de_demande) AS Année
+FROM mortgage_applications;
+"""
+
+
+"""
+Query 10:
+Selection of the Numéro_client, Date_de_demande, Montant_opération, 
+Trimestre (resulting from the transformation of the quarter part of the
+Date_de_demande column), Année (resulting from the transformation of the 
+year part of the Date_de_demande column), and Décennie (resulting from the 
+transformation of the decade part of the Date_de_demande column) columns 
+from the mortgage_applications table.
+"""
+QUERY_10 = """
+SELECT
+    Numéro_client,
+    Date_de_demande,
+    Montant_opération,
+    EXTRACT(quarter FROM Date_de_demande) AS Trimestre,
+    EXTRACT(year FROM Date_de_demande) AS Année,
+    EXTRACT(decade FROM Date_de_demande) AS Décennie
+FROM mortgage_applications;
+"""
+
+
+"""
+Query 11:
+- Firstly, select the Numéro_client and Montant_total_opérations (the 
+  sum of the values in the Montant_opération column in order to get the 
+  total amount of all applications from a single applicant) columns from 
+  the mortgage_applications.
+- Then, the resulting table is grouped by the Numéro_client column and 
+  select the values in the Montant_total_opérations column that exceed 
+  300000 €.
+- Finally, sort the resulting table in descending order using the 
+  Montant_total_opérations column.
+"""
+QUERY_11 = """
+SELECT
+    Numéro_client,
+    SUM(Montant_opération) AS Montant_total_opérations
+FROM mortgage_applications
+GROUP BY Numéro_client
+HAVING Montant_total_opérations > 300000
+ORDER BY Montant_total_opérations DESC;
+"""
+
+
+"""
+Query 12:
+Selection of the Numéro_demande_de_prêt, Accord, Montant_opération, 
+and Apport columns in the table resulting from the full join between the 
+mortgage_applications and down_payment tables using the 
+Numéro_demande_de_prêt column, and sort the resulting table in descending 
+order using the Montant_opération column.
+"""
+QUERY_12 = """
+SELECT
+    COALESCE(
+        mortgage_applications.Numéro_demande_de_prêt,
+        down_payment.Numéro_demande_de_prêt
+    ) AS Numéro_demande_de_prêt,
+    Accord,
+    Montant_opération,
+    Apport
+FROM mortgage_applications
+FULL JOIN down_payment USING (Numéro_demande_de_prêt)
+ORDER BY Montant_opération DESC;
+"""
+
+
+"""
+Query 13:
+- Firstly, select the Numéro_agence, Ville, and Montant_opération columns 
+  in the table resulting from the join between the mortgage_applications 
+  and branches tables using the Numéro_agence column.
+- Then, sort the resulting table in descending order using the 
+  Montant_opération column.
+- Finally, display only the first 10 rows of the resulting table.
+"""
+QUERY_13 = """
+SELECT
+    COALESCE(
+        mortgage_applications.Numéro_agence,
+        branches.Numéro_agence
+    ) AS Numéro_agence,
+    Ville,
+    Montant_opération
+FROM mortgage_applications
+LEFT JOIN branches USING (Numéro_agence)
+ORDER BY Montant_opération DESC LIMIT 10;
+"""
+
+
+"""
+Query 14:
+- Main query:
+  - First, select the Numéro_agence, Montant_total_opérations (the sum of 
+    the values in the Montant_opération column in order to get the total 
+    amount of all applications from a single applicant), and Ville columns 
+    from the branches_performance table.
+  - Then, the resulting table is grouped by Numéro_agence and Ville 
+    columns. Finally, sort the resulting table in descending order using 
+    the Montant_total_opérations column.
+
+- Subquery for the branches_performance intermediate table:
+  Selection of the Numéro_agence, Montant_opération, and Ville columns in 
+  the table resulting from the left join between the mortgage_applications 
+  and branches tables using the Numéro_agence column.
+"""
+QUERY_14 = """
+WITH branches_performance AS (
+    SELECT
+        COALESCE(
+            mortgage_applications.Numéro_agence,
+            branches.Numéro_agence
+        ) AS Numéro_agence,
+        Montant_opération,
+        Ville
+    FROM mortgage_applications
+    LEFT JOIN branches USING (Numéro_agence)    
+),
+SELECT
+    Numéro_agence,
+    SUM(Montant_opération) AS Montant_total_opérations,
+    Ville
+FROM branches_performance
+GROUP BY
+    Numéro_agence,
+    Ville
+ORDER BY
+    Montant_total_opérations DESC;
+"""
+
+
+"""
+Query 15:
+- Firstly, select the Numéro_client, Montant_opération, 
+  Catégorie_socioprofessionnelle, Statut_emploi, and Régularité_des_revenus 
+  columns in the table resulting from the left join between the 
+  mortgage_applications and pro_status tables using the Numéro_client 
+  column.
+- Then, select the values in the Régularité_des_revenus column equal to 
+  '3 : Très irréguliers'.
+- Finally, sort the resulting table in descending order using the 
+  Montant_opération column.
+"""
+QUERY_15 = """
+SELECT
+    COALESCE(
+        mortgage_applications.Numéro_client,
+        pro_status.Numéro_client
+    ) AS Numéro_client,
+    Montant_opération,
+    Catégorie_socioprofessionnelle,
+    Statut_emploi,
+    Régularité_des_revenus
+FROM mortgage_applications
+LEFT JOIN pro_status USING (Numéro_client)
+WHERE Régularité_des_revenus = '3 : Très irréguliers'
+ORDER BY Montant_opération DESC;
+"""
+
+
+"""
+Query 16:
+- Main query:
+  - Firstly, select the Numéro_client, Nombre_demandes_de_prêts (the count 
+    of the values in the Numéro_demande_de_prêt column in order to get the 
+    total number of all applications from a single applicant), 
+    Montant_total_opérations (the sum of the values in the 
+    Montant_opération column in order to get the total amount of all 
+    applications from a single applicant), Catégorie_socioprofessionnelle, 
+    Statut_emploi, Régularité_des_revenus, and Revenu_mensuel_moyen columns 
+    from the pro_situations table.
+  - Then, select the rows whose value in the Régularité_des_revenus column
+    is '3 : Très irréguliers', and group them by the Numéro_client,
+    Catégorie_socioprofessionnelle, Statut_emploi, Régularité_des_revenus,
+    and Revenu_mensuel_moyen columns.
+  - Finally, sort the resulting table in descending order using the 
+    Montant_total_opérations column.
+
+- Subquery for the pro_situations intermediate table: 
+  Selection of the Numéro_client, Numéro_demande_de_prêt, 
+  Montant_opération, Catégorie_socioprofessionnelle, Statut_emploi, 
+  Régularité_des_revenus, and Revenu_mensuel_moyen columns in the table 
+  resulting from the right join between the mortgage_applications and 
+  pro_status tables using the Numéro_client column.
+"""
+QUERY_16 = """
+WITH pro_situations AS (
+    SELECT
+        COALESCE(
+            mortgage_applications.Numéro_client,
+            pro_status.Numéro_client
+        ) AS Numéro_client,
+        mortgage_applications.Numéro_demande_de_prêt,
+        mortgage_applications.Montant_opération,
+        pro_status.Catégorie_socioprofessionnelle,
+        pro_status.Statut_emploi,
+        pro_status.Régularité_des_revenus,
+        pro_status.Revenu_mensuel_moyen
+    FROM mortgage_applications
+    RIGHT JOIN pro_status USING (Numéro_client) 
+),
+SELECT
+    Numéro_client,
+    COUNT(Numéro_demande_de_prêt) AS Nombre_demandes_de_prêts,
+    SUM(Montant_opération) AS Montant_total_opérations,
+    Catégorie_socioprofessionnelle,
+    Statut_emploi,
+    Régularité_des_revenus,
+    Revenu_mensuel_moyen
+FROM pro_situations
+WHERE Régularité_des_revenus = '3 : Très irréguliers'
+GROUP BY
+    Numéro_client,
+    Catégorie_socioprofessionnelle,
+    Statut_emploi, 
+    Régularité_des_revenus,
+    Revenu_mensuel_moyen
+ORDER BY
+    Montant_total_opérations DESC;
+"""
+
+
+"""
+Query 17:
+- Firstly, select the Numéro_client, Date_de_demande, Durée, 
+  Montant_opération, Durée_annuelle (Dividing the values in the Durée 
+  column by 12), Date_de_naissance, and Age (the difference between the 
+  values in columns Date_de_demande and Date_de_naissance) columns in the 
+  table resulting from the left join between the mortgage_applications and 
+  family_status tables using the Numéro_client column.
+- Then, select applicants whose age at the end of the loan period exceeds 
+  82 years old. 
+- Finally, sort the resulting table in descending order using the 
+  Durée_annuelle column.
+"""
+QUERY_17 = """
+SELECT
+    COALESCE(
+        mortgage_applications.Numéro_client,
+        family_status.Numéro_client
+    ) AS Numéro_client,
+    Date_de_demande,
+    Durée,
+    Montant_opération,
+    DIV(Durée, 12) AS Durée_annuelle,
+    Date_de_naissance,
+    DATE_PART('year', Date_de_demande) - DATE_PART('year', 
+        Date_de_naissance) AS Age
+FROM mortgage_applications
+LEFT JOIN family_status USING (Numéro_client)
+WHERE
+    DATE_PART('year', Date_de_demande) - DATE_PART('year', 
+        Date_de_naissance) + DIV(Durée, 12) >= 82
+ORDER BY
+    Durée_annuelle DESC;
+"""
+
+
+"""
+Query 18:
+- Main query:
+  • Selection of columns:
+    - First, select the Numéro_client, Date_de_demande, Montant_opération, 
+      Apport, Durée, Montant_du_prêt, Remboursement_mensuel, and Accord 
+      columns from the financial_situations table.
+    - Then, select the Revenu_mensuel_moyen and Régularité_des_revenus 
+      from the pro_status table.
+    - Finally, select the Date_de_naissance and Nombre_enfants_à_charge 
+      columns from the table family_status.    
+  • Calculate the status of the mortgage application:
+    - Case 1: The first condition checks whether the applicant's age 
+      at the end of the loan period exceeds 82 years old. If this is the 
+      case, the mortgage application is rejected.
+    - Case 2: If the first condition is true, the second condition checks 
+      whether the applicant's average monthly income is very irregular. 
+      If this is the case, the mortgage application is rejected.
+    - Case 3: If the second condition is true, the third condition checks 
+      wether the monthly repayment is greather than 33% of the applicant's 
+      average monthly income plus the number of dependent children. If 
+      this is the case, the mortgage application is rejected. Otherwise, 
+      it is accepted.
+
+- Subquery for the financial_situations intermediate table:
+  Selection of the Numéro_demande_de_prêt, Numéro_client, Date_de_demande, 
+  Montant_opération, Durée, Accord, Apport, Montant_du_prêt (the monthly 
+  amount of the loan is the difference between the values in columns 
+  Montant_opération and Apport, divided by the Durée column), 
+  Durée_annuelle (Dividing the values in the Durée column by 12), and 
+  Remboursement_mensuel columns in the table resulting from the full join
+  between the mortgage_applications and down_payment tables using the 
+  Numéro_demande_de_prêt column.
+"""
+QUERY_18 = """
+WITH financial_situations AS (
+    SELECT
+        COALESCE(
+            mortgage_applications.Numéro_demande_de_prêt,
+            down_payment.Numéro_demande_de_prêt
+        ) AS Numéro_demande_de_prêt,
+        mortgage_applications.Numéro_client,
+        mortgage_applications.Date_de_demande,
+        mortgage_applications.Montant_opération,
+        mortgage_applications.Durée,
+        mortgage_applications.Accord,
+        down_payment.Apport,
+        Montant_opération - Apport AS Montant_du_prêt,
+        DIV(Durée, 12) AS Durée_annuelle,
+        DIV(Montant_opération - Apport, Durée) AS Remboursement_mensuel
+    FROM mortgage_applications
+    FULL JOIN down_payment USING (Numéro_demande_de_prêt)    
+),
+SELECT
+    COALESCE(
+        financial_situations.Numéro_client,
+        pro_status.Numéro_client,
+        family_status.Numéro_client
+    ) AS Numéro_client,
+    financial_situations.Date_de_demande,
+    financial_situations.Montant_opération,
+    financial_situations.Apport,
+    financial_situations.Durée,
+    financial_situations.Montant_du_prêt,
+    financial_situations.Remboursement_mensuel,
+    financial_situations.Accord,
+    pro_status.Revenu_mensuel_moyen,
+    pro_status.Régularité_des_revenus,
+    family_status.Date_de_naissance,
+    family_status.Nombre_enfants_à_charge,
+    CASE
+        WHEN DATE_PART('year', Date_de_demande) - DATE_PART( 'year', 
+            Date_de_naissance) + Durée_annuelle >= 82 THEN 'Refusé'
+        WHEN Régularité_des_revenus = '3 : Très irréguliers' THEN 'Refusé'
+        WHEN Remboursement_mensuel > 0.33 * Revenu_mensuel_moyen +  
+            Nombre_enfants_à_charge THEN 'Refusé'
+        ELSE 'Accepté'
+    END AS Statut_demande_de_prêt
+FROM financial_situations
+LEFT JOIN pro_status USING (Numéro_client)
+LEFT JOIN family_status USING (Numéro_client)
+ORDER BY Statut_demande_de_prêt DESC;
+"""
+
+
+"""
+Query 18 without the calculation of the status (nor the final sort): the
+financial situation of each mortgage application, identified by its
+Numéro_demande_de_prêt, with the income and family data of the applicant.
+The status is then computed by the rule engine of the mortgage_status.rules
+module, which applies the rules of the CASE expression of query 18 (or any
+other list of rules).
+"""
+QUERY_18_SITUATIONS = """
+WITH financial_situations AS (
+    SELECT
+        COALESCE(
+            mortgage_applications.Numéro_demande_de_prêt,
+            down_payment.Numéro_demande_de_prêt
+        ) AS Numéro_demande_de_prêt,
+        mortgage_applications.Numéro_client,
+        mortgage_applications.Date_de_demande,
+        mortgage_applications.Montant_opération,
+        mortgage_applications.Durée,
+        mortgage_applications.Accord,
+        down_payment.Apport,
+        Montant_opération - Apport AS Montant_du_prêt,
+        DIV(Durée, 12) AS Durée_annuelle,
+        DIV(Montant_opération - Apport, Durée) AS Remboursement_mensuel
+    FROM mortgage_applications
+    FULL JOIN down_payment USING (Numéro_demande_de_prêt)    
+),
+SELECT
+    financial_situations.Numéro_demande_de_prêt,
+    COALESCE(
+        financial_situations.Numéro_client,
+        pro_status.Numéro_client,
+        family_status.Numéro_client
+    ) AS Numéro_client,
+    financial_situations.Date_de_demande,
+    financial_situations.Montant_opération,
+    financial_situations.Apport,
+    financial_situations.Durée,
+    financial_situations.Montant_du_prêt,
+    financial_situations.Remboursement_mensuel,
+    financial_situations.Accord,
+    pro_status.Revenu_mensuel_moyen,
+    pro_status.Régularité_des_revenus,
+    family_status.Date_de_naissance,
+    family_status.Nombre_enfants_à_charge
+FROM financial_situations
+LEFT JOIN pro_status USING (Numéro_client)
+LEFT JOIN family_status USING (Numéro_client);
+"""
+
+
+# Tables of the datasets
+TABLES = [
+    'mortgage_applications',
+    'branches',
+    'pro_status',
+    'down_payment',
+    'family_status'
+]
+
+# Keys of the mortgage applications and of the clients
+APPLICATION_KEY = 'Numéro_demande_de_prêt'
+CLIENT_KEY = 'Numéro_client'
+
+# All queries, in the order they are run and displayed
+QUERIES = {
+    1: QUERY_1,
+    2: QUERY_2,
+    3: QUERY_3,
+    4: QUERY_4,
+    5: QUERY_5,
+    6: QUERY_6,
+    7: QUERY_7,
+    8: QUERY_8,
+    9: QUERY_9,
+    10: QUERY_10,
+    11: QUERY_11,
+    12: QUERY_12,
+    13: QUERY_13,
+    14: QUERY_14,
+    15: QUERY_15,
+    16: QUERY_16,
+    17: QUERY_17,
+    18: QUERY_18,
+}
+
+
+def referenced_tables(query, tables=TABLES):
+    """
+    Return the names of the tables referenced by a query.
+    """
+    return [
+        name for name in tables if re.search(rf'\b{name}\b', query)
+    ]
+
+
+def table_rows(tables, names):
+    """
+    Return the number of rows of the given tables (DataFrames only, the size
+    of a LazyFrame is unknown until it is collected).
+    """
+    return {
+        name: tables[name].height
+        for name in names if isinstance(tables[name], pl.DataFrame)
+    }
+
+
+def execute_queries(tables, queries=None, lazy=True, rules=None,
+                    tracer=DISABLED_TRACER, situations=QUERY_18_SITUATIONS):
+    """
+    Run the queries over the tables and return their results as a dict of
+    DataFrames keyed by query number.
+    - tables: dict mapping the table names used in the SQL to DataFrames or
+      LazyFrames.
+    - queries: dict of the queries to run (all of them by default).
+    - lazy: if True, every query is planned as a LazyFrame and they are all
+      collected in a single collect_all call (common subplans are computed
+      once); otherwise each query is executed eagerly one after the other.
+    - rules: RuleEngine computing the status of the applications of query 18
+      from the situations query, instead of the CASE expression of QUERY_18.
+    - tracer: Tracer recording the execution of the queries (a single span
+      in lazy mode, one span per query otherwise) with their plans.
+    - situations: query of the situations scored by the rules.
+    """
+    if queries is None:
+        queries = QUERIES
+    with SQLContext(frames=tables, eager=False) as ctx:
+        plans = {}
+        for number, query in queries.items():
+            if number == 18 and rules is not None:
+                plans[number] = rules.score(
+                    ctx.execute(situations).drop(APPLICATION_KEY))
+            else:
+                plans[number] = ctx.execute(query)
+
+    if lazy:
+        span = tracer.span(
+            'queries',
+            'query',
+            queries=list(plans),
+            input_rows=table_rows(tables, tables)
+        )
+        for number, plan in plans.items():
+            span.set_plan(plan, key=number)
+        with span:
+            results = dict(zip(plans, pl.collect_all(plans.values())))
+            span.set(output_rows={
+                number: df.height for number, df in results.items()
+            })
+        return results
+
+    results = {}
+    for number, plan in plans.items():
+        span = tracer.span(
+            f'query {number}',
+            'query',
+            input_rows=table_rows(
+                tables, referenced_tables(queries[number], tables))
+        )
+        span.set_plan(plan)
+        with span:
+            results[number] = plan.collect()
+            span.set(output_rows=results[number].height)
+    return results
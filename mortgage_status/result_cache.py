@@ -0,0 +1,257 @@
+"""
+===============================================================================
+Persistent Cache of the Query Results
+===============================================================================
+The result of each SQL query is saved as a Parquet file in a cache directory,
+under a key hashing:
+- the SQL text of the query, normalized (whitespace collapsed, trailing
+  semicolon removed) so that reformatting a query keeps its results,
+- the fingerprints of the tables the query references: those given by the
+  caller (the pipeline gives the content hash of the workbook of each loaded
+  table, already computed by the loading, with its types), or else the
+  types, row count and hash of the rows of the table, computed once per
+  DataFrame,
+- the version of Polars, and the rules of the rule engine for query 18.
+
+At the next run, the queries whose key is in the cache are read from it and
+only those referencing a changed table (or whose SQL changed) are run again.
+An index (index.json) holds the size and last use of each result: when the
+results exceed the size limit of the cache, the least recently used ones
+are evicted. The index is updated under a lock, so the threads of a process
+(stage graph, daemon) can share the cache.
+"""
+# Standard libraries
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Other libraries
+import polars as pl
+
+
+from mortgage_status.cache import write_atomic
+from mortgage_status.instrumentation import DISABLED_TRACER
+from mortgage_status.queries import (
+    QUERIES, QUERY_18_SITUATIONS, execute_queries, referenced_tables
+)
+
+
+
+def normalize_sql(query):
+    """
+    Return the SQL text of a query with its whitespace collapsed and without
+    trailing semicolon.
+    """
+    return ' '.join(query.split()).rstrip(';').rstrip()
+
+
+def table_fingerprint(df):
+    """
+    Return the fingerprint of a table: its types, row count and a hash of its
+    rows in order.
+    """
+    # hash_rows borrows the DataFrame mutably, which fails while another
+    # thread reads it (stage graph): hash a shallow copy
+    rows_hash = df.clone().hash_rows(seed=0).implode().hash(seed=0)[0]
+    schema = [[column, str(dtype)] for column, dtype in df.schema.items()]
+    return json.dumps([schema, df.height, rows_hash], ensure_ascii=False)
+
+
+class QueryResultCache:
+    """
+    Cache of the results of the SQL queries.
+    - cache_dir: directory of the results and of their index.
+    - max_bytes: size limit of the results kept in the cache, beyond which
+      the least recently used ones are evicted (None for no limit).
+    After each execute, the statistics attribute holds the numbers of hits,
+    misses and evicted results.
+    """
+
+    def __init__(self, cache_dir='datasets/result_cache',
+                 max_bytes=256 * 2 ** 20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hashed = {}
+        self.statistics = {}
+
+    def path(self, name):
+        """
+        Return the path of a file of the cache directory.
+        """
+        return os.path.join(self.cache_dir, name)
+
+    def load_index(self):
+        """
+        Load the index of the cached results (an empty one when there is no
+        cache yet).
+        """
+        try:
+            with open(self.path('index.json'), encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def save_index(self, index):
+        """
+        Save the index of the cached results.
+        """
+        tmp_path = (
+            f'{self.path("index.json")}.{os.getpid()}.'
+            f'{threading.get_ident()}.tmp'
+        )
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(index, file, indent=2)
+        os.replace(tmp_path, self.path('index.json'))
+
+    def key(self, query, fingerprints, rules=None):
+        """
+        Return the cache key of a query over tables with the given
+        fingerprints (the rules are those scoring query 18, if any).
+        """
+        content = json.dumps(
+            {
+                'sql': normalize_sql(query),
+                'tables': fingerprints,
+                'polars': pl.__version__,
+                'rules': None if rules is None else [
+                    repr(rule) for rule in rules.rules]
+            },
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def table_fingerprint(self, name, df):
+        """
+        Return the fingerprint of a table (see table_fingerprint), computed
+        once per DataFrame: the fingerprint of the last DataFrame of each
+        table name is kept.
+        """
+        with self.lock:
+            hashed = self.hashed.get(name)
+        if hashed is not None and hashed[0] is df:
+            return hashed[1]
+        value = table_fingerprint(df)
+        with self.lock:
+            self.hashed[name] = (df, value)
+        return value
+
+    def evict(self, index):
+        """
+        Remove the least recently used results until the cache fits in its
+        size limit, and return the number of evicted results.
+        """
+        if self.max_bytes is None:
+            return 0
+        size = sum(entry['bytes'] for entry in index.values())
+        evicted = 0
+        for key in sorted(index, key=lambda k: index[k]['last_used']):
+            if size <= self.max_bytes:
+                break
+            size -= index.pop(key)['bytes']
+            try:
+                os.remove(self.path(f'{key}.parquet'))
+            except FileNotFoundError:
+                pass
+            evicted += 1
+        return evicted
+
+    def execute(self, tables, queries=None, lazy=True, rules=None,
+                tracer=DISABLED_TRACER, situations=QUERY_18_SITUATIONS,
+                fingerprints=None):
+        """
+        Return the results of the queries as a dict of DataFrames keyed by
+        query number, read from the cache or computed by execute_queries
+        (same arguments) and then saved in the cache.
+        - fingerprints: fingerprints of some of the tables (strings keyed by
+          table name) identifying their content; the other tables are
+          hashed.
+        """
+        if queries is None:
+            queries = QUERIES
+        fingerprints = {} if fingerprints is None else fingerprints
+        table_fingerprints = {}
+        keys = {}
+        for number, query in queries.items():
+            if number == 18 and rules is not None:
+                query = situations
+            names = referenced_tables(query, tables)
+            for name in names:
+                if name in table_fingerprints:
+                    continue
+                table_fingerprints[name] = fingerprints.get(name)
+                if table_fingerprints[name] is None:
+                    table_fingerprints[name] = self.table_fingerprint(
+                        name, tables[name])
+            keys[number] = self.key(
+                query,
+                {name: table_fingerprints[name] for name in names},
+                rules=rules if number == 18 else None
+            )
+
+        with self.lock:
+            index = self.load_index()
+        results = {}
+        for number, key in keys.items():
+            if key not in index:
+                continue
+            try:
+                with tracer.span(f'query {number} (cached)', 'query'):
+                    results[number] = pl.read_parquet(
+                        self.path(f'{key}.parquet'))
+            except FileNotFoundError:
+                # Evicted in the meantime
+                continue
+
+        missing = {
+            number: query for number, query in queries.items()
+            if number not in results
+        }
+        computed = {}
+        if missing:
+            computed = execute_queries(
+                tables=tables,
+                queries=missing,
+                lazy=lazy,
+                rules=rules,
+                tracer=tracer,
+                situations=situations
+            )
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for number, df in computed.items():
+                write_atomic(
+                    df,
+                    self.path(f'{keys[number]}.parquet'),
+                    pl.DataFrame.write_parquet
+                )
+            results.update(computed)
+
+        # Update the index as saved by the other threads or processes
+        evicted = 0
+        if queries:
+            now = time.time()
+            with self.lock:
+                index = self.load_index()
+                for number in results:
+                    key = keys[number]
+                    if number in computed:
+                        index[key] = {
+                            'query': number,
+                            'bytes': os.path.getsize(
+                                self.path(f'{key}.parquet')),
+                            'last_used': now
+                        }
+                    elif key in index:
+                        index[key]['last_used'] = now
+                evicted = self.evict(index)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self.save_index(index)
+        self.statistics = {
+            'hits': len(queries) - len(missing),
+            'misses': len(missing),
+            'evicted': evicted
+        }
+        return {number: results[number] for number in queries}
@@ -0,0 +1,349 @@
+"""
+===============================================================================
+Rollup Cube of the Applications by Branch and Period
+===============================================================================
+Query 14 joins the mortgage_applications table with the branches table to sum
+the amounts by Numéro_agence and Ville, and the dashboards slice the same
+amounts by year, quarter, Accord and status as well. The RollupCube holds
+the number of applications and their total amount for each combination of:
+- Numéro_agence and Ville (of the branch of the application),
+- Année and Trimestre (of Date_de_demande),
+- Accord and Statut_demande_de_prêt (computed by the rules of query 18).
+Query 14 and the dashboards (which can read cube.parquet directly) group its
+cells instead of scanning the applications. Their number grows with the
+combinations of branches, quarters, Accord and status which occur (about
+107,000 cells for 1 million applications).
+
+The cube is saved in a state directory with the fingerprints of the tables
+it was built from (when given): as long as they did not change, the saved
+cube is used as it is, without scoring the applications again. Otherwise
+it is maintained incrementally:
+- the status of the applications is kept up to date by an IncrementalScorer
+  (in the status subdirectory), which scores again only the applications
+  whose row, down payment or applicant changed,
+- the facts of the applications (their cell and amount) are saved with the
+  cube, and only the cells of the new, changed or deleted facts (before and
+  after the change) are aggregated again from their own facts (the cube and
+  the facts are not written again when none changed).
+"""
+# Standard libraries
+import json
+import os
+
+# Other libraries
+import polars as pl
+
+
+from mortgage_status.cache import write_atomic
+from mortgage_status.incremental import FINGERPRINT_COLUMN, IncrementalScorer
+from mortgage_status.queries import APPLICATION_KEY
+from mortgage_status.rules import STATUS_COLUMN
+
+
+
+AGENCY_COLUMN = 'Numéro_agence'
+CITY_COLUMN = 'Ville'
+DATE_COLUMN = 'Date_de_demande'
+AMOUNT_COLUMN = 'Montant_opération'
+YEAR_COLUMN = 'Année'
+QUARTER_COLUMN = 'Trimestre'
+ACCORD_COLUMN = 'Accord'
+COUNT_COLUMN = 'Nombre_demandes_de_prêts'
+TOTAL_COLUMN = 'Montant_total_opérations'
+
+# Dimensions of the cube
+DIMENSIONS = (
+    AGENCY_COLUMN, CITY_COLUMN, YEAR_COLUMN, QUARTER_COLUMN, ACCORD_COLUMN,
+    STATUS_COLUMN
+)
+
+# Tables the cube is built from (the status uses those of query 18)
+ROLLUP_SOURCES = (
+    'mortgage_applications', 'branches', 'pro_status', 'down_payment',
+    'family_status'
+)
+
+# Queries answered by the cube
+ROLLUP_QUERIES = (14,)
+
+
+def application_facts(applications, branches, status):
+    """
+    Return the cell (dimensions) and the amount of each application, with
+    the fingerprint of these values.
+    - applications: mortgage_applications table.
+    - branches: branches table (joined as in query 14).
+    - status: status of the applications, with their Numéro_demande_de_prêt.
+    """
+    facts = (
+        applications
+        .select(APPLICATION_KEY, AGENCY_COLUMN, DATE_COLUMN, AMOUNT_COLUMN,
+                ACCORD_COLUMN)
+        .join(
+            branches.select(AGENCY_COLUMN, CITY_COLUMN),
+            on=AGENCY_COLUMN,
+            how='left'
+        )
+        .join(
+            status.select(
+                APPLICATION_KEY, pl.col(STATUS_COLUMN).cast(pl.String)),
+            on=APPLICATION_KEY,
+            how='left'
+        )
+        .select(
+            APPLICATION_KEY,
+            AGENCY_COLUMN,
+            CITY_COLUMN,
+            pl.col(DATE_COLUMN).dt.year().cast(pl.Int16).alias(YEAR_COLUMN),
+            pl.col(DATE_COLUMN).dt.quarter().cast(pl.Int8)
+            .alias(QUARTER_COLUMN),
+            ACCORD_COLUMN,
+            STATUS_COLUMN,
+            AMOUNT_COLUMN
+        )
+    )
+    # hash_rows borrows the DataFrame mutably: hash a shallow copy
+    return facts.with_columns(
+        facts.drop(APPLICATION_KEY).clone().hash_rows(seed=0)
+        .alias(FINGERPRINT_COLUMN)
+    )
+
+
+def aggregate(facts):
+    """
+    Aggregate facts by cell.
+    """
+    return facts.group_by(DIMENSIONS).agg(
+        pl.len().cast(pl.UInt32).alias(COUNT_COLUMN),
+        pl.col(AMOUNT_COLUMN).sum().alias(TOTAL_COLUMN)
+    )
+
+
+class RollupCube:
+    """
+    Numbers and total amounts of the applications by cell, saved in a state
+    directory.
+    - state_dir: directory of the cube, of the facts it was computed from and
+      of the state of the scoring.
+    - rules: RuleEngine computing the status (the rules of query 18 by
+      default).
+    After each update, the statistics attribute holds whether the saved
+    cube was used as it is (fresh), the numbers of new, changed and deleted
+    facts, of rescored applications and of aggregated and total cells.
+    """
+
+    def __init__(self, state_dir='datasets/rollup_cube', rules=None):
+        self.state_dir = state_dir
+        self.scorer = IncrementalScorer(
+            state_dir=os.path.join(state_dir, 'status'), rules=rules)
+        self.table = None
+        self.schema = {}
+        self.sources = None
+        self.statistics = {}
+
+    def path(self, name):
+        """
+        Return the path of a file of the state directory.
+        """
+        return os.path.join(self.state_dir, name)
+
+    def signature(self):
+        """
+        Return what the saved state depends on besides the data: the version
+        of Polars (whose row hashes are not stable across versions), the
+        rules computing the status and the types of the facts (set by
+        update).
+        """
+        return {
+            'polars': pl.__version__,
+            'rules': [repr(rule) for rule in self.scorer.rules.rules],
+            'schema': self.schema
+        }
+
+    def read_state(self):
+        """
+        Return the saved signature and source fingerprints, or None when
+        there is no saved state.
+        """
+        try:
+            with open(self.path('state.json'), encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def is_fresh(self, state):
+        """
+        Return whether the saved state was computed from the same sources
+        (as their fingerprints tell) and rules, with the same version of
+        Polars.
+        """
+        if (self.sources is None or state is None
+                or state.get('sources') != self.sources):
+            return False
+        signature = {**self.signature(), 'schema': None}
+        return {**state['signature'], 'schema': None} == signature
+
+    def load_state(self, state):
+        """
+        Load the saved cube and facts, or return None when there is no
+        compatible state.
+        """
+        if state is None or state.get('signature') != self.signature():
+            return None
+        return (
+            pl.read_parquet(self.path('cube.parquet')),
+            pl.read_parquet(self.path('facts.parquet'))
+        )
+
+    def save_state(self, facts=None):
+        """
+        Save the cube and the facts (or only the signature and the source
+        fingerprints when facts is None). The state file is written last,
+        so an interrupted save is never taken as a valid state.
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        state_path = self.path('state.json')
+        if facts is not None:
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            write_atomic(
+                self.table, self.path('cube.parquet'),
+                pl.DataFrame.write_parquet
+            )
+            write_atomic(
+                facts, self.path('facts.parquet'), pl.DataFrame.write_parquet)
+        tmp_path = f'{state_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {'signature': self.signature(), 'sources': self.sources},
+                file,
+                indent=2
+            )
+        os.replace(tmp_path, state_path)
+
+    def update(self, tables, sources=None):
+        """
+        Bring the cube up to date with the tables and return it.
+        - tables: dict of DataFrames keyed by table name, among which the
+          ROLLUP_SOURCES.
+        - sources: fingerprints of the ROLLUP_SOURCES (of their workbooks
+          and types, for instance), keyed by table name: when they match
+          those of the saved cube, it is returned as it is.
+        """
+        self.sources = sources
+        state = self.read_state()
+        if self.is_fresh(state):
+            self.schema = state['signature']['schema']
+            self.table = pl.read_parquet(self.path('cube.parquet'))
+            self.statistics = {
+                'fresh': True, 'full': False, 'new': 0, 'changed': 0,
+                'deleted': 0, 'rescored': 0, 'aggregated_cells': 0,
+                'cells': self.table.height
+            }
+            return self.table
+        status = self.scorer.update(tables)
+        facts = application_facts(
+            tables['mortgage_applications'], tables['branches'], status)
+        self.schema = {
+            column: str(dtype) for column, dtype in facts.schema.items()
+        }
+        state = self.load_state(state)
+        if state is None:
+            self.table = aggregate(facts)
+            changes = {
+                'full': True, 'new': facts.height, 'changed': 0, 'deleted': 0
+            }
+            aggregated = self.table.height
+        else:
+            table, previous = state
+            joined = previous.join(
+                facts.select(APPLICATION_KEY, FINGERPRINT_COLUMN),
+                on=APPLICATION_KEY,
+                how='full',
+                coalesce=True,
+                suffix='_current'
+            )
+            fingerprint = pl.col(FINGERPRINT_COLUMN)
+            current_fingerprint = pl.col(f'{FINGERPRINT_COLUMN}_current')
+            modified = joined.filter(
+                fingerprint.ne_missing(current_fingerprint))[APPLICATION_KEY]
+            modified = modified.implode()
+
+            # Cells of the modified facts, before and after the change,
+            # are aggregated again from their current facts
+            cells = pl.concat([
+                previous.filter(pl.col(APPLICATION_KEY).is_in(modified))
+                .select(DIMENSIONS),
+                facts.filter(pl.col(APPLICATION_KEY).is_in(modified))
+                .select(DIMENSIONS)
+            ]).unique()
+            self.table = pl.concat([
+                table.join(cells, on=DIMENSIONS, how='anti', nulls_equal=True),
+                aggregate(facts.join(
+                    cells, on=DIMENSIONS, how='semi', nulls_equal=True))
+            ])
+            new = joined.filter(fingerprint.is_null()).height
+            deleted = joined.filter(current_fingerprint.is_null()).height
+            changes = {
+                'full': False,
+                'new': new,
+                'changed': modified.list.len()[0] - new - deleted,
+                'deleted': deleted
+            }
+            aggregated = cells.height
+        self.statistics = {
+            'fresh': False,
+            **changes,
+            'rescored': self.scorer.statistics['rescored'],
+            'aggregated_cells': aggregated,
+            'cells': self.table.height
+        }
+        if changes['full'] or aggregated:
+            self.save_state(facts.select(APPLICATION_KEY, *DIMENSIONS,
+                                         FINGERPRINT_COLUMN))
+        else:
+            # Only the fingerprints of the sources changed
+            self.save_state()
+        return self.table
+
+    def rollup(self, by=(), **filters):
+        """
+        Return the numbers and total amounts of the applications grouped by
+        some dimensions of the cube, restricted to the cells whose
+        dimensions have the values of filters (None for null), sorted by
+        total amount.
+        - by: names of the dimensions to group by (none for the grand
+          total).
+        - filters: values of some dimensions, by dimension name.
+        """
+        unknown = [
+            name for name in [*by, *filters] if name not in DIMENSIONS]
+        if unknown:
+            raise ValueError(
+                f'Unknown dimensions {unknown}, expected some of '
+                f'{list(DIMENSIONS)}'
+            )
+        cells = self.table
+        for name, value in filters.items():
+            column = pl.col(name)
+            cells = cells.filter(
+                column.is_null() if value is None else column == value)
+        totals = pl.col(COUNT_COLUMN, TOTAL_COLUMN).sum()
+        if not by:
+            return cells.select(totals)
+        return cells.group_by(list(by)).agg(totals).sort(
+            TOTAL_COLUMN, *by, descending=[True] + [False] * len(by),
+            nulls_last=True
+        )
+
+    def answer(self, number):
+        """
+        Return the result of one of the ROLLUP_QUERIES.
+        """
+        if number == 14:
+            return self.rollup([AGENCY_COLUMN, CITY_COLUMN]).select(
+                AGENCY_COLUMN, TOTAL_COLUMN, CITY_COLUMN)
+        raise ValueError(
+            f'Query {number} cannot be answered by the cube, expected one of '
+            f'{ROLLUP_QUERIES}'
+        )
@@ -0,0 +1,257 @@
+"""
+===============================================================================
+Risk Rule Engine
+===============================================================================
+The status of a mortgage application is determined by a list of declarative
+rules, checked in order: the first rule which holds for an application gives
+its status (refused by default), and the applications for which no rule
+holds are accepted. Each rule compares two expressions:
+- left: an SQL expression (such as "Régularité_des_revenus" or
+  "DATE_PART('year', Date_de_demande)") or a Polars expression.
+- right: a number, an SQL expression (string literals are quoted, as in
+  "'3 : Très irréguliers'") or a Polars expression.
+
+All the rules are compiled once into a single vectorized Polars expression,
+so the scoring is a single pass over the data, and the rules can be added or
+tuned (for instance from a JSON file) without editing the SQL of query 18.
+"""
+# Standard libraries
+import json
+import time
+
+from operator import eq, ge, gt, le, lt, ne
+
+# Other libraries
+import polars as pl
+
+
+
+STATUS_COLUMN = 'Statut_demande_de_prêt'
+RULE_COLUMN = 'Règle_de_refus'
+ACCEPTED = 'Accepté'
+REFUSED = 'Refusé'
+
+# Operands of the rules of query 18
+AGE_AT_END_OF_LOAN = (
+    "DATE_PART('year', Date_de_demande) - "
+    "DATE_PART('year', Date_de_naissance) + DIV(Durée, 12)"
+)
+VERY_IRREGULAR_INCOME = "'3 : Très irréguliers'"
+
+OPERATORS = {
+    '=': eq,
+    '==': eq,
+    '!=': ne,
+    '<>': ne,
+    '<': lt,
+    '<=': le,
+    '>': gt,
+    '>=': ge
+}
+
+
+def to_expr(value):
+    """
+    Convert a rule operand to a Polars expression: strings are parsed as SQL
+    expressions and other values are taken as literals.
+    """
+    if isinstance(value, pl.Expr):
+        return value
+    if isinstance(value, str):
+        return pl.sql_expr(value)
+    return pl.lit(value)
+
+
+class Rule:
+    """
+    Rule giving the status `status` to the applications for which
+    `left operator right` holds.
+    """
+
+    def __init__(self, name, left, operator, right, status=REFUSED):
+        if operator not in OPERATORS:
+            raise ValueError(
+                f'Unknown operator {operator!r} in rule {name!r}, expected '
+                f'one of {sorted(OPERATORS)}'
+            )
+        self.name = name
+        self.left = left
+        self.operator = operator
+        self.right = right
+        self.status = status
+        self.condition = OPERATORS[operator](to_expr(left), to_expr(right))
+
+    def __repr__(self):
+        return (
+            f'Rule({self.name!r}, {self.left!r}, {self.operator!r}, '
+            f'{self.right!r}, status={self.status!r})'
+        )
+
+    @classmethod
+    def from_dict(cls, rule):
+        """
+        Create a rule from a dict with the name, left, operator, right and
+        (optionally) status keys.
+        """
+        return cls(**rule)
+
+    def to_dict(self):
+        """
+        Return the rule as a dict (see from_dict), which can be saved as
+        JSON unless an operand is a Polars expression.
+        """
+        return {
+            'name': self.name,
+            'left': self.left,
+            'operator': self.operator,
+            'right': self.right,
+            'status': self.status
+        }
+
+
+def default_rules(age_limit=82, debt_ratio=0.33, child_adjustment=1):
+    """
+    Return the rules of query 18:
+    - age_at_end_of_loan: the applicant's age at the end of the loan period
+      reaches age_limit years.
+    - very_irregular_income: the applicant's income is very irregular.
+    - debt_ratio: the monthly repayment is greater than debt_ratio times the
+      applicant's average monthly income plus child_adjustment times the
+      number of dependent children.
+    """
+    return [
+        Rule(
+            name='age_at_end_of_loan',
+            left=AGE_AT_END_OF_LOAN,
+            operator='>=',
+            right=age_limit
+        ),
+        Rule(
+            name='very_irregular_income',
+            left='Régularité_des_revenus',
+            operator='=',
+            right=VERY_IRREGULAR_INCOME
+        ),
+        Rule(
+            name='debt_ratio',
+            left='Remboursement_mensuel',
+            operator='>',
+            right=f'{debt_ratio} * Revenu_mensuel_moyen + '
+                  f'{child_adjustment} * Nombre_enfants_à_charge'
+        )
+    ]
+
+
+def load_rules(path):
+    """
+    Load the rules saved in a JSON file as a list of dicts (see
+    Rule.from_dict).
+    """
+    with open(path, encoding='utf-8') as file:
+        return [Rule.from_dict(rule) for rule in json.load(file)]
+
+
+def save_rules(rules, path):
+    """
+    Save rules in a JSON file, to be loaded with load_rules (the operands
+    must be numbers or SQL expressions, not Polars expressions).
+    """
+    for rule in rules:
+        operands = (rule.left, rule.right)
+        if any(isinstance(value, pl.Expr) for value in operands):
+            raise ValueError(
+                f'Rule {rule.name!r} has a Polars expression operand, which '
+                f'cannot be saved as JSON'
+            )
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(
+            [rule.to_dict() for rule in rules], file, indent=2,
+            ensure_ascii=False
+        )
+
+
+class RuleEngine:
+    """
+    Compile a list of rules into a single Polars expression computing the
+    status of the applications.
+    - rules: list of rules checked in order (those of query 18 by default).
+    - explain: also add the RULE_COLUMN column holding the name of the rule
+      which gave its status to each application (null when accepted).
+    """
+
+    def __init__(self, rules=None, explain=False, accepted=ACCEPTED):
+        self.rules = default_rules() if rules is None else list(rules)
+        self.explain = explain
+        self.accepted = accepted
+        self.status = self.compile(
+            lambda rule: pl.lit(rule.status), pl.lit(accepted)
+        ).alias(STATUS_COLUMN)
+        self.fired_rule = self.compile(
+            lambda rule: pl.lit(rule.name), pl.lit(None, dtype=pl.String)
+        ).alias(RULE_COLUMN)
+
+    def compile(self, value, default):
+        """
+        Chain the conditions of the rules into one when/then expression whose
+        value is value(rule) for the first rule which holds.
+        """
+        if not self.rules:
+            return default
+        expr = pl
+        for rule in self.rules:
+            expr = expr.when(rule.condition).then(value(rule))
+        return expr.otherwise(default)
+
+    def expressions(self):
+        """
+        Return the expressions added by the engine to the scored data.
+        """
+        if self.explain:
+            return [self.status, self.fired_rule]
+        return [self.status]
+
+    def score(self, frame, sort=True):
+        """
+        Add the status of the applications to a DataFrame or LazyFrame (with
+        the columns of query 18), sorted by status as in query 18 unless
+        sort is False.
+        """
+        frame = frame.with_columns(self.expressions())
+        if sort:
+            frame = frame.sort(STATUS_COLUMN, descending=True)
+        return frame
+
+    def statistics(self, df):
+        """
+        Return, for each rule, the number of applications matching its
+        condition, the number of applications whose status it gave (hits, as
+        a rule is only applied when the previous ones do not hold) and the
+        time taken to evaluate its condition on its own.
+        """
+        hits = dict(
+            df.select(self.fired_rule)
+            .to_series()
+            .value_counts()
+            .iter_rows()
+        )
+        rows = []
+        for rule in self.rules:
+            start = time.perf_counter()
+            matches = df.select(rule.condition.sum()).item()
+            seconds = time.perf_counter() - start
+            rows.append({
+                'rule': rule.name,
+                'matches': matches,
+                'hits': hits.get(rule.name, 0),
+                'seconds': seconds
+            })
+        return pl.DataFrame(
+            rows,
+            schema={
+                'rule': pl.String,
+                'matches': pl.UInt32,
+                'hits': pl.UInt32,
+                'seconds': pl.Float64
+            },
+            orient='row'
+        )
@@ -0,0 +1,135 @@
+"""
+===============================================================================
+What-If Scenarios on the Thresholds of the Risk Rules
+===============================================================================
+A scenario gives new values to the three thresholds of the rules of query 18
+(see rules.default_rules): the age limit at the end of the loan, the debt
+ratio and the adjustment per dependent child. The ScenarioSweep joins the
+tables of query 18 once and then computes the number and amount of accepted
+applications of a whole grid of scenarios in one vectorized pass:
+- the applications with a very irregular income are refused whatever the
+  thresholds, so they are counted once and set aside,
+- the debt ratio rule is evaluated once per (debt ratio, child adjustment)
+  pair, as a boolean column,
+- the age rule only depends on the age at the end of the loan, which takes a
+  few dozen values: the accepted applications of each pair are counted by
+  age, and each age limit sums the counts of the ages below it.
+The cost is then that of a few single runs, even for hundreds of scenarios,
+and the statuses are exactly those of the rule engine with the same
+thresholds.
+"""
+# Standard libraries
+import itertools
+
+# Other libraries
+import polars as pl
+
+
+from polars import SQLContext
+from mortgage_status.queries import QUERY_18_SITUATIONS
+from mortgage_status.rules import AGE_AT_END_OF_LOAN, VERY_IRREGULAR_INCOME
+
+
+
+AGE_COLUMN = 'Âge_fin_de_prêt'
+AMOUNT_COLUMN = 'Montant_opération'
+
+# Columns of the results
+AGE_LIMIT_COLUMN = 'Âge_limite'
+DEBT_RATIO_COLUMN = 'Taux_endettement'
+CHILD_ADJUSTMENT_COLUMN = 'Ajustement_par_enfant'
+ACCEPTED_COLUMN = 'Demandes_acceptées'
+ACCEPTED_AMOUNT_COLUMN = 'Montant_accepté'
+REFUSED_COLUMN = 'Demandes_refusées'
+ACCEPTANCE_RATE_COLUMN = 'Taux_acceptation'
+
+# Age given to the applications without age at the end of the loan (no
+# birth date), whose age rule never holds
+NO_AGE = -(2 ** 31)
+
+
+class ScenarioSweep:
+    """
+    Count the accepted applications of grids of threshold scenarios.
+    - tables: dict of DataFrames keyed by table name (those of query 18).
+    """
+
+    def __init__(self, tables):
+        frames = {
+            name: tables[name]
+            for name in (
+                'mortgage_applications', 'down_payment', 'pro_status',
+                'family_status'
+            )
+        }
+        with SQLContext(frames=frames, eager=True) as ctx:
+            situations = ctx.execute(QUERY_18_SITUATIONS)
+        self.applications = situations.height
+        irregular = (
+            pl.sql_expr(f'Régularité_des_revenus = {VERY_IRREGULAR_INCOME}')
+            .fill_null(False)
+        )
+        self.situations = situations.filter(~irregular).select(
+            pl.sql_expr(AGE_AT_END_OF_LOAN).fill_null(NO_AGE)
+            .alias(AGE_COLUMN),
+            AMOUNT_COLUMN,
+            'Remboursement_mensuel',
+            'Revenu_mensuel_moyen',
+            'Nombre_enfants_à_charge'
+        )
+
+    def run(self, age_limits=(82,), debt_ratios=(0.33,),
+            child_adjustments=(1,)):
+        """
+        Return, for each combination of the thresholds, the number and the
+        amount (sum of Montant_opération) of the accepted applications, the
+        number of refused applications and the acceptance rate.
+        """
+        pairs = list(itertools.product(debt_ratios, child_adjustments))
+        accepted = [
+            ~(
+                pl.col('Remboursement_mensuel')
+                > pl.lit(debt_ratio) * pl.col('Revenu_mensuel_moyen')
+                + pl.lit(child_adjustment) * pl.col('Nombre_enfants_à_charge')
+            ).fill_null(False)
+            for debt_ratio, child_adjustment in pairs
+        ]
+        by_age = self.situations.group_by(AGE_COLUMN).agg(
+            [
+                condition.sum().alias(f'count_{index}')
+                for index, condition in enumerate(accepted)
+            ] + [
+                pl.col(AMOUNT_COLUMN).filter(condition).sum()
+                .alias(f'amount_{index}')
+                for index, condition in enumerate(accepted)
+            ]
+        )
+
+        rows = []
+        for age_limit in age_limits:
+            totals = by_age.filter(pl.col(AGE_COLUMN) < age_limit).select(
+                pl.all().exclude(AGE_COLUMN).sum()).row(0, named=True)
+            for index, (debt_ratio, child_adjustment) in enumerate(pairs):
+                rows.append({
+                    AGE_LIMIT_COLUMN: age_limit,
+                    DEBT_RATIO_COLUMN: debt_ratio,
+                    CHILD_ADJUSTMENT_COLUMN: child_adjustment,
+                    ACCEPTED_COLUMN: totals[f'count_{index}'],
+                    ACCEPTED_AMOUNT_COLUMN: totals[f'amount_{index}']
+                })
+        return pl.DataFrame(
+            rows,
+            schema={
+                AGE_LIMIT_COLUMN: pl.Int64,
+                DEBT_RATIO_COLUMN: pl.Float64,
+                CHILD_ADJUSTMENT_COLUMN: pl.Float64,
+                ACCEPTED_COLUMN: pl.Int64,
+                ACCEPTED_AMOUNT_COLUMN: pl.Int64
+            },
+            orient='row'
+        ).with_columns(
+            (self.applications - pl.col(ACCEPTED_COLUMN))
+            .alias(REFUSED_COLUMN),
+            (pl.col(ACCEPTED_COLUMN) / self.applications)
+            .alias(ACCEPTANCE_RATE_COLUMN)
+        )
@@ -0,0 +1,133 @@
+"""
+===============================================================================
+Stage Graph Scheduler
+===============================================================================
+The stages of the pipeline (the loading and profiling of each table, the
+parts answering the queries, the scoring and the export) are the nodes of a
+graph, each declaring the stages it depends on. The StageGraph runs every
+stage in a thread pool as soon as its dependencies are done, so independent
+stages overlap (the profiling of branches runs while the queries run, for
+instance): Polars releases the GIL while it computes.
+
+Once the graph has run, the critical path is the chain of stages which
+bounds the total runtime: starting from the stage finishing last, each stage
+waited for its dependency finishing last. Shortening any other stage does
+not make the pipeline faster.
+"""
+# Standard libraries
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+
+class StageGraph:
+    """
+    Graph of stages run concurrently in dependency order.
+    - max_workers: number of threads running the stages (the default of
+      ThreadPoolExecutor if None).
+    After each run, the timings attribute maps the name of each stage that
+    ran to its start and end times in seconds since the start of the run.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.results = {}
+        self.timings = {}
+
+    def add(self, name, func, depends_on=()):
+        """
+        Add a stage running func() once the stages it depends on (already
+        added, so the graph never has a cycle) are done, and return its
+        name.
+        """
+        if name in self.stages:
+            raise ValueError(f'Duplicated stage {name!r}')
+        unknown = [
+            dependency for dependency in depends_on
+            if dependency not in self.stages
+        ]
+        if unknown:
+            raise ValueError(
+                f'Unknown dependencies {unknown} of the stage {name!r}, '
+                f'expected some of {sorted(self.stages)}'
+            )
+        self.stages[name] = (func, tuple(depends_on))
+        return name
+
+    def timed_call(self, name, origin):
+        """
+        Run a stage and record its start and end times.
+        """
+        start = time.perf_counter() - origin
+        try:
+            return self.stages[name][0]()
+        finally:
+            self.timings[name] = (start, time.perf_counter() - origin)
+
+    def run(self):
+        """
+        Run the stages and return their results as a dict keyed by stage
+        name. When a stage fails, no other stage is started, the running
+        ones are waited for and the error is raised.
+        """
+        self.results = {}
+        self.timings = {}
+        origin = time.perf_counter()
+        pending = dict(self.stages)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                ready = [
+                    name for name, (_, depends_on) in pending.items()
+                    if all(dep in self.results for dep in depends_on)
+                ]
+                for name in ready:
+                    del pending[name]
+                    future = pool.submit(self.timed_call, name, origin)
+                    running[future] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        wait(running)
+                        raise error
+                    self.results[name] = future.result()
+        return self.results
+
+    def critical_path(self):
+        """
+        Return the names of the stages of the critical path of the last
+        run, in execution order.
+        """
+        if not self.timings:
+            return []
+        path = [max(self.timings, key=lambda name: self.timings[name][1])]
+        while True:
+            depends_on = self.stages[path[-1]][1]
+            if not depends_on:
+                break
+            path.append(
+                max(depends_on, key=lambda name: self.timings[name][1]))
+        return path[::-1]
+
+    def report(self):
+        """
+        Return a short report of the start, end and duration of each stage
+        of the last run, with the stages of the critical path marked by *.
+        """
+        critical_path = self.critical_path()
+        lines = ['Stages (* critical path):']
+        for name, (start, end) in sorted(
+                self.timings.items(), key=lambda item: item[1]):
+            mark = '*' if name in critical_path else ' '
+            lines.append(
+                f'{mark} {name}: {start:.3f} s -> {end:.3f} s '
+                f'({end - start:.3f} s)'
+            )
+        if critical_path:
+            total = self.timings[critical_path[-1]][1]
+            lines.append(f'- total (wall clock): {total:.3f} s')
+        return '\n'.join(lines)
@@ -0,0 +1,91 @@
+"""
+===============================================================================
+Schema Registry of the Five Tables
+===============================================================================
+read_excel infers 64-bit integers for every number and full strings for
+every label. The registry pins compact types, applied and validated when the
+tables are loaded:
+- Enum for Accord, whose values ('O', 'N' or null) are fixed by the queries:
+  each value is stored as a small integer and the comparisons with a
+  literal, as in Accord = 'O', compare integers,
+- Categorical for the other labels (Ville, Catégorie_socioprofessionnelle,
+  Statut_emploi, Régularité_des_revenus), whose exact values are not known
+  in advance (a label spelt differently in a workbook is loaded as is, and
+  simply not matched by the literals of the queries),
+- Int32 for the keys, Int16 for Durée and Int8 for Nombre_enfants_à_charge,
+- Date for the dates.
+The amounts and incomes remain Int64 since they are summed (an Int32 sum
+overflows beyond 2147483647 €).
+"""
+# Other libraries
+import polars as pl
+
+
+
+ACCORD = pl.Enum(['O', 'N'])
+
+SCHEMAS = {
+    'mortgage_applications': {
+        'Numéro_demande_de_prêt': pl.Int32,
+        'Numéro_client': pl.Int32,
+        'Numéro_agence': pl.Int32,
+        'Date_de_demande': pl.Date,
+        'Montant_opération': pl.Int64,
+        'Durée': pl.Int16,
+        'Accord': ACCORD
+    },
+    'branches': {
+        'Numéro_agence': pl.Int32,
+        'Ville': pl.Categorical
+    },
+    'pro_status': {
+        'Numéro_client': pl.Int32,
+        'Catégorie_socioprofessionnelle': pl.Categorical,
+        'Statut_emploi': pl.Categorical,
+        'Régularité_des_revenus': pl.Categorical,
+        'Revenu_mensuel_moyen': pl.Int64
+    },
+    'down_payment': {
+        'Numéro_demande_de_prêt': pl.Int32,
+        'Apport': pl.Int64
+    },
+    'family_status': {
+        'Numéro_client': pl.Int32,
+        'Date_de_naissance': pl.Date,
+        'Nombre_enfants_à_charge': pl.Int8
+    }
+}
+
+
+def apply_schema(df, name, schemas=None):
+    """
+    Cast the columns of a table to the types of its schema and return it.
+    A ValueError is raised when a column is missing, or when a value does not
+    fit its type (a label missing from an Enum, which is named, or an
+    overflowing integer).
+    """
+    schemas = SCHEMAS if schemas is None else schemas
+    if name not in schemas:
+        raise ValueError(
+            f'Unknown table {name!r}, expected one of {sorted(schemas)}')
+    schema = schemas[name]
+    missing = [column for column in schema if column not in df.columns]
+    if missing:
+        raise ValueError(f'Table {name!r} has no column {missing}')
+    for column, dtype in schema.items():
+        if not isinstance(dtype, pl.Enum):
+            continue
+        labels = df[column].drop_nulls().unique().cast(pl.String)
+        unexpected = labels.filter(
+            ~labels.is_in(dtype.categories.implode())).sort().to_list()
+        if unexpected:
+            raise ValueError(
+                f'Unexpected labels {unexpected} in the column {column!r} of '
+                f'the table {name!r}, expected some of '
+                f'{dtype.categories.to_list()}'
+            )
+    try:
+        return df.cast(schema, strict=True)
+    except pl.exceptions.InvalidOperationError as error:
+        raise ValueError(
+            f'Table {name!r} does not match its schema: {error}') from error
@@ -0,0 +1,253 @@
+"""
+===============================================================================
+Scoring Service for Single Mortgage Applications
+===============================================================================
+A long-lived scorer keeps the tables in memory with hash indexes on
+Numéro_demande_de_prêt (mortgage_applications and down_payment) and
+Numéro_client (pro_status and family_status). To score one application or a
+small batch, only the matching rows are gathered and scored with query 18
+(QUERY_18_SITUATIONS and the rule engine), so the result is the same as for
+the whole dataset and is obtained in a few milliseconds.
+
+A thin HTTP endpoint, bound to the local host, exposes the scorer:
+- GET /score/<Numéro_demande_de_prêt>: status of a known application.
+- POST /score with a JSON body {"numbers": [...]} (known applications) or
+  {"applications": [...]} (new applications, as objects with the columns
+  of mortgage_applications and optionally Apport).
+- GET /metrics: number of requests and p50/p99 latencies in milliseconds.
+"""
+# Standard libraries
+import json
+import threading
+import time
+
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Other libraries
+import polars as pl
+
+
+from polars import SQLContext
+from mortgage_status.queries import (
+    APPLICATION_KEY, CLIENT_KEY, QUERY_18_SITUATIONS
+)
+from mortgage_status.rules import RuleEngine
+
+
+
+# Errors caused by an invalid request body
+REQUEST_ERRORS = (KeyError, TypeError, ValueError, pl.exceptions.PolarsError)
+
+
+def build_index(df, key):
+    """
+    Return a dict mapping each value of the key column to the positions of
+    its rows.
+    """
+    index = defaultdict(list)
+    for position, value in enumerate(df[key].to_list()):
+        index[value].append(position)
+    return dict(index)
+
+
+def to_frame(records, schema):
+    """
+    Build a DataFrame with the given schema from dicts whose values may be
+    given as JSON types (dates as ISO strings for instance); the missing
+    columns are null.
+    """
+    df = pl.from_dicts(
+        [{name: record.get(name) for name in schema} for record in records],
+        schema={name: None for name in schema},
+        infer_schema_length=None
+    )
+    return df.select(
+        pl.col(name).cast(dtype) for name, dtype in schema.items())
+
+
+class LatencyRecorder:
+    """
+    Record the latencies of the last `size` requests and compute their
+    percentiles (thread-safe).
+    """
+
+    def __init__(self, size=10_000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, percent):
+        """
+        Return a percentile of the recorded latencies in milliseconds (None
+        when nothing has been recorded yet).
+        """
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, int(percent / 100 * len(samples)))
+        return samples[rank] * 1000
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'p50_ms': self.percentile(50),
+            'p99_ms': self.percentile(99)
+        }
+
+
+class ApplicationScorer:
+    """
+    Score single mortgage applications or small batches.
+    - tables: dict of the mortgage_applications, pro_status, down_payment
+      and family_status DataFrames.
+    - rules: RuleEngine computing the status (the rules of query 18 by
+      default).
+    """
+
+    def __init__(self, tables, rules=None):
+        self.rules = RuleEngine() if rules is None else rules
+        self.applications = tables['mortgage_applications']
+        self.down_payment = tables['down_payment']
+        self.pro_status = tables['pro_status']
+        self.family_status = tables['family_status']
+        self.application_index = build_index(
+            self.applications, APPLICATION_KEY)
+        self.down_payment_index = build_index(
+            self.down_payment, APPLICATION_KEY)
+        self.pro_status_index = build_index(self.pro_status, CLIENT_KEY)
+        self.family_status_index = build_index(self.family_status, CLIENT_KEY)
+        self.latencies = LatencyRecorder()
+
+    @staticmethod
+    def lookup(df, index, keys):
+        """
+        Return the rows of a DataFrame matching the keys through its index.
+        """
+        positions = [
+            position for key in keys for position in index.get(key, ())
+        ]
+        return df[positions]
+
+    def score_frames(self, applications, down_payment):
+        """
+        Score the given applications and down payments with the indexed
+        data of their applicants.
+        """
+        clients = set(applications[CLIENT_KEY].to_list())
+        frames = {
+            'mortgage_applications': applications,
+            'down_payment': down_payment,
+            'pro_status': self.lookup(
+                self.pro_status, self.pro_status_index, clients),
+            'family_status': self.lookup(
+                self.family_status, self.family_status_index, clients)
+        }
+        with SQLContext(frames=frames, eager=True) as ctx:
+            situations = ctx.execute(QUERY_18_SITUATIONS)
+        return self.rules.score(situations, sort=False)
+
+    def score(self, numbers):
+        """
+        Score known applications given their Numéro_demande_de_prêt.
+        """
+        start = time.perf_counter()
+        try:
+            return self.score_frames(
+                self.lookup(
+                    self.applications, self.application_index, numbers),
+                self.lookup(
+                    self.down_payment, self.down_payment_index, numbers)
+            )
+        finally:
+            self.latencies.record(time.perf_counter() - start)
+
+    def score_applications(self, records):
+        """
+        Score new applications given as dicts with the columns of
+        mortgage_applications and optionally the Apport column.
+        """
+        start = time.perf_counter()
+        try:
+            applications = to_frame(records, self.applications.schema)
+            down_payment = to_frame(
+                [record for record in records
+                 if record.get('Apport') is not None],
+                self.down_payment.schema
+            )
+            return self.score_frames(applications, down_payment)
+        finally:
+            self.latencies.record(time.perf_counter() - start)
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler of the scoring endpoint (the scorer is an attribute of the
+    server).
+    """
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload, default=str, ensure_ascii=False)
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        scorer = self.server.scorer
+        if self.path == '/metrics':
+            self.send_json(scorer.latencies.summary())
+        elif self.path.startswith('/score/'):
+            number = self.path[len('/score/'):]
+            try:
+                number = int(number)
+            except ValueError:
+                self.send_json({'error': f'Invalid number {number!r}'}, 400)
+                return
+            self.send_json(scorer.score([number]).to_dicts())
+        else:
+            self.send_json({'error': 'Not found'}, 404)
+
+    def do_POST(self):
+        scorer = self.server.scorer
+        if self.path != '/score':
+            self.send_json({'error': 'Not found'}, 404)
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+            if 'numbers' in payload:
+                result = scorer.score(payload['numbers'])
+            else:
+                result = scorer.score_applications(payload['applications'])
+        except REQUEST_ERRORS as error:
+            self.send_json({'error': str(error)}, 400)
+            return
+        self.send_json(result.to_dicts())
+
+    def log_message(self, format, *args):
+        # Keep the console quiet, the latencies are exposed on /metrics
+        pass
+
+
+def serve(scorer, host='127.0.0.1', port=8018):
+    """
+    Serve the scorer over HTTP until interrupted.
+    """
+    server = ThreadingHTTPServer((host, port), ScoringHandler)
+    server.scorer = scorer
+    print(f'Scoring service listening on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
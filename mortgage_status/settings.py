@@ -0,0 +1,139 @@
+"""
+===============================================================================
+Default Settings of the Pipeline
+===============================================================================
+Each setting is an upper-case constant, described by the comment above it,
+and mortgage_status.pipeline.SETTINGS holds them all. The settings given to
+a Pipeline override some of them: those of mortgage_applications_status.py
+(or of another settings file) and of the --set options of the command line
+interface. This module imports nothing, so that reading the defaults does not
+import Polars.
+"""
+
+
+
+# Execution settings
+# Plan every SQL query lazily and collect them all together (False restores
+# the eager execution of the queries one after the other)
+LAZY_EXECUTION = True
+# Serve the workbooks from their columnar copies in INPUT_CACHE_DIR, rebuilt
+# only when a workbook changes ('parquet' or 'ipc' format)
+USE_INPUT_CACHE = True
+INPUT_CACHE_DIR = 'datasets/cache'
+INPUT_CACHE_FORMAT = 'parquet'
+# Number of workers reading the workbooks concurrently (None for one per
+# workbook) and kind of pool ('thread' or 'process')
+LOAD_WORKERS = None
+LOAD_EXECUTOR = 'thread'
+# Cast the columns of the tables to the compact types of the schema registry
+# (Enum and Categorical labels, small integer keys) once they are loaded
+USE_SCHEMA_REGISTRY = True
+# Profiling level: 'off', 'summary' (Polars-native summary of each column)
+# or 'full' (YData-profiling reports of at most PROFILING_SAMPLE_ROWS rows,
+# built in the background by PROFILING_WORKERS processes)
+PROFILING_LEVEL = 'summary'
+PROFILING_SAMPLE_ROWS = 100_000
+PROFILING_WORKERS = 2
+# Score the applications (query 18) with the streaming engine, scanning the
+# columnar copies of the shared store (or of the input cache) instead of
+# loading the tables, and write the status table to STREAMING_OUTPUT instead
+# of the Excel workbook (the peak memory is bounded by STREAMING_CHUNK_SIZE
+# rows per chunk when the score stage runs alone)
+STREAMING_SCORING = False
+STREAMING_OUTPUT = 'datasets/mortgage_applications_status.parquet'
+STREAMING_CHUNK_SIZE = 50_000
+# Compute the status of the applications (query 18) with the rule engine,
+# from the rules saved in RULES_FILE (JSON) or those of the CASE expression
+# of query 18 when it is None
+USE_RULE_ENGINE = True
+RULES_FILE = None
+# Count the applications accepted under each combination of the thresholds
+# of the rules of query 18, as a dict with the age_limits, debt_ratios and
+# child_adjustments lists, such as {'age_limits': [80, 82, 85],
+# 'debt_ratios': [0.3, 0.33, 0.35], 'child_adjustments': [0, 1]} (None skips
+# the what-if analysis)
+SCENARIO_GRID = None
+# Score again only the applications which changed since the previous run,
+# whose status table and row fingerprints are kept in INCREMENTAL_STATE_DIR
+# (with the rule engine, or the rules of query 18 if USE_RULE_ENGINE is False)
+INCREMENTAL_SCORING = False
+INCREMENTAL_STATE_DIR = 'datasets/incremental'
+# Score the applications (query 18) in SCORING_WORKERS worker processes (one
+# per core if None), over SCORING_SHARDS shards of the tables split by client
+# (one per worker if None) and saved in SHARD_DIR (a temporary directory if
+# None; a directory shared with other hosts lets them score shards too, with
+# python -m mortgage_status.sharding SHARD_DIR <shard>). With SCORING_WORKERS
+# = 0, no shard is scored here: the status tables of the shards scored by the
+# other hosts are checked every SHARD_POLL_INTERVAL seconds, until
+# SHARD_TIMEOUT seconds (no limit if None)
+SHARDED_SCORING = False
+SCORING_WORKERS = None
+SCORING_SHARDS = None
+SHARD_DIR = None
+SHARD_POLL_INTERVAL = 1.0
+SHARD_TIMEOUT = None
+# Once the pipeline has run, keep the tables in memory and serve the scoring
+# of single applications on http://127.0.0.1:SCORING_API_PORT
+SERVE_SCORING_API = False
+SCORING_API_PORT = 8018
+# Record the wall clock and CPU times, resident memory (and its change during
+# the stage), row counts and query plans of each stage as JSON lines
+# (OpenTelemetry-like spans) to TRACE_FILE (None disables the instrumentation)
+TRACE_FILE = None
+# Answer the queries sorting the applications by amount (1 to 5 and 13) from
+# a single sorted copy of the applications partitioned by Accord
+USE_SORTED_VIEWS = True
+# Answer the queries aggregating the applications by client (6, 11 and 16)
+# from the client aggregates kept in CLIENT_AGGREGATES_DIR, updated only with
+# the applications which changed since the previous run
+USE_CLIENT_AGGREGATES = True
+CLIENT_AGGREGATES_DIR = 'datasets/client_aggregates'
+# Answer the queries on the parts of Date_de_demande (7 to 10 and 17) from
+# the applications saved in PARTITIONED_STORE_DIR as Parquet files partitioned
+# by year, with the date parts computed once when the workbook changes
+USE_PARTITIONED_STORE = True
+PARTITIONED_STORE_DIR = 'datasets/applications_store'
+# Write the status table to OUTPUT_DIR in OUTPUT_FORMAT ('parquet', 'ipc' or
+# 'csv'), in batches of OUTPUT_BATCH_SIZE rows, with an XLSX copy written in
+# the background if EXCEL_OUTPUT is True, and also write the result of every
+# query to OUTPUT_DIR/results if WRITE_ALL_RESULTS is True
+OUTPUT_DIR = 'datasets'
+OUTPUT_FORMAT = 'parquet'
+OUTPUT_BATCH_SIZE = 100_000
+EXCEL_OUTPUT = True
+WRITE_ALL_RESULTS = False
+# Read the results of the SQL queries from RESULT_CACHE_DIR when neither
+# their SQL text nor the tables they reference changed since they were saved
+# (the least recently used results are evicted beyond RESULT_CACHE_MAX_BYTES)
+USE_RESULT_CACHE = True
+RESULT_CACHE_DIR = 'datasets/result_cache'
+RESULT_CACHE_MAX_BYTES = 256 * 2 ** 20
+# Join the applications once to the client-profile dimension (pro_status and
+# family_status merged and sorted by Numéro_client, failing on duplicated
+# clients) in the queries 15 to 18 instead of joining both tables
+USE_CLIENT_PROFILES = True
+# Run the stages of the pipeline (loading and profiling of each dataset,
+# queries, scoring and export) as a graph, each stage starting as soon as
+# the stages it depends on are done, in STAGE_WORKERS threads (the default of
+# ThreadPoolExecutor if None), and display the critical path of the run
+STAGE_SCHEDULER = False
+STAGE_WORKERS = None
+# Save the loaded tables to SHARED_STORE_DIR as uncompressed Arrow IPC files,
+# opened memory-mapped by the following runs (and by any other process of
+# the host) until their workbook changes
+USE_SHARED_STORE = True
+SHARED_STORE_DIR = 'datasets/shared_store'
+# Port of the query daemon (python -m mortgage_status daemon), which keeps the
+# tables in memory, reloads those whose workbook changes (checked every
+# DAEMON_POLL_INTERVAL seconds) and answers named and ad hoc SQL queries
+DAEMON_PORT = 8019
+DAEMON_POLL_INTERVAL = 1.0
+# Answer query 14 from the rollup cube saved in ROLLUP_CUBE_DIR (numbers and
+# total amounts of the applications by branch, year, quarter, Accord and
+# status, reused as it is while the workbooks do not change and refreshed
+# from the changed applications only otherwise), which the dashboards can read
+# as ROLLUP_CUBE_DIR/cube.parquet. Off by default: for 1 million applications,
+# query 14 takes 0.06 s but building or refreshing the cube about 5 s (it
+# scores the applications), and reusing it 0.01 s
+USE_ROLLUP_CUBE = False
+ROLLUP_CUBE_DIR = 'datasets/rollup_cube'
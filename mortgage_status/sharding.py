@@ -0,0 +1,277 @@
+"""
+===============================================================================
+Sharded Scoring of the Mortgage Applications (Query 18)
+===============================================================================
+The tables used by query 18 are split into shards by a hash of
+Numéro_client, so that every join of the query stays within a shard:
+- mortgage_applications, pro_status and family_status by their own
+  Numéro_client,
+- down_payment by the Numéro_client of its application (the down payments
+  without application all go to the shard of the null clients).
+The branches table is not used by query 18 and is not sharded.
+
+The shards are saved as Parquet files in a shard directory
+(<shard_dir>/shard=<i>/<table>.parquet) with the rules, then a manifest
+(shards.json) holding the number of shards and the identifier of the run is
+written last. Each shard is scored by its own worker process:
+
+    python -m mortgage_status.sharding <shard_dir> <shard>
+
+which writes <shard_dir>/shard=<i>/status_<run>.parquet atomically. The
+workers can run on this machine (score_sharded starts them, each with its
+share of the cores, skipping the shards already scored) or on other hosts
+sharing the shard directory (score_sharded with no local worker only waits
+for their status tables). The status tables of the shards are then merged
+into the status table of query 18; those of a previous run, named after
+their own run, are never taken.
+"""
+# Standard libraries
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Other libraries
+import polars as pl
+
+
+from polars import SQLContext
+from mortgage_status.cache import write_atomic
+from mortgage_status.queries import (
+    APPLICATION_KEY, CLIENT_KEY, QUERY_18_SITUATIONS
+)
+from mortgage_status.rules import (
+    STATUS_COLUMN, RuleEngine, load_rules, save_rules
+)
+
+
+
+SHARD_COLUMN = 'Partition'
+
+# Tables of query 18, all sharded by Numéro_client
+SHARDED_TABLES = (
+    'mortgage_applications', 'down_payment', 'pro_status', 'family_status'
+)
+
+
+def shard_of(n_shards):
+    """
+    Return the expression of the shard of a row from its Numéro_client.
+    """
+    return (pl.col(CLIENT_KEY).hash(seed=0) % n_shards).alias(SHARD_COLUMN)
+
+
+def partition_tables(tables, n_shards):
+    """
+    Split the tables of query 18 into shards and return the list of the
+    dicts of the tables of each shard.
+    """
+    clients = tables['mortgage_applications'].select(
+        APPLICATION_KEY, CLIENT_KEY).unique(APPLICATION_KEY, keep='first')
+    keyed = {
+        name: tables[name] for name in SHARDED_TABLES
+        if name != 'down_payment'
+    }
+    keyed['down_payment'] = tables['down_payment'].join(
+        clients, on=APPLICATION_KEY, how='left')
+    shards = [{} for _ in range(n_shards)]
+    for name, df in keyed.items():
+        partitions = df.with_columns(shard_of(n_shards)).partition_by(
+            SHARD_COLUMN, as_dict=True, include_key=False)
+        for shard in range(n_shards):
+            part = partitions.get((shard,), df.clear())
+            if name == 'down_payment':
+                part = part.drop(CLIENT_KEY)
+            shards[shard][name] = part
+    return shards
+
+
+def shard_path(shard_dir, shard, name):
+    """
+    Return the path of a file of a shard.
+    """
+    return os.path.join(shard_dir, f'shard={shard}', f'{name}.parquet')
+
+
+def read_manifest(shard_dir):
+    """
+    Return the manifest of the shard directory (the number of shards and
+    the identifier of the run which wrote them).
+    """
+    path = os.path.join(shard_dir, 'shards.json')
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def write_shards(tables, shard_dir, n_shards, rules=None):
+    """
+    Split the tables of query 18 into shards, save them with the rules in
+    the shard directory and return the identifier of the run. The manifest
+    is removed first and written last, so no worker scores shards being
+    written, and the status tables of the previous runs are removed.
+    """
+    manifest_path = os.path.join(shard_dir, 'shards.json')
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    for path in glob.glob(shard_path(shard_dir, '*', 'status_*')):
+        os.remove(path)
+    for shard, shard_tables in enumerate(partition_tables(tables, n_shards)):
+        os.makedirs(os.path.dirname(shard_path(shard_dir, shard, '_')),
+                    exist_ok=True)
+        for name, df in shard_tables.items():
+            write_atomic(
+                df, shard_path(shard_dir, shard, name),
+                pl.DataFrame.write_parquet
+            )
+    rules = RuleEngine() if rules is None else rules
+    save_rules(rules.rules, os.path.join(shard_dir, 'rules.json'))
+    run = uuid.uuid4().hex
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({'shards': n_shards, 'run': run}, file, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return run
+
+
+def score_shard(shard_dir, shard):
+    """
+    Score the applications of a shard with the rules of the shard directory
+    and save their status table (named after the run of the manifest);
+    return its path.
+    """
+    manifest = read_manifest(shard_dir)
+    if not 0 <= shard < manifest['shards']:
+        raise ValueError(
+            f'Unknown shard {shard!r}, expected one of '
+            f'{list(range(manifest["shards"]))}'
+        )
+    frames = {
+        name: pl.scan_parquet(shard_path(shard_dir, shard, name))
+        for name in SHARDED_TABLES
+    }
+    rules = RuleEngine(load_rules(os.path.join(shard_dir, 'rules.json')))
+    with SQLContext(frames=frames, eager=False) as ctx:
+        situations = ctx.execute(QUERY_18_SITUATIONS)
+    status = rules.score(situations.drop(APPLICATION_KEY), sort=False)
+    path = shard_path(shard_dir, shard, f'status_{manifest["run"]}')
+    write_atomic(status.collect(), path, pl.DataFrame.write_parquet)
+    return path
+
+
+def wait_for_shards(shard_dir, n_shards, run, poll_interval=1.0,
+                    timeout=None):
+    """
+    Wait until the status tables of every shard of a run are written (by
+    the workers of any host), checking every poll_interval seconds. A
+    TimeoutError is raised after timeout seconds (never by default).
+    """
+    start = time.monotonic()
+    while True:
+        missing = [
+            shard for shard in range(n_shards) if not os.path.exists(
+                shard_path(shard_dir, shard, f'status_{run}'))
+        ]
+        if not missing:
+            return
+        if timeout is not None and time.monotonic() - start > timeout:
+            raise TimeoutError(
+                f'Shards {missing} of {shard_dir!r} were not scored within '
+                f'{timeout} s'
+            )
+        time.sleep(poll_interval)
+
+
+def merge_shards(shard_dir, n_shards, run):
+    """
+    Merge the status tables of the shards of a run, sorted by status as in
+    query 18.
+    """
+    return pl.concat([
+        pl.read_parquet(shard_path(shard_dir, shard, f'status_{run}'))
+        for shard in range(n_shards)
+    ]).sort(STATUS_COLUMN, descending=True)
+
+
+def run_worker(shard_dir, shard, threads, run):
+    """
+    Score a shard in a worker process limited to a number of threads,
+    unless another host already scored it.
+    """
+    if os.path.exists(shard_path(shard_dir, shard, f'status_{run}')):
+        return
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = os.pathsep.join(
+        filter(None, [root, os.environ.get('PYTHONPATH')]))
+    env = dict(os.environ, POLARS_MAX_THREADS=str(threads), PYTHONPATH=path)
+    subprocess.run(
+        [sys.executable, '-m', 'mortgage_status.sharding', shard_dir,
+         str(shard)],
+        env=env,
+        check=True
+    )
+
+
+def score_sharded(tables, n_shards=None, workers=None, rules=None,
+                  shard_dir=None, poll_interval=1.0, timeout=None):
+    """
+    Score the applications shard by shard in parallel worker processes and
+    return the status table of query 18.
+    - tables: dict of DataFrames keyed by table name.
+    - n_shards: number of shards (the number of workers by default).
+    - workers: number of worker processes running at once on this machine
+      (one per core by default), which share its cores; with 0, no shard is
+      scored here and the status tables written by the workers of other
+      hosts are waited for.
+    - rules: RuleEngine computing the status (the rules of query 18 by
+      default).
+    - shard_dir: directory of the shards (a temporary directory, removed
+      afterwards, by default; required without local worker).
+    - poll_interval: seconds between two checks of the status tables of the
+      shards scored by other hosts.
+    - timeout: seconds after which a TimeoutError is raised if some shards
+      are still not scored (never by default).
+    """
+    workers = os.cpu_count() if workers is None else workers
+    n_shards = workers if n_shards is None else n_shards
+    if not workers and (shard_dir is None or not n_shards):
+        raise ValueError(
+            'Scoring the shards on other hosts needs a shard directory and '
+            'a number of shards'
+        )
+    if shard_dir is None:
+        with tempfile.TemporaryDirectory() as directory:
+            return score_sharded(tables, n_shards, workers, rules, directory)
+
+    run = write_shards(tables, shard_dir, n_shards, rules)
+    if workers:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(run_worker, shard_dir, shard, threads, run)
+                for shard in range(n_shards)
+            ]
+            for future in futures:
+                future.result()
+    wait_for_shards(shard_dir, n_shards, run, poll_interval, timeout)
+    return merge_shards(shard_dir, n_shards, run)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Score one shard of the mortgage applications.')
+    parser.add_argument('shard_dir', help='directory of the shards')
+    parser.add_argument('shard', type=int, help='number of the shard')
+    args = parser.parse_args(args)
+    score_shard(args.shard_dir, args.shard)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,207 @@
+"""
+===============================================================================
+Memory-Mapped Store of the Loaded Tables
+===============================================================================
+Each process loading the datasets parses (or reads from the input cache) and
+casts its own copy of the five tables. The SharedTableStore saves the loaded
+tables, with the types of the schema registry, as uncompressed Arrow IPC
+files in a single chunk, next to a JSON manifest holding the fingerprint of
+their workbook. The following loads open the files memory-mapped as long as
+the workbook did not change:
+- opening a table is near-instant whatever its size, the pages being read
+  on first access only,
+- all the processes of a host opening the store share the physical copy of
+  the tables held by the page cache.
+A table is replaced by moving a new file over the old one, so the processes
+which mapped the old file keep reading it safely.
+"""
+# Standard libraries
+import json
+import os
+import time
+
+# Other libraries
+import polars as pl
+import pyarrow as pa
+
+
+from polars import read_excel
+from mortgage_status.cache import fingerprint, write_atomic
+from mortgage_status.loading import load_tables
+
+
+
+def write_ipc(df, path):
+    """
+    Write a DataFrame as an uncompressed Arrow IPC file in a single chunk,
+    so that it can be memory-mapped without copy.
+    """
+    df = df.rechunk()
+    try:
+        df.write_ipc(
+            path, compression='uncompressed',
+            record_batch_size=max(df.height, 1)
+        )
+    except TypeError:
+        # Polars 1 has no record_batch_size and writes a record batch per
+        # chunk
+        df.write_ipc(path, compression='uncompressed')
+
+
+class SharedTableStore:
+    """
+    Loaded tables saved as Arrow IPC files and opened memory-mapped.
+    - store_dir: directory of the tables and of their manifests.
+    After each load, the statistics attribute lists the tables opened from
+    the store and those loaded from their workbook and saved.
+    """
+
+    def __init__(self, store_dir='datasets/shared_store'):
+        self.store_dir = store_dir
+        self.statistics = {}
+
+    def paths(self, name):
+        """
+        Return the paths of the IPC file and of the manifest of a table.
+        """
+        return (
+            os.path.join(self.store_dir, f'{name}.arrow'),
+            os.path.join(self.store_dir, f'{name}.json')
+        )
+
+    def signature(self, name, schemas=None):
+        """
+        Return what a saved table depends on besides its workbook: the
+        version of Polars and the types applied to its columns.
+        """
+        schema = None
+        if schemas is not None and name in schemas:
+            schema = {
+                column: str(dtype) for column, dtype in schemas[name].items()
+            }
+        return {'polars': pl.__version__, 'schema': schema}
+
+    def is_fresh(self, name, source, schemas=None):
+        """
+        Check whether a saved table was loaded from the current version of
+        its workbook (compared by size and modification time, then by
+        content hash) with the same types.
+        """
+        data_path, manifest_path = self.paths(name)
+        if not os.path.exists(data_path):
+            return False
+        try:
+            with open(manifest_path, encoding='utf-8') as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            return False
+        if manifest.get('signature') != self.signature(name, schemas):
+            return False
+        saved = manifest.get('source', {})
+        stat = os.stat(source)
+        if (saved.get('size') == stat.st_size
+                and saved.get('mtime_ns') == stat.st_mtime_ns):
+            return True
+        return saved.get('sha256') == fingerprint(source)['sha256']
+
+    def source_fingerprint(self, name):
+        """
+        Return the fingerprint of the workbook a saved table was loaded from
+        (None if the table is not saved).
+        """
+        try:
+            with open(self.paths(name)[1], encoding='utf-8') as file:
+                return json.load(file).get('source')
+        except FileNotFoundError:
+            return None
+
+    def save(self, name, df, source_fingerprint, schemas=None):
+        """
+        Save a loaded table with the fingerprint of its workbook, taken
+        before it was read (the manifest is written last, so an interrupted
+        save is never taken as a valid table).
+        """
+        data_path, manifest_path = self.paths(name)
+        os.makedirs(self.store_dir, exist_ok=True)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        write_atomic(df, data_path, write_ipc)
+        tmp_path = f'{manifest_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'signature': self.signature(name, schemas),
+                    'source': source_fingerprint
+                },
+                file,
+                indent=2
+            )
+        os.replace(tmp_path, manifest_path)
+
+    def open(self, name):
+        """
+        Open a saved table memory-mapped: its columns are views of the pages
+        of the file, read on first access only (except the codes of the Enum
+        and Categorical columns, which Polars 2 encodes again).
+        """
+        source = pa.memory_map(self.paths(name)[0])
+        return pl.from_arrow(
+            pa.ipc.open_file(source).read_all(), rechunk=False)
+
+    def load(self, sources, reader=read_excel, max_workers=None,
+             executor='thread', schemas=None):
+        """
+        Load the tables from the store, or with load_tables (same arguments)
+        for those whose workbook changed, which are then saved and opened
+        from the store. Return the dict of DataFrames and the dict of
+        loading times in seconds, both keyed by table name.
+        """
+        timings = {}
+        fresh = []
+        for name, source in sources.items():
+            start = time.perf_counter()
+            if self.is_fresh(name, source, schemas):
+                fresh.append(name)
+                timings[name] = time.perf_counter() - start
+        stale = {
+            name: source for name, source in sources.items()
+            if name not in fresh
+        }
+        if stale:
+            source_fingerprints = {
+                name: fingerprint(source) for name, source in stale.items()
+            }
+            loaded, load_times = load_tables(
+                sources=stale,
+                reader=reader,
+                max_workers=max_workers,
+                executor=executor,
+                schemas=schemas
+            )
+            for name, df in loaded.items():
+                start = time.perf_counter()
+                self.save(name, df, source_fingerprints[name], schemas)
+                timings[name] = (
+                    load_times[name] + time.perf_counter() - start)
+
+        # Open every table from the store, so that the tables just loaded
+        # are shared too
+        tables = {}
+        for name in sources:
+            start = time.perf_counter()
+            tables[name] = self.open(name)
+            timings[name] += time.perf_counter() - start
+        self.statistics = {'opened': fresh, 'saved': list(stale)}
+        return tables, timings
+
+    def open_tables(self):
+        """
+        Open every table of the store memory-mapped (from another process
+        or analysis working on the tables loaded by the pipeline), as a dict
+        of DataFrames keyed by table name.
+        """
+        return {
+            name[:-len('.json')]: self.open(name[:-len('.json')])
+            for name in sorted(os.listdir(self.store_dir))
+            if name.endswith('.json')
+        }
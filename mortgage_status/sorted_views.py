@@ -0,0 +1,116 @@
+"""
+===============================================================================
+Shared Sorted View of the Applications by Amount
+===============================================================================
+Queries 1 to 5 all filter the mortgage_applications table and sort the result
+by Montant_opération in descending order, and query 13 sorts it again to keep
+the 10 largest applications. The AmountIndex sorts the applications once,
+partitions them by Accord ('O', 'N' or null) keeping that order, and answers
+these queries with partitions, filters and slices, which need no further
+sort:
+- queries 1, 2 and 4 are the 'O', 'N' and null partitions,
+- query 3 is the sorted table without the null partition,
+- query 5 is a slice of the sorted table, found by binary search,
+- query 13 joins the first 10 rows of the sorted table with the branches.
+The sort is stable: the applications with the same amount keep the order of
+the table, as in the SQL queries.
+"""
+# Other libraries
+import polars as pl
+
+
+
+AMOUNT_COLUMN = 'Montant_opération'
+ACCORD_COLUMN = 'Accord'
+
+# Queries answered by the index
+INDEXED_QUERIES = (1, 2, 3, 4, 5, 13)
+
+
+class AmountIndex:
+    """
+    Applications sorted by Montant_opération in descending order (with the
+    null amounts first, as in the ORDER BY ... DESC of the queries, and the
+    ties in the order of the table) and partitioned by Accord.
+    """
+
+    def __init__(self, mortgage_applications, branches=None):
+        self.sorted = mortgage_applications.sort(
+            AMOUNT_COLUMN, descending=True, maintain_order=True)
+        self.branches = branches
+        self.partitions = self.sorted.partition_by(
+            ACCORD_COLUMN, as_dict=True, maintain_order=True)
+        self.null_amounts = self.sorted[AMOUNT_COLUMN].null_count()
+
+    def partition(self, accord):
+        """
+        Return the applications with the given Accord value (None for the
+        unprocessed ones), sorted by amount.
+        """
+        return self.partitions.get((accord,), self.sorted.clear())
+
+    def processed(self):
+        """
+        Return the granted or refused applications, sorted by amount.
+        """
+        return self.sorted.filter(pl.col(ACCORD_COLUMN).is_not_null())
+
+    def above(self, threshold):
+        """
+        Return the applications whose amount exceeds a threshold, sorted by
+        amount: they are found by binary search after the null amounts.
+        """
+        amounts = self.sorted[AMOUNT_COLUMN]
+        low, high = self.null_amounts, len(amounts)
+        while low < high:
+            middle = (low + high) // 2
+            if amounts[middle] > threshold:
+                low = middle + 1
+            else:
+                high = middle
+        return self.sorted.slice(
+            self.null_amounts, low - self.null_amounts)
+
+    def top(self, k):
+        """
+        Return the k applications with the largest amounts.
+        """
+        return self.sorted.head(k)
+
+    def top_with_branches(self, k):
+        """
+        Return the Numéro_agence, Ville and Montant_opération columns of the
+        k applications with the largest amounts.
+        """
+        top = self.top(k).select('Numéro_agence', AMOUNT_COLUMN)
+        if self.branches is not None:
+            top = top.join(
+                self.branches.select('Numéro_agence', 'Ville'),
+                on='Numéro_agence',
+                how='left',
+                maintain_order='left'
+            )
+        else:
+            top = top.with_columns(Ville=pl.lit(None, dtype=pl.String))
+        return top.select('Numéro_agence', 'Ville', AMOUNT_COLUMN).head(k)
+
+    def answer(self, number):
+        """
+        Return the result of one of the INDEXED_QUERIES.
+        """
+        if number == 1:
+            return self.partition('O')
+        if number == 2:
+            return self.partition('N')
+        if number == 3:
+            return self.processed()
+        if number == 4:
+            return self.partition(None)
+        if number == 5:
+            return self.above(100000)
+        if number == 13:
+            return self.top_with_branches(10)
+        raise ValueError(
+            f'Query {number} cannot be answered by the index, expected one '
+            f'of {INDEXED_QUERIES}'
+        )
@@ -0,0 +1,82 @@
+"""
+===============================================================================
+Out-of-Core Scoring of the Mortgage Applications (Query 18)
+===============================================================================
+Query 18 is run with the Polars streaming engine over the columnar copies of
+the datasets (Parquet or Arrow IPC files, such as those of the input cache),
+and its result is sunk to a Parquet file row group by row group. The tables
+are processed in chunks of a configurable number of rows, so the peak memory
+depends on the chunk size and on the size of the joined dimension tables, not
+on the number of applications.
+"""
+# Standard libraries
+import re
+
+# Other libraries
+import polars as pl
+
+
+from polars import SQLContext
+from mortgage_status.queries import (
+    APPLICATION_KEY, QUERY_18, QUERY_18_SITUATIONS
+)
+
+
+
+SCANNERS = {
+    '.parquet': pl.scan_parquet,
+    '.arrow': pl.scan_ipc,
+    '.ipc': pl.scan_ipc,
+    '.feather': pl.scan_ipc
+}
+
+
+def scan(path):
+    """
+    Return a LazyFrame scanning a Parquet or Arrow IPC file.
+    """
+    for extension, scanner in SCANNERS.items():
+        if path.endswith(extension):
+            return scanner(path)
+    raise ValueError(f'Unsupported columnar file: {path!r}')
+
+
+def without_order_by(query):
+    """
+    Remove the final ORDER BY clause of a query (a global sort has to hold
+    the whole result in memory).
+    """
+    return re.sub(r'\s+ORDER BY[^;]*;\s*$', ';', query)
+
+
+def score_streaming(sources, output_path, chunk_size=50_000,
+                    row_group_size=100_000, sort=False, rules=None):
+    """
+    Score the mortgage applications with the streaming engine and write the
+    status table to a Parquet file.
+    - sources: dict mapping the table names used in query 18 to the paths of
+      their Parquet or Arrow IPC files.
+    - output_path: path of the Parquet file of the status table.
+    - chunk_size: number of rows processed at once by the streaming engine.
+    - row_group_size: number of rows of each row group of the output file.
+    - sort: keep the ORDER BY of query 18 (the sort then needs to hold the
+      whole result in memory).
+    - rules: RuleEngine computing the status instead of the CASE expression
+      of query 18.
+    """
+    frames = {name: scan(path) for name, path in sources.items()}
+    with SQLContext(frames=frames, eager=False) as ctx:
+        if rules is not None:
+            situations = ctx.execute(QUERY_18_SITUATIONS)
+            status = rules.score(situations.drop(APPLICATION_KEY), sort=sort)
+        else:
+            query = QUERY_18 if sort else without_order_by(QUERY_18)
+            status = ctx.execute(query)
+    with pl.Config(streaming_chunk_size=chunk_size):
+        status.sink_parquet(
+            output_path,
+            row_group_size=row_group_size,
+            maintain_order=sort,
+            engine='streaming'
+        )
+    return output_path
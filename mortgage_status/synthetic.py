@@ -0,0 +1,245 @@
+"""
+===============================================================================
+Synthetic Crédit Breton Datasets
+===============================================================================
+Generate synthetic versions of the five tables with the same columns and
+types as the Crédit Breton workbooks, at any number of applications (from a
+few thousand to tens of millions), to measure how the pipeline scales:
+- a share of the applications comes from a small number of very active
+  clients (Zipf distribution), the others being spread uniformly, and the
+  branches are skewed the same way,
+- the Accord column is null for the unprocessed applications,
+- some applications have no down payment and some clients have no family
+  status, so that the outer and left joins produce nulls as in the real data.
+"""
+# Standard libraries
+import math
+import os
+import random
+
+from datetime import date
+
+# Other libraries
+import polars as pl
+
+
+
+# File names of the tables, as in the datasets directory
+FILE_NAMES = {
+    'mortgage_applications': 'crédit breton_demandes de prêt',
+    'branches': 'crédit breton_agences',
+    'pro_status': 'crédit breton_situation pro',
+    'down_payment': 'crédit breton_apport',
+    'family_status': 'crédit breton_situation familiale'
+}
+
+CITIES = [
+    'Rennes', 'Brest', 'Quimper', 'Lorient', 'Vannes', 'Saint-Malo',
+    'Saint-Brieuc', 'Lannion', 'Morlaix', 'Fougères', 'Vitré', 'Concarneau'
+]
+SOCIO_PROFESSIONAL_CATEGORIES = [
+    'Agriculteurs exploitants',
+    'Artisans, commerçants, chefs d\'entreprise',
+    'Cadres et professions intellectuelles supérieures',
+    'Professions intermédiaires',
+    'Employés',
+    'Ouvriers',
+    'Retraités'
+]
+EMPLOYMENT_STATUSES = [
+    'CDI', 'CDD', 'Indépendant', 'Fonctionnaire', 'Retraité'
+]
+INCOME_REGULARITIES = [
+    '1 : Très réguliers', '2 : Réguliers', '3 : Très irréguliers'
+]
+DURATIONS = [60, 84, 120, 144, 180, 240, 300]
+EPOCH = date(1970, 1, 1)
+
+
+def uniform(rng, size):
+    """
+    Draw `size` floats uniformly in [0, 1), as the hashes of the row
+    numbers with a seed drawn from rng (a random.Random).
+    """
+    hashes = pl.int_range(0, size, eager=True).hash(seed=rng.getrandbits(63))
+    return hashes.cast(pl.Float64) / 2.0 ** 64
+
+
+def integers(rng, size, low, high):
+    """
+    Draw `size` integers uniformly between low and high (included).
+    """
+    return (
+        (uniform(rng, size) * (high - low + 1)).floor().cast(pl.Int64) + low
+    ).clip(low, high)
+
+
+def lognormal(rng, size, mean, sigma):
+    """
+    Draw `size` floats from a log-normal distribution (Box-Muller transform
+    of two uniform draws).
+    """
+    radius = (-2 * (1 - uniform(rng, size)).log()).sqrt()
+    normal = radius * (2 * math.pi * uniform(rng, size)).cos()
+    return (mean + sigma * normal).exp()
+
+
+def skewed_keys(rng, size, n_keys, skew, zipf_exponent=1.3):
+    """
+    Draw `size` keys between 1 and n_keys: a `skew` share of them follows a
+    power law of exponent zipf_exponent (the discretized Pareto
+    approximation of a Zipf distribution) over a random ranking of the
+    keys, the others are uniform.
+    """
+    keys = integers(rng, size, 1, n_keys)
+    ranks = (
+        (1 - uniform(rng, size)).pow(-1 / (zipf_exponent - 1))
+        .clip(1, n_keys).floor().cast(pl.Int64)
+    )
+    skewed = uniform(rng, size) < skew
+    ranking = pl.int_range(1, n_keys + 1, eager=True).shuffle(
+        seed=rng.getrandbits(63))
+    return pl.select(
+        pl.when(skewed).then(ranking.gather(ranks - 1)).otherwise(keys)
+    ).to_series()
+
+
+def random_dates(rng, size, start, end):
+    """
+    Draw `size` dates uniformly between two dates.
+    """
+    days = integers(rng, size, 0, (end - start).days)
+    days += (start - EPOCH).days
+    return days.cast(pl.Int32).cast(pl.Date)
+
+
+def choice(rng, values, size, probabilities=None, dtype=None):
+    """
+    Draw `size` values among the given ones (uniformly if no probabilities
+    are given).
+    """
+    draws = uniform(rng, size)
+    if probabilities is None:
+        indices = (draws * len(values)).floor()
+    else:
+        cumulative = pl.Series(probabilities).cum_sum()
+        indices = cumulative.search_sorted(draws, side='right')
+    indices = indices.cast(pl.Int64).clip(0, len(values) - 1)
+    return pl.Series(values, dtype=dtype).gather(indices)
+
+
+def generate(n_applications, seed=0, clients_ratio=0.6, n_branches=None,
+             skew=0.1, unprocessed_ratio=0.2, missing_down_payment=0.05,
+             missing_family_status=0.02):
+    """
+    Generate the five tables for a given number of applications and return
+    them as a dict of DataFrames keyed by table name.
+    - seed: seed of the random generator (the same seed gives the same
+      tables with the same version of Polars, whose hashes draw the
+      values).
+    - clients_ratio: number of clients per application.
+    - n_branches: number of branches (about one per 2000 applications, at
+      least 20, by default).
+    - skew: share of the applications of the most active clients.
+    - unprocessed_ratio: share of the applications with a null Accord.
+    - missing_down_payment: share of the applications without down payment.
+    - missing_family_status: share of the clients without family status.
+    """
+    rng = random.Random(seed)
+    n = n_applications
+    n_clients = max(1, int(n * clients_ratio))
+    if n_branches is None:
+        n_branches = max(20, n // 2000)
+
+    processed = (1 - unprocessed_ratio) / 2
+    amounts = (lognormal(rng, n, 12.2, 0.45) / 1000).round() * 1000
+    mortgage_applications = pl.DataFrame({
+        'Numéro_demande_de_prêt': pl.int_range(1, n + 1, eager=True),
+        'Numéro_client': skewed_keys(rng, n, n_clients, skew),
+        'Numéro_agence': skewed_keys(rng, n, n_branches, skew),
+        'Date_de_demande': random_dates(
+            rng, n, date(2015, 1, 1), date(2023, 12, 31)),
+        'Montant_opération': amounts.cast(pl.Int64),
+        'Durée': choice(rng, DURATIONS, n, dtype=pl.Int64),
+        'Accord': choice(
+            rng, ['O', 'N', None], n,
+            [processed, processed, unprocessed_ratio], dtype=pl.String
+        )
+    })
+
+    branches = pl.DataFrame({
+        'Numéro_agence': pl.int_range(1, n_branches + 1, eager=True),
+        'Ville': choice(rng, CITIES, n_branches, dtype=pl.String)
+    })
+
+    pro_status = pl.DataFrame({
+        'Numéro_client': pl.int_range(1, n_clients + 1, eager=True),
+        'Catégorie_socioprofessionnelle': choice(
+            rng, SOCIO_PROFESSIONAL_CATEGORIES, n_clients, dtype=pl.String),
+        'Statut_emploi': choice(
+            rng, EMPLOYMENT_STATUSES, n_clients, dtype=pl.String),
+        'Régularité_des_revenus': choice(
+            rng, INCOME_REGULARITIES, n_clients, [0.6, 0.3, 0.1],
+            dtype=pl.String
+        ),
+        'Revenu_mensuel_moyen': (
+            lognormal(rng, n_clients, 8.0, 0.4).round().cast(pl.Int64)
+        )
+    })
+
+    with_down_payment = uniform(rng, n) >= missing_down_payment
+    down_payment = (
+        mortgage_applications
+        .select(
+            'Numéro_demande_de_prêt',
+            Apport=(
+                pl.col('Montant_opération') * uniform(rng, n) * 0.3 / 100
+            ).round() * 100
+        )
+        .filter(with_down_payment)
+        .with_columns(pl.col('Apport').cast(pl.Int64))
+    )
+
+    with_family_status = uniform(rng, n_clients) >= missing_family_status
+    n_families = int(with_family_status.sum())
+    family_status = pl.DataFrame({
+        'Numéro_client': pl.int_range(1, n_clients + 1, eager=True).filter(
+            with_family_status),
+        'Date_de_naissance': random_dates(
+            rng, n_families, date(1940, 1, 1), date(2002, 12, 31)),
+        'Nombre_enfants_à_charge': choice(
+            rng, range(6), n_families, [0.35, 0.2, 0.25, 0.12, 0.05, 0.03],
+            dtype=pl.Int64
+        )
+    })
+
+    return {
+        'mortgage_applications': mortgage_applications,
+        'branches': branches,
+        'pro_status': pro_status,
+        'down_payment': down_payment,
+        'family_status': family_status
+    }
+
+
+def write_tables(tables, directory, fmt='parquet'):
+    """
+    Write the tables to a directory, with the file names of the datasets,
+    as 'parquet', 'ipc' or 'xlsx' files (an Excel sheet holds at most about
+    one million rows). Return the dict of the paths keyed by table name.
+    """
+    writers = {
+        'parquet': ('.parquet', pl.DataFrame.write_parquet),
+        'ipc': ('.arrow', pl.DataFrame.write_ipc),
+        'xlsx': ('.xlsx', pl.DataFrame.write_excel)
+    }
+    if fmt not in writers:
+        raise ValueError(
+            f'Unknown format {fmt!r}, expected one of {sorted(writers)}')
+    extension, writer = writers[fmt]
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, df in tables.items():
+        paths[name] = os.path.join(directory, FILE_NAMES[name] + extension)
+        writer(df, paths[name])
+    return paths
@@ -0,0 +1,41 @@
+"""
+===============================================================================
+Tests of the Batch Iterator of the Large Query Results
+===============================================================================
+Check that the batches of the batched queries (sliced or read from the
+spilled file of query 12) are at most batch_size rows and make up the result
+of the query.
+"""
+# Other libraries
+import polars as pl
+import pytest
+
+
+from mortgage_status.batches import BATCHED_QUERIES, query_batches
+from mortgage_status.queries import QUERIES, execute_queries
+from mortgage_status.schemas import apply_schema
+from mortgage_status.synthetic import generate
+
+
+
+@pytest.fixture(scope='module')
+def tables():
+    return {
+        name: apply_schema(df, name)
+        for name, df in generate(2000, seed=1).items()
+    }
+
+
+@pytest.mark.parametrize('number', BATCHED_QUERIES)
+def test_batches(tables, tmp_path, number):
+    batches = list(
+        query_batches(tables, number, batch_size=300, spill_dir=tmp_path))
+    expected = execute_queries(tables, {number: QUERIES[number]})[number]
+    assert all(0 < batch.height <= 300 for batch in batches)
+    assert pl.concat(batches).equals(expected)
+    assert not list(tmp_path.iterdir())
+
+
+def test_invalid_batched_query(tables):
+    with pytest.raises(ValueError):
+        query_batches(tables, 1)
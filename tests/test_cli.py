@@ -0,0 +1,81 @@
+"""
+===============================================================================
+Tests of the Command Line Interface
+===============================================================================
+Check the import-time budget of the interface in a fresh interpreter, and the
+settings given by the --settings and --set options before or after the
+command.
+"""
+# Standard libraries
+import os
+import subprocess
+import sys
+
+# Other libraries
+import pytest
+
+
+from mortgage_status.cli import (
+    SETTINGS_FILE, build_parser, command_settings
+)
+
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse(*args):
+    return build_parser().parse_args(list(args))
+
+
+def test_import_time_budget():
+    result = subprocess.run(
+        [sys.executable, '-m', 'mortgage_status', 'check-import-time'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+@pytest.fixture
+def settings_file(tmp_path):
+    path = tmp_path / 'settings.py'
+    path.write_text("LAZY_EXECUTION = True\nOUTPUT_FORMAT = 'parquet'\n")
+    return str(path)
+
+
+def test_settings_after_command(settings_file):
+    args = parse('query', '1', '13', '--settings', settings_file,
+                 '--set', 'LAZY_EXECUTION=False')
+    assert args.command == 'query'
+    assert args.numbers == [1, 13]
+    assert command_settings(args) == {
+        'LAZY_EXECUTION': False, 'OUTPUT_FORMAT': 'parquet'}
+
+
+def test_settings_before_command(settings_file):
+    args = parse('--settings', settings_file, '--set', "OUTPUT_FORMAT='csv'",
+                 'export')
+    assert command_settings(args) == {
+        'LAZY_EXECUTION': True, 'OUTPUT_FORMAT': 'csv'}
+
+
+def test_overrides_after_command_win(settings_file):
+    args = parse('--settings', settings_file, '--set', 'LAZY_EXECUTION=1',
+                 '--set', 'SCORING_WORKERS=2', 'score',
+                 '--set', 'LAZY_EXECUTION=2')
+    settings = command_settings(args)
+    assert settings['LAZY_EXECUTION'] == 2
+    assert settings['SCORING_WORKERS'] == 2
+
+
+def test_default_settings_file():
+    args = parse('load')
+    assert args.settings == SETTINGS_FILE
+    assert args.overrides == []
+
+
+def test_invalid_override():
+    with pytest.raises(SystemExit):
+        parse('score', '--set', 'INCREMENTAL_SCORING')
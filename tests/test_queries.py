@@ -0,0 +1,93 @@
+"""
+===============================================================================
+Tests of the SQL Queries
+===============================================================================
+Run the queries (those of query 18 and those joining the client-profile
+dimension among them) with execute_queries over synthetic tables, with the
+version of Polars installed.
+"""
+# Other libraries
+import polars as pl
+import pytest
+
+
+from mortgage_status.client_profiles import (
+    PROFILE_QUERIES, PROFILE_TABLE, QUERY_18_SITUATIONS_PROFILES,
+    build_client_profiles
+)
+from mortgage_status.queries import (
+    APPLICATION_KEY, CLIENT_KEY, QUERIES, QUERY_18, QUERY_18_SITUATIONS,
+    execute_queries
+)
+from mortgage_status.rules import STATUS_COLUMN, RuleEngine
+from mortgage_status.schemas import apply_schema
+from mortgage_status.synthetic import generate
+
+
+
+@pytest.fixture(scope='module')
+def tables():
+    return {
+        name: apply_schema(df, name)
+        for name, df in generate(2000, seed=1).items()
+    }
+
+
+@pytest.fixture(scope='module')
+def profiles(tables):
+    return {
+        **tables,
+        PROFILE_TABLE: build_client_profiles(
+            tables['pro_status'], tables['family_status'])
+    }
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+def test_situations(tables, lazy):
+    situations = execute_queries(
+        tables, {0: QUERY_18_SITUATIONS}, lazy=lazy)[0]
+    applications = tables['mortgage_applications']
+    assert situations[APPLICATION_KEY].n_unique() == situations.height
+    clients = applications.join(
+        situations, on=APPLICATION_KEY, how='left', suffix='_situation')
+    assert clients[CLIENT_KEY].equals(
+        clients[f'{CLIENT_KEY}_situation'].alias(CLIENT_KEY))
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+def test_rule_engine_matches_query_18(tables, lazy):
+    expected = execute_queries(tables, {18: QUERY_18}, lazy=lazy)[18]
+    scored = execute_queries(
+        tables, {18: QUERY_18}, lazy=lazy, rules=RuleEngine())[18]
+    assert scored.height == expected.height
+    counts = [
+        df[STATUS_COLUMN].cast(pl.String).value_counts(sort=True)
+        for df in (expected, scored)
+    ]
+    assert counts[0].equals(counts[1])
+
+
+def sorted_rows(df):
+    return df.sort(pl.all(), nulls_last=True)
+
+
+def test_all_queries(tables):
+    results = execute_queries(tables)
+    assert sorted(results) == sorted(QUERIES)
+
+
+@pytest.mark.parametrize('number', sorted(PROFILE_QUERIES))
+def test_profile_queries(tables, profiles, number):
+    expected = execute_queries(tables, {number: QUERIES[number]})[number]
+    result = execute_queries(
+        profiles, {number: PROFILE_QUERIES[number]})[number]
+    assert sorted_rows(result).equals(
+        sorted_rows(expected.select(result.columns)))
+
+
+def test_situations_profiles(tables, profiles):
+    expected = execute_queries(tables, {0: QUERY_18_SITUATIONS})[0]
+    result = execute_queries(
+        profiles, {0: QUERY_18_SITUATIONS_PROFILES})[0]
+    assert sorted_rows(result).equals(
+        sorted_rows(expected.select(result.columns)))
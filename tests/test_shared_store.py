@@ -0,0 +1,83 @@
+"""
+===============================================================================
+Tests of the Memory-Mapped Store of the Loaded Tables
+===============================================================================
+Check that the tables opened from the store are those which were saved, and
+that opening and reading them does not copy them to the heap of the process
+(the anonymous memory of a fresh interpreter, which excludes the pages of the
+mapped files, barely grows).
+"""
+# Standard libraries
+import os
+import subprocess
+import sys
+
+# Other libraries
+import polars as pl
+import pytest
+
+
+from mortgage_status.schemas import SCHEMAS, apply_schema
+from mortgage_status.shared_store import SharedTableStore
+from mortgage_status.synthetic import generate
+
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Opens the store given as argument, reads every value of its tables and
+# prints the growth of the anonymous memory of the process in bytes
+OPEN_STORE = '''
+import os, sys
+import polars as pl
+from mortgage_status.shared_store import SharedTableStore
+
+def anonymous():
+    with open('/proc/self/statm') as file:
+        resident, shared = file.read().split()[1:3]
+    return (int(resident) - int(shared)) * os.sysconf('SC_PAGE_SIZE')
+
+before = anonymous()
+tables = SharedTableStore(store_dir=sys.argv[1]).open_tables()
+for df in tables.values():
+    df.select(pl.all().sum())
+print(anonymous() - before)
+'''
+
+
+def test_round_trip(tmp_path):
+    store = SharedTableStore(store_dir=str(tmp_path))
+    tables = {
+        name: apply_schema(df, name)
+        for name, df in generate(2000, seed=2).items()
+    }
+    for name, df in tables.items():
+        store.save(name, df, source_fingerprint={'sha256': name},
+                   schemas=SCHEMAS)
+    opened = store.open_tables()
+    assert sorted(opened) == sorted(tables)
+    for name, df in tables.items():
+        assert opened[name].schema == df.schema
+        assert opened[name].equals(df)
+        assert opened[name].n_chunks() == 1
+
+
+@pytest.mark.skipif(
+    not os.path.exists('/proc/self/statm'), reason='needs /proc/self/statm')
+def test_open_does_not_copy(tmp_path):
+    rows = 2_000_000
+    df = pl.DataFrame({
+        'a': pl.int_range(rows, eager=True),
+        'b': pl.int_range(rows, eager=True) * 2,
+        'c': pl.int_range(rows, eager=True) * 3
+    })
+    SharedTableStore(store_dir=str(tmp_path)).save(
+        'numbers', df, source_fingerprint={'sha256': 'numbers'})
+    output = subprocess.run(
+        [sys.executable, '-c', OPEN_STORE, str(tmp_path)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    assert int(output.split()[-1]) < df.estimated_size() / 4